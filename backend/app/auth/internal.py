@@ -0,0 +1,21 @@
+import hmac
+import os
+
+from fastapi import HTTPException, Request
+
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')  # Bearer token scrapers send to /metrics; unset turns the endpoint off
+
+
+def metrics_access(request: Request):
+    """Dependency for operational endpoints: a shared METRICS_TOKEN, not a user session.
+
+    Any signed-in user could otherwise read cache, JWKS and inference worker internals.
+    """
+
+    if not METRICS_TOKEN:
+        raise HTTPException(404, 'Not Found')
+
+    auth = request.headers.get('Authorization', '')
+
+    if not hmac.compare_digest(auth.encode(), f'Bearer {METRICS_TOKEN}'.encode()):
+        raise HTTPException(401, 'Invalid metrics token')
@@ -0,0 +1,112 @@
+import logging
+import os
+import threading
+import time
+
+import httpx
+
+logger = logging.getLogger('auth')
+
+JWKS_TTL_SECONDS = float(os.getenv('JWKS_TTL_SECONDS', '600'))
+JWKS_MIN_REFRESH_SECONDS = float(os.getenv('JWKS_MIN_REFRESH_SECONDS', '30'))
+JWKS_MAX_STALE_SECONDS = float(os.getenv('JWKS_MAX_STALE_SECONDS', '86400'))
+
+
+class JWKSUnavailable(Exception):
+    """Raised when signing keys cannot be fetched and nothing usable is cached"""
+
+
+class JWKSCache:
+    """Process-wide store of the Supabase signing keys, indexed by kid"""
+
+    def __init__(
+        self,
+        url,
+        ttl=JWKS_TTL_SECONDS,
+        min_refresh=JWKS_MIN_REFRESH_SECONDS,
+        max_stale=JWKS_MAX_STALE_SECONDS,
+        clock=time.monotonic,
+    ):
+        self.url = url
+        self.ttl = ttl
+        self.min_refresh = min_refresh  # Throttle for refetches caused by unknown kids
+        self.max_stale = max_stale  # How long old keys may be served while the JWKS endpoint is down
+        self.clock = clock
+
+        self._keys = {}
+        self._fetched_at = None
+        self._last_attempt = None
+        self._generation = 0  # Bumped on every successful fetch
+        self.key_version = 0  # Bumped only when the set of kids changes, i.e. keys rotated
+        self._lock = threading.Lock()
+        self._client = httpx.Client(timeout=5.0)
+
+        self.fetches = 0
+        self.fetch_errors = 0
+
+    def ensure_fresh(self):
+        """Refreshes the key set if its TTL has passed"""
+        if not self._is_fresh():
+            self._refresh(self._generation)
+
+    def get_keys(self, kid=None):
+        """Returns the JWKs that can verify a token signed with kid"""
+
+        if not self._is_fresh() or (kid is not None and kid not in self._keys):
+            self._refresh(self._generation)
+
+        if kid is None:
+            return list(self._keys.values())
+
+        key = self._keys.get(kid)
+        return [key] if key else []
+
+    def clear(self):
+        with self._lock:
+            self._keys = {}
+            self._fetched_at = None
+            self._last_attempt = None
+
+    def _is_fresh(self):
+        return self._fetched_at is not None and self.clock() - self._fetched_at < self.ttl
+
+    def _refresh(self, seen_generation):
+        """Fetches the key set; concurrent callers wait on the one in-flight request"""
+
+        with self._lock:
+            # Another thread refreshed while we were waiting for the lock
+            if self._generation != seen_generation:
+                return
+
+            now = self.clock()
+
+            # Keys are still within TTL, so this is a kid miss; don't let random kids hammer the endpoint
+            recently_tried = self._last_attempt is not None and now - self._last_attempt < self.min_refresh
+            if recently_tried and self._keys:
+                return
+
+            self._last_attempt = now
+            self.fetches += 1
+
+            try:
+                response = self._client.get(self.url)
+                response.raise_for_status()
+                keys = response.json()['keys']
+            except (httpx.HTTPError, ValueError, KeyError) as e:
+                self.fetch_errors += 1
+
+                # Stale-if-error: keep serving the last good key set for a while
+                if self._keys and now - self._fetched_at < self.max_stale:
+                    logger.warning('jwks_refresh_failed_serving_stale', extra={'error': str(e)})
+                    return
+
+                logger.error('jwks_refresh_failed', extra={'error': str(e)})
+                raise JWKSUnavailable(str(e)) from e
+
+            new_keys = {k.get('kid'): k for k in keys}
+            if new_keys.keys() != self._keys.keys():
+                self.key_version += 1
+
+            self._keys = new_keys
+            self._fetched_at = now
+            self._generation += 1
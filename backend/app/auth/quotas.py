@@ -0,0 +1,196 @@
+import functools
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter
+
+from fastapi import Depends, HTTPException
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from app.db.database import SessionLocal
+from app.db.model import UserQuota
+
+from .supabase_auth import current_user
+
+logger = logging.getLogger('app')
+
+# Per-user budgets: sustained requests per minute and burst size
+QUOTAS = {
+    'pricing': (float(os.getenv('QUOTA_PRICING_PER_MINUTE', '60')), float(os.getenv('QUOTA_PRICING_BURST', '100'))),
+    'detection': (float(os.getenv('QUOTA_DETECTION_PER_MINUTE', '20')), float(os.getenv('QUOTA_DETECTION_BURST', '10'))),
+    'ocr': (float(os.getenv('QUOTA_OCR_PER_MINUTE', '20')), float(os.getenv('QUOTA_OCR_BURST', '10'))),
+}
+
+QUOTA_STORE = os.getenv('QUOTA_STORE', 'memory')  # memory, db or redis
+QUOTA_REDIS_URL = os.getenv('QUOTA_REDIS_URL', 'redis://localhost:6379/0')
+
+
+class QuotaExceeded(HTTPException):
+    """429 for a user over their budget; main turns it into the usual error envelope"""
+
+    def __init__(self, bucket, retry_after):
+        super().__init__(429, f'Too many {bucket} requests', headers={'Retry-After': str(math.ceil(retry_after))})
+
+
+@functools.cache
+def store_errors():
+    """What a store raises when its backend is down; Redis' own errors only if redis is installed"""
+
+    errors = (SQLAlchemyError, OSError, ConnectionError)
+
+    try:
+        from redis.exceptions import RedisError
+    except ImportError:
+        return errors
+
+    return (*errors, RedisError)
+
+
+def take_tokens(tokens, updated_at, now, rate, capacity, cost):
+    """One token-bucket step; returns (tokens, updated_at, retry_after), retry_after 0 when allowed.
+
+    A request costing more than the bucket holds is let through when the bucket is full and
+    leaves it in debt, so large batches are possible but paid for by the wait that follows.
+    """
+
+    tokens = min(capacity, tokens + (now - updated_at) * rate)
+    needed = min(cost, capacity)
+
+    if tokens < needed:
+        return tokens, now, (needed - tokens) / rate
+
+    return tokens - cost, now, 0.0
+
+
+class MemoryQuotaStore:
+    """Buckets in this process only; limits are per worker"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()  # Sync endpoints run on a thread pool
+
+    def take(self, key, rate, capacity, cost, now):
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens, updated_at, retry_after = take_tokens(tokens, updated_at, now, rate, capacity, cost)
+            self._buckets[key] = (tokens, updated_at)
+            return retry_after
+
+
+class DbQuotaStore:
+    """Buckets in the user_quota table, locked per row, so every worker shares them"""
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+
+    def take(self, key, rate, capacity, cost, now):
+        for attempt in range(2):
+            try:
+                with self.session_factory() as db:
+                    row = db.query(UserQuota).filter(UserQuota.key == key).with_for_update().first()
+
+                    if row is None:
+                        row = UserQuota(key=key, tokens=capacity, updated_at=now)
+                        db.add(row)
+
+                    row.tokens, row.updated_at, retry_after = take_tokens(row.tokens, row.updated_at, now, rate, capacity, cost)
+                    db.commit()
+                    return retry_after
+            except IntegrityError:
+                # Another worker created the row first; its lock now applies
+                continue
+
+        return 0.0
+
+
+# Same step as take_tokens, run atomically inside Redis (or anything speaking its protocol)
+REDIS_TAKE = """
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local rate, capacity, cost, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - updated_at) * rate)
+local needed = math.min(cost, capacity)
+local retry_after = 0
+if tokens < needed then
+  retry_after = (needed - tokens) / rate
+else
+  tokens = tokens - cost
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return tostring(retry_after)
+"""
+
+
+class RedisQuotaStore:
+    """Buckets in Redis or a compatible server, updated by one Lua script so workers can't race"""
+
+    def __init__(self, client, prefix='quota:'):
+        self.client = client  # redis.Redis or anything with a compatible eval()
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url):
+        import redis  # Optional dependency, only needed for QUOTA_STORE=redis
+
+        return cls(redis.Redis.from_url(url))
+
+    def take(self, key, rate, capacity, cost, now):
+        return float(self.client.eval(REDIS_TAKE, 1, self.prefix + key, rate, capacity, cost, now))
+
+
+def build_store(kind=QUOTA_STORE):
+    if kind == 'db':
+        return DbQuotaStore()
+    if kind == 'redis':
+        return RedisQuotaStore.from_url(QUOTA_REDIS_URL)
+    return MemoryQuotaStore()
+
+
+class UserQuotas:
+    """Per-user token buckets for the expensive endpoints, one budget per kind of work"""
+
+    def __init__(self, store, quotas=QUOTAS, clock=time.time):
+        self.store = store
+        self.quotas = quotas
+        self.clock = clock
+
+        self.stats = Counter()
+
+    def check(self, bucket, user_id, cost=1):
+        """Spends cost tokens from user_id's bucket; raises 429 with Retry-After when it's empty"""
+
+        per_minute, capacity = self.quotas[bucket]
+
+        try:
+            retry_after = self.store.take(f'{bucket}:{user_id}', per_minute / 60, capacity, cost, self.clock())
+        except store_errors():
+            # Quotas protect capacity; a broken store must not take the API down with it
+            logger.warning('quota_store_failed', exc_info=True)
+            self.stats['store_errors'] += 1
+            return
+
+        if retry_after > 0:
+            self.stats[f'{bucket}_rejected'] += 1
+            raise QuotaExceeded(bucket, retry_after)
+
+        self.stats[f'{bucket}_allowed'] += 1
+
+    def info(self):
+        return dict(self.stats)
+
+
+quotas = UserQuotas(build_store())
+
+
+def quota(bucket):
+    """Dependency charging one request to the current user's bucket"""
+
+    def check(user=Depends(current_user)):
+        quotas.check(bucket, user['user_id'])
+        return user
+
+    return check
@@ -1,12 +1,19 @@
 import os
+import time
 
-import httpx
 from fastapi import HTTPException, Request
 from jose import JWTError, jwt
 
+from .jwks import JWKSCache, JWKSUnavailable
+from .token_cache import VerifiedTokenCache
+
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 JWKS_URL = f'{SUPABASE_URL}/auth/v1/.well-known/jwks.json'
 
+# Shared by every request in this process
+jwks_cache = JWKSCache(JWKS_URL)
+verified_tokens = VerifiedTokenCache()
+
 
 def current_user(request: Request):
     auth = request.headers.get('Authorization')
@@ -15,21 +22,36 @@ def current_user(request: Request):
         raise HTTPException(401, 'Missing token')
 
     token = auth.split(' ')[1]
+    route = getattr(request.scope.get('route'), 'path', 'unknown')
 
     try:
-        with httpx.Client() as client:
-            jwks = client.get(JWKS_URL).json()
+        # Keeps rotation detection working even when every request is a cache hit
+        jwks_cache.ensure_fresh()
+
+        payload = verified_tokens.get(token, jwks_cache.key_version, route)
 
-        payload = jwt.decode(
-            token,
-            jwks,
-            algorithms=['ES256'],
-            audience='authenticated',
-            issuer=f'{SUPABASE_URL}/auth/v1',
-        )
+        if payload is None:
+            kid = jwt.get_unverified_header(token).get('kid')
+            keys = jwks_cache.get_keys(kid)
+
+            if not keys:
+                raise JWTError(f'Unknown signing key: {kid}')
+
+            start = time.perf_counter()
+            payload = jwt.decode(
+                token,
+                {'keys': keys},
+                algorithms=['ES256'],
+                audience='authenticated',
+                issuer=f'{SUPABASE_URL}/auth/v1',
+            )
+            verified_tokens.put(token, payload, jwks_cache.key_version, time.perf_counter() - start)
 
         return {'user_id': payload['sub'], 'email': payload.get('email')}
 
+    except JWKSUnavailable:
+        raise HTTPException(503, 'Auth keys unavailable')
+
     except JWTError as e:
         print('JWT ERROR:', e)
         raise HTTPException(401, 'Invalid token')
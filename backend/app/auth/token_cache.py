@@ -0,0 +1,89 @@
+import hashlib
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', '4096'))
+
+
+class VerifiedTokenCache:
+    """Bounded LRU of already-verified JWT claims, keyed by a SHA-256 digest of the token"""
+
+    def __init__(self, maxsize=AUTH_TOKEN_CACHE_SIZE, clock=time.time):
+        self.maxsize = maxsize
+        self.clock = clock  # Wall clock, since exp is a unix timestamp
+
+        self._entries = OrderedDict()  # digest -> (claims, exp, key_version)
+        self._lock = threading.Lock()
+
+        self.hits = Counter()  # Per route
+        self.misses = Counter()
+        self.evictions = 0
+        self._verified = 0
+        self._verify_seconds = 0.0  # Time spent on signature checks for misses
+
+    @staticmethod
+    def digest(token):
+        # Never keep raw bearer tokens in memory longer than the request
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token, key_version, route='unknown'):
+        """Returns cached claims, or None if absent, expired or verified against an old key set"""
+
+        key = self.digest(token)
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None:
+                claims, exp, version = entry
+
+                if exp > self.clock() and version == key_version:
+                    self._entries.move_to_end(key)
+                    self.hits[route] += 1
+                    return claims
+
+                del self._entries[key]
+
+            self.misses[route] += 1
+            return None
+
+    def put(self, token, claims, key_version, verify_seconds=0.0):
+        exp = claims.get('exp')
+        key = self.digest(token)
+
+        with self._lock:
+            self._verified += 1
+            self._verify_seconds += verify_seconds
+
+            # Tokens without an expiry are verified every time
+            if not isinstance(exp, (int, float)):
+                return
+
+            self._entries[key] = (claims, exp, key_version)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            hits = sum(self.hits.values())
+            misses = sum(self.misses.values())
+            avg_verify_ms = 1000 * self._verify_seconds / self._verified if self._verified else 0.0
+
+            return {
+                'size': len(self._entries),
+                'hits': hits,
+                'misses': misses,
+                'evictions': self.evictions,
+                'avg_verify_ms': round(avg_verify_ms, 3),
+                'verify_ms_saved': round(hits * avg_verify_ms, 1),  # Estimated signature-check time avoided
+                'by_route': {route: {'hits': self.hits[route], 'misses': self.misses[route]} for route in self.hits | self.misses},
+            }
@@ -1,8 +1,13 @@
 from .database import Base, engine
+from .migrations import run_migrations
 
 
 def init_db():
-    """Initializes the database by creating all tables."""
+    """Initializes the database by creating all tables, then applying pending migrations."""
     print('Creating database tables...')
     Base.metadata.create_all(bind=engine)
-    print('Done.')
+
+    # create_all only adds missing tables; column and data changes are migrations
+    applied = run_migrations(engine)
+
+    print(f'Done. Applied migrations: {", ".join(applied) or "none"}')
@@ -0,0 +1,56 @@
+import os
+from datetime import timedelta
+
+from sqlalchemy import asc, desc
+from sqlalchemy.orm import Session
+
+from app.scripts.card_identity import card_identity
+from app.utils.clock import utcnow
+
+from .model import MarketPrice
+
+# One point per card per window; a newer result inside the window replaces the latest point
+MARKET_PRICE_REFRESH_SECONDS = int(os.getenv('MARKET_PRICE_REFRESH_SECONDS', str(6 * 3600)))
+
+
+def card_fields(card):
+    return {
+        'name': card.name,
+        'card_series': card.card_series,
+        'card_number': card.card_number,
+        'card_type': card.card_type,
+    }
+
+
+def card_key(card):
+    """The identity a card's prices are stored under; cards confirmed before identities existed derive it"""
+    return card.identity or card_identity(card_fields(card))
+
+
+def record_market_price(db: Session, identity, pricing, now=None):
+    """Adds a pricing result to the shared series for identity; the caller commits"""
+
+    now = now or utcnow()
+    latest = db.query(MarketPrice).filter(MarketPrice.identity == identity).order_by(desc(MarketPrice.created_at)).first()
+    fresh = latest is not None and now - latest.created_at < timedelta(seconds=MARKET_PRICE_REFRESH_SECONDS)
+
+    point = latest if fresh else MarketPrice(identity=identity, created_at=now)
+    point.estimate = pricing['estimate']
+    point.low = pricing['price_low']
+    point.high = pricing['price_high']
+    point.num_sales = pricing['sales_count']
+    point.confidence = pricing['confidence']
+
+    if not fresh:
+        db.add(point)
+
+    return point
+
+
+def market_series(db: Session, identity):
+    """Every point for identity, oldest first; none for cards without an identity"""
+
+    if not identity:
+        return []
+
+    return db.query(MarketPrice).filter(MarketPrice.identity == identity).order_by(asc(MarketPrice.created_at)).all()
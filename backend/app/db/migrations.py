@@ -0,0 +1,124 @@
+"""Schema and data changes create_all can't make, applied once each in order at startup.
+
+Each step gets the connection of one transaction holding a lock, so concurrent workers starting
+together apply a step exactly once, and a failed step leaves nothing half-done.
+"""
+
+import logging
+from datetime import timedelta
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session, load_only
+
+from app.scripts.card_identity import card_identity
+
+from .market_prices import MARKET_PRICE_REFRESH_SECONDS, card_fields
+from .model import Card, CardPrice, MarketPrice, SchemaMigration
+
+logger = logging.getLogger('app')
+
+MIGRATION_LOCK_KEY = 7410  # Postgres advisory lock held while migrating
+
+
+def add_card_identity(conn):
+    """card_info.identity, added after the table existed"""
+
+    columns = {column['name'] for column in inspect(conn).get_columns('card_info')}
+
+    if 'identity' not in columns:
+        conn.execute(text('ALTER TABLE card_info ADD COLUMN identity VARCHAR'))
+        conn.execute(text('CREATE INDEX IF NOT EXISTS ix_card_info_identity ON card_info (identity)'))
+
+
+def add_card_reprice_attempted_at(conn):
+    """card_info.reprice_attempted_at, added after the table existed"""
+
+    columns = {column['name'] for column in inspect(conn).get_columns('card_info')}
+
+    if 'reprice_attempted_at' not in columns:
+        conn.execute(text('ALTER TABLE card_info ADD COLUMN reprice_attempted_at TIMESTAMP'))
+
+
+def backfill_market_prices(conn):
+    """Copies per-card card_price history into the shared market_price series.
+
+    Points for one identity closer together than MARKET_PRICE_REFRESH_SECONDS are merged the
+    way record_market_price would have: the newer row's values replace the point's, which keeps
+    its time, so copies of a card held by several users don't multiply its history. card_price
+    itself is left in place.
+    """
+
+    window = timedelta(seconds=MARKET_PRICE_REFRESH_SECONDS)
+
+    # Joins the migration's transaction; committed with the version row
+    with Session(bind=conn) as db:
+        # Only columns that exist by this step; later steps add more to card_info
+        card_columns = load_only(Card.id, Card.name, Card.card_series, Card.card_number, Card.card_type, Card.identity)
+        rows = db.query(CardPrice, Card).join(Card, Card.id == CardPrice.card_id).options(card_columns).order_by(CardPrice.created_at).all()
+        latest = {}  # identity -> its newest point, or None
+        added = 0
+
+        for price, card in rows:
+            identity = card.identity or card_identity(card_fields(card))
+
+            if not identity or price.created_at is None:
+                continue
+
+            card.identity = identity
+
+            if identity not in latest:
+                latest[identity] = (
+                    db.query(MarketPrice)
+                    .filter(MarketPrice.identity == identity, MarketPrice.created_at <= price.created_at)
+                    .order_by(MarketPrice.created_at.desc())
+                    .first()
+                )
+
+            point = latest[identity]
+
+            if point is None or price.created_at - point.created_at >= window:
+                point = MarketPrice(identity=identity, created_at=price.created_at)
+                db.add(point)
+                latest[identity] = point
+                added += 1
+
+            point.estimate = price.estimate
+            point.low = price.low
+            point.high = price.high
+            point.num_sales = price.num_sales
+            point.confidence = price.confidence
+
+        db.flush()
+
+    logger.info('market_prices_backfilled', extra={'card_prices': len(rows), 'added': added})
+
+
+# Append only; versions already applied are skipped by name
+MIGRATIONS = [
+    ('0001_card_identity', add_card_identity),
+    ('0002_backfill_market_prices', backfill_market_prices),
+    ('0003_card_reprice_attempted_at', add_card_reprice_attempted_at),
+]
+
+
+def run_migrations(engine, migrations=MIGRATIONS):
+    """Applies every migration not yet recorded in schema_migration; returns the versions applied"""
+
+    applied = []
+
+    with engine.begin() as conn:
+        if conn.dialect.name == 'postgresql':
+            conn.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': MIGRATION_LOCK_KEY})
+
+        done = {row.version for row in conn.execute(SchemaMigration.__table__.select())}
+
+        for version, migrate in migrations:
+            if version in done:
+                continue
+
+            logger.info('migration_start', extra={'version': version})
+            migrate(conn)
+            conn.execute(SchemaMigration.__table__.insert().values(version=version))
+            applied.append(version)
+
+    return applied
@@ -1,6 +1,6 @@
 import uuid
 
-from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Integer, String
+from sqlalchemy import JSON, Boolean, Column, DateTime, Float, ForeignKey, Integer, String
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import expression, func
 
@@ -18,6 +18,8 @@ class Card(Base):
     team_name = Column(String)
     created_at = Column(DateTime, server_default=func.now())
     saved = Column(Boolean, nullable=False, default=False, server_default=expression.false())
+    identity = Column(String, index=True)  # card_identity of the fields it was last priced with; links to market_price
+    reprice_attempted_at = Column(DateTime)  # Last repricer lookup for it, priced or not; keeps no-sales cards from heading the queue
 
 
 class CardImage(Base):
@@ -30,6 +32,7 @@ class CardImage(Base):
 
 
 class CardPrice(Base):
+    # Per-card history from before market_price; copied into it by migration 0002, no longer written
     __tablename__ = 'card_price'
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     card_id = Column(UUID(as_uuid=True), ForeignKey('card_info.id'), nullable=False)
@@ -39,3 +42,60 @@ class CardPrice(Base):
     num_sales = Column(Integer)
     confidence = Column(Float)
     created_at = Column(DateTime, server_default=func.now())
+
+
+class MarketPrice(Base):
+    __tablename__ = 'market_price'
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    identity = Column(String, nullable=False, index=True)  # card_identity output; shared by every copy of the card
+    estimate = Column(Float)
+    low = Column(Float)
+    high = Column(Float)
+    num_sales = Column(Integer)
+    confidence = Column(Float)
+    created_at = Column(DateTime, server_default=func.now())
+
+
+class PricingCacheEntry(Base):
+    __tablename__ = 'pricing_cache'
+    query_key = Column(String, primary_key=True)  # card_identity output
+    result = Column(JSON)  # pricing_core output, null when there was no usable data
+    kind = Column(String, nullable=False, default='ok')  # 'ok' or 'no_sales'; upstream failures are never stored
+    fetched_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)  # Fresh until
+    stale_until = Column(DateTime, nullable=False)  # Served while revalidating until
+
+
+class SaleObservation(Base):
+    __tablename__ = 'sale_observation'
+    query_key = Column(String, primary_key=True)  # card_identity output
+    item_id = Column(String, primary_key=True)  # eBay itemId; a listing is stored once per query
+    price = Column(Float, nullable=False)
+    sold_at = Column(DateTime)  # itemEndDate when eBay returns one
+    seen_at = Column(DateTime, nullable=False)  # When the sync that found it ran
+
+
+class UserQuota(Base):
+    __tablename__ = 'user_quota'
+    key = Column(String, primary_key=True)  # '<bucket>:<user_id>'
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)  # Unix seconds of the last refill
+
+
+class RepricerBudget(Base):
+    __tablename__ = 'repricer_budget'
+    day = Column(String, primary_key=True)  # UTC date, ISO format
+    spent = Column(Integer, nullable=False, default=0)  # eBay lookups used by background repricing
+
+
+class SchedulerLease(Base):
+    __tablename__ = 'scheduler_lease'
+    name = Column(String, primary_key=True)  # One row per singleton job, e.g. 'repricer'
+    holder = Column(String, nullable=False)  # '<host>:<pid>:<random>' of the process running it
+    expires_at = Column(DateTime, nullable=False)  # Others may take over after this
+
+
+class SchemaMigration(Base):
+    __tablename__ = 'schema_migration'
+    version = Column(String, primary_key=True)  # Name of a step in app.db.migrations.MIGRATIONS
+    applied_at = Column(DateTime, server_default=func.now())
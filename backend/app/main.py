@@ -1,4 +1,7 @@
+import asyncio
+import json
 import logging
+import math
 import os
 import uuid
 from contextlib import asynccontextmanager
@@ -7,27 +10,50 @@ from uuid import UUID
 
 import cv2
 from dotenv import load_dotenv
-from fastapi import Depends, FastAPI, File, Form, Request, UploadFile
+from fastapi import BackgroundTasks, Depends, FastAPI, File, Form, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from PIL import Image, ImageOps
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy import asc, text
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 
-from app.auth.supabase_auth import current_user
+from app.auth.internal import metrics_access
+from app.auth.quotas import QuotaExceeded, quota, quotas
+from app.auth.supabase_auth import current_user, jwks_cache, verified_tokens
 from app.db.database import SessionLocal
 from app.db.db_get import get_cards
 from app.db.init_db import init_db
-from app.db.model import Card, CardImage, CardPrice
+from app.db.market_prices import card_key, market_series, record_market_price
+from app.db.model import Card, CardImage
 from app.db.schemas import TrendPoint
 from app.scripts.card_detection import CardDetectionPipeline
+from app.scripts.card_identity import card_identity
+from app.scripts.ebay_client import close_ebay_client, ebay_client_info
 from app.scripts.helpers import load_models
+from app.scripts.inference_pool import INFERENCE_WORKERS, InferenceError, InferencePool, PooledPipeline
+from app.scripts.pricing import observation_store, price_many, pricing_cache
 from app.scripts.pricing import price_card as run_pricing
+from app.scripts.repricer import RepricingScheduler
 from app.scripts.text_detection import TextExtraction
-from app.utils.s3_images import upload_image
+from app.utils.debug_artifacts import debug_artifacts
+from app.utils.images import UploadTooLarge, clip_box, decode_image, encode_image, load_upload, read_upload
+from app.utils.s3_images import upload_bytes
+from app.utils.upload_limit import UploadSizeLimit
 
 load_dotenv()
 
+# Max cards in one /price-cards request
+PRICE_CARDS_MAX_BATCH = int(os.getenv('PRICE_CARDS_MAX_BATCH', '500'))
+
+# Largest image /extract-text and /detect-card accept; the request may be this plus the form's framing
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', str(20 * 1024 * 1024)))
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
+
+# Seconds a pricing endpoint waits on eBay per card before answering with the last known price
+PRICE_CARD_BUDGET_SECONDS = float(os.getenv('PRICE_CARD_BUDGET_SECONDS', '4'))
+PRICE_CARDS_BUDGET_SECONDS = float(os.getenv('PRICE_CARDS_BUDGET_SECONDS', '10'))
+
 # AWS Credentials from .env variables
 AWS_REGION = os.getenv('AWS_REGION')
 S3_BUCKET = os.getenv('S3_BUCKET')
@@ -38,10 +64,6 @@ logger = logging.getLogger('app')
 
 # TODO: Use AWS Storage instead of local; host models on S3
 
-# Temporary upload directory, will use a proper storage solution later
-UPLOAD_DIR = 'uploads'
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
 # Temporary crop directory, will use properly stored crops later
 CROP_DIR = 'uploads/crops'
 os.makedirs(CROP_DIR, exist_ok=True)
@@ -52,23 +74,50 @@ model = None
 ocr = None
 pipeline_one = None
 pipeline_two = None
+inference_pool = None
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Load DB + models on startup."""
-    global yolo, model, ocr, pipeline_one, pipeline_two
+    global yolo, model, ocr, pipeline_one, pipeline_two, inference_pool
 
     if os.getenv('SKIP_DB_INIT') != '1':
         init_db()
+        pricing_cache.purge_expired()
 
     if os.getenv('SKIP_MODEL_LOAD') != '1':
-        yolo, model, ocr = load_models()
-        pipeline_one = CardDetectionPipeline(yolo)
-        pipeline_two = TextExtraction(model, ocr)
+        if INFERENCE_WORKERS > 0:
+            # Models live in worker processes; the pipelines here only hand images over
+            inference_pool = InferencePool()
+            pipeline_one = PooledPipeline(inference_pool, 'detect')
+            pipeline_two = PooledPipeline(inference_pool, 'ocr')
+        else:
+            yolo, model, ocr = load_models()
+            pipeline_one = CardDetectionPipeline(yolo)
+            pipeline_two = TextExtraction(model, ocr)
+
+    # In-process background repricing; can also run as its own worker (python -m app.scripts.repricer)
+    repricer = None
+    if os.getenv('REPRICER_ENABLED') == '1':
+        scheduler = RepricingScheduler(dry_run=os.getenv('REPRICER_DRY_RUN') == '1')
+        repricer = asyncio.create_task(scheduler.run_forever())
 
     yield
 
+    if repricer is not None:
+        repricer.cancel()
+
+    if inference_pool is not None:
+        await asyncio.to_thread(inference_pool.close)
+        inference_pool = None
+
+    # Sampled debug images still being written
+    await asyncio.to_thread(debug_artifacts.flush)
+
+    # Pooled eBay connections belong to this event loop
+    await close_ebay_client()
+
 
 app = FastAPI(lifespan=lifespan)
 app.add_middleware(
@@ -106,6 +155,10 @@ class PriceCardRequest(BaseModel):
     card_type: str | None = 'Base'
 
 
+class PriceCardsRequest(BaseModel):
+    cards: List[PriceCardRequest]
+
+
 class UpdateSaveRequest(BaseModel):
     saved: bool
 
@@ -123,6 +176,20 @@ def err(code, message):
     }
 
 
+@app.exception_handler(QuotaExceeded)
+async def quota_exceeded(request: Request, exc: QuotaExceeded):
+    return JSONResponse(err('RATE_LIMITED', exc.detail), status_code=exc.status_code, headers=exc.headers)
+
+
+# Oversized uploads are refused before Starlette spools them; read_upload then checks the file itself
+app.add_middleware(
+    UploadSizeLimit,
+    max_bytes=MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD_BYTES,
+    paths=['/extract-text', '/detect-card'],
+    body=err('IMAGE_TOO_LARGE', f'Image is larger than {MAX_UPLOAD_BYTES // (1 << 20)}MB'),
+)
+
+
 # Helper to get DB session
 def get_db():
     db = SessionLocal()
@@ -174,25 +241,31 @@ def confirm_card(req: ConfirmCardRequest, db: Session = Depends(get_db), user=De
         return err('DB_ERROR', str(e))
 
 
-@app.post('/extract-text')
-def extract_text(file: UploadFile = File(...), user=Depends(current_user)):
-    """Extracts text from a cropped card image"""
+async def run_pipeline(pipeline, image, **kwargs):
+    """Awaits a pooled pipeline without holding a threadpool thread; in-process pipelines run in the threadpool"""
 
-    # Save temp image
-    ext = file.filename.split('.')[-1]
-    tmp_path = f'/tmp/{uuid.uuid4()}.{ext}'
+    if isinstance(pipeline, PooledPipeline):
+        return await pipeline.run_async(image, **kwargs)
+    return await run_in_threadpool(pipeline.run, image, **kwargs)
 
-    with open(tmp_path, 'wb') as f:
-        f.write(file.file.read())
 
-    image = cv2.imread(tmp_path)
+@app.post('/extract-text')
+async def extract_text(file: UploadFile = File(...), user=Depends(quota('ocr'))):
+    """Extracts text from a cropped card image"""
 
-    os.remove(tmp_path)
+    try:
+        image = await run_in_threadpool(lambda: decode_image(read_upload(file.file, MAX_UPLOAD_BYTES)))
+    except UploadTooLarge as e:
+        return err('IMAGE_TOO_LARGE', str(e))
 
     if image is None:
         return err('INVALID_IMAGE', 'Could not read uploaded image')
 
-    fields = pipeline_two.run(image)
+    try:
+        fields = await run_pipeline(pipeline_two, image, debug=debug_artifacts.start())
+    except InferenceError as e:
+        logger.error('ocr_failed', extra={'error': str(e)})
+        return err('OCR_FAILED', 'Unable to extract text')
 
     if not fields:
         return err('OCR_FAILED', 'Unable to extract text')
@@ -202,61 +275,41 @@ def extract_text(file: UploadFile = File(...), user=Depends(current_user)):
 
 # Endpoint handles upload + detection
 @app.post('/detect-card')
-def detect_card(
+async def detect_card(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     image_type: str = Form(...),
-    user=Depends(current_user),
+    user=Depends(quota('detection')),
 ):
-    """Receives an image and detects card in it"""
+    """Receives an image and detects card in it.
+
+    The photo stays in memory: YOLO runs on the decoded array and the crop is a slice of it.
+    Both images are encoded and uploaded after the response is sent.
+    """
 
     if image_type is None or image_type not in ['front', 'back']:
         return err('INVALID_INPUT', "Image type must be 'front' or 'back'")
 
-    # Setup Paths
-    ext = file.filename.split('.')[-1]
+    ext = file.filename.split('.')[-1].lower()
+    if not cv2.haveImageWriter(f'image.{ext}'):
+        ext = 'jpg'
+
     image_id = str(uuid.uuid4())
-    image_path = f'{UPLOAD_DIR}/{image_id}.{ext}'
-    crop_path = f'{UPLOAD_DIR}/{image_id}_{image_type}_crop.{ext}'
 
     try:
-        img = Image.open(file.file)
-        img = ImageOps.exif_transpose(img)
-
-        MAX_LONG_SIDE = 1600
-        w, h = img.size
-        scale = min(1.0, MAX_LONG_SIDE / max(w, h))
-
-        if scale < 1.0:
-            new_w, new_h = int(w * scale), int(h * scale)
-            img = img.resize((new_w, new_h), Image.LANCZOS)
-
-        img = img.convert('RGB')
-        img.save(image_path, quality=92, optimize=True)
-
-        results = pipeline_one.run(image_path)
+        image = await run_in_threadpool(load_upload, file.file)
+        results = await run_pipeline(pipeline_one, image)
 
         if results is None or 'bbox' not in results:
             return err('NO_CARD_DETECTED', 'No card detected')
 
-        bbox = results['bbox']
-        x1, y1, x2, y2 = bbox[0], bbox[1], bbox[2], bbox[3]
-
-        # Edge cases
-        img_w, img_h = img.size
-        left = max(0, int(x1))
-        top = max(0, int(y1))
-        right = min(img_w, int(x2))
-        bottom = min(img_h, int(y2))
-
-        # Perform Crop
-        cropped_img = img.crop((left, top, right, bottom))
-        cropped_img.save(crop_path, quality=95)
+        left, top, right, bottom = clip_box(results['bbox'], image.shape)
+        crop = image[top:bottom, left:right]
 
         s3_key_original = f'cards/{image_id}/{image_type}.{ext}'
         s3_key_crop = f'cards/{image_id}/{image_type}_crop.{ext}'
 
-        upload_image(image_path, s3_key_original)
-        upload_image(crop_path, s3_key_crop)
+        background_tasks.add_task(upload_detection, [(image, s3_key_original, 92), (crop, s3_key_crop, 95)], ext)
 
         return ok(
             {
@@ -272,44 +325,166 @@ def detect_card(
         return err('PROCESSING_ERROR', str(e))
 
 
+def upload_detection(images, ext):
+    """Encodes and uploads (array, s3 key, quality) triples; runs after the response, so failures are only logged"""
+
+    for image, s3_key, quality in images:
+        try:
+            upload_bytes(encode_image(image, ext, quality), s3_key)
+        except (ValueError, RuntimeError):
+            logger.error('detect_card_upload_failed', extra={'s3_key': s3_key}, exc_info=True)
+
+
 @app.post('/price-card')
-def price_card(req: PriceCardRequest, db: Session = Depends(get_db), user=Depends(current_user)):
+async def price_card(req: PriceCardRequest, db: Session = Depends(get_db), user=Depends(quota('pricing'))):
     """Prices a card based on its details"""
 
-    pricing_input = {
+    pricing = await run_pricing(pricing_fields(req), budget=PRICE_CARD_BUDGET_SECONDS)
+    error = pricing_error(pricing)
+
+    # Our eBay call budget is shared by every user, so tell clients when to come back
+    if pricing.get('error_code') == 'PRICING_RATE_LIMITED':
+        return JSONResponse(error, status_code=503, headers={'Retry-After': str(max(1, math.ceil(pricing['retry_after'])))})
+
+    if error:
+        return error
+
+    # Last known price while eBay is unavailable or slow; already in the series
+    if pricing.get('stale'):
+        return ok(pricing)
+
+    # DB work stays off the event loop
+    return await run_in_threadpool(save_price, db, req.card_id, user['user_id'], card_identity(pricing_fields(req)), pricing)
+
+
+def pricing_error(pricing):
+    """The error response for a failed pricing result, or None if it has an estimate"""
+
+    # Upstream outage, as opposed to a card with no sales
+    if pricing.get('error_code') == 'PRICING_UPSTREAM_ERROR':
+        return err('PRICING_UNAVAILABLE', 'eBay is unavailable, try again later')
+
+    if pricing.get('error_code') == 'PRICING_TIMEOUT':
+        return err('PRICING_TIMEOUT', 'eBay is slow to respond, try again shortly')
+
+    if pricing.get('error_code') == 'PRICING_RATE_LIMITED':
+        return err('PRICING_RATE_LIMITED', 'Too many pricing requests right now, try again shortly')
+
+    if 'estimate' not in pricing:
+        return err('PRICING_NO_DATA', 'Unable to price card with given details')
+
+    return None
+
+
+def pricing_fields(req: PriceCardRequest):
+    return {
         'name': req.name,
         'card_series': req.card_series,
         'card_number': req.card_number,
         'card_type': req.card_type,
     }
-    pricing = run_pricing(pricing_input)
 
-    if 'estimate' not in pricing:
-        return err('PRICING_NO_DATA', 'Unable to price card with given details')
+
+def save_price(db: Session, card_id, user_id, identity, pricing):
+    """Links a card owned by user_id to identity and adds the result to that identity's market series.
+
+    Cards whose name normalizes to nothing have no identity; they are priced but not recorded,
+    as every such card would otherwise share one series.
+    """
 
     try:
-        card = db.query(Card).filter(Card.id == req.card_id).filter(Card.user_id == user['user_id']).first()
+        card = db.query(Card).filter(Card.id == card_id).filter(Card.user_id == user_id).first()
 
         if not card:
             return err('FORBIDDEN', 'Card does not belong to user')
 
-        price = CardPrice(
-            card_id=req.card_id,
-            estimate=pricing['estimate'],
-            low=pricing['price_low'],
-            high=pricing['price_high'],
-            num_sales=pricing['sales_count'],
-            confidence=pricing['confidence'],
-        )
+        if identity:
+            card.identity = identity
+            record_market_price(db, identity, pricing)
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error('db_error', exc_info=True)
+        return err('DB_ERROR', str(e))
+
+    return ok(pricing)
+
+
+@app.post('/price-cards')
+async def price_cards(req: PriceCardsRequest, db: Session = Depends(get_db), user=Depends(current_user)):
+    """Prices many cards; streams one NDJSON line per card as results finish, then a summary line.
+
+    Cards with the same card_identity are looked up once and share one market price point, all
+    written in one transaction after the last card is priced.
+    """
+
+    if not req.cards or len(req.cards) > PRICE_CARDS_MAX_BATCH:
+        return err('INVALID_INPUT', f'Send between 1 and {PRICE_CARDS_MAX_BATCH} cards')
+
+    # Each card counts against the pricing quota, like one /price-card call
+    await run_in_threadpool(quotas.check, 'pricing', user['user_id'], len(req.cards))
+
+    card_ids = {card.card_id for card in req.cards}
+    owned = await run_in_threadpool(owned_card_ids, db, card_ids, user['user_id'])
+
+    async def results():
+        priced = {}  # identity -> (pricing, card ids)
+        priceable = []
+
+        for card in req.cards:
+            if card.card_id in owned:
+                priceable.append(card)
+            else:
+                yield line(card.card_id, err('FORBIDDEN', 'Card does not belong to user'))
+
+        async for indexes, pricing in price_many([pricing_fields(card) for card in priceable], budget=PRICE_CARDS_BUDGET_SECONDS):
+            for i in indexes:
+                card = priceable[i]
+                error = pricing_error(pricing)
+
+                if error:
+                    yield line(card.card_id, error)
+                else:
+                    identity = card_identity(pricing_fields(card))
+
+                    # Stale results are already in the series; nameless cards have none of their own
+                    if identity and not pricing.get('stale'):
+                        priced.setdefault(identity, (pricing, []))[1].append(card.card_id)
+                    yield line(card.card_id, ok(pricing))
+
+        yield line(None, await run_in_threadpool(save_prices, priced))
+
+    return StreamingResponse(results(), media_type='application/x-ndjson')
+
+
+def owned_card_ids(db: Session, card_ids, user_id):
+    rows = db.query(Card.id).filter(Card.id.in_(card_ids)).filter(Card.user_id == user_id).all()
+    return {row.id for row in rows}
+
+
+def save_prices(priced):
+    """Records one market price per identity and links the priced cards to it, in one transaction"""
+
+    # Own session: the request-scoped one may already be closed while the response streams
+    db = SessionLocal()
+    try:
+        for identity, (pricing, card_ids) in priced.items():
+            record_market_price(db, identity, pricing)
+            db.query(Card).filter(Card.id.in_(card_ids)).update({Card.identity: identity}, synchronize_session=False)
 
-        db.add(price)
         db.commit()
+        return ok({'saved': sum(len(card_ids) for _, card_ids in priced.values())})
     except Exception as e:
         db.rollback()
         logger.error('db_error', exc_info=True)
         return err('DB_ERROR', str(e))
+    finally:
+        db.close()
 
-    return ok(pricing)
+
+def line(card_id, body):
+    """One NDJSON line of a streamed batch response"""
+    return json.dumps({'card_id': str(card_id) if card_id else None, **body}) + '\n'
 
 
 # Read endpoints
@@ -345,9 +520,10 @@ def get_card(card_id: UUID, db: Session = Depends(get_db), user=Depends(current_
 
 @app.get('/card/{card_id}/prices')
 def get_prices(card_id: UUID, db: Session = Depends(get_db), user=Depends(current_user)):
-    """Fetches card pricing details by Card ID (FK)"""
+    """Fetches the market price series of a card's identity"""
 
-    prices = db.query(CardPrice).join(Card).filter(CardPrice.card_id == card_id).filter(Card.user_id == user['user_id']).all()
+    card = db.query(Card).filter(Card.id == card_id).filter(Card.user_id == user['user_id']).first()
+    prices = market_series(db, card_key(card)) if card else []
 
     return (
         ok(
@@ -395,18 +571,14 @@ def read_cards(q: str = None, db: Session = Depends(get_db), user=Depends(curren
 @app.get('/card/{card_id}/price-trend', response_model=List[TrendPoint])
 def get_price_trend(card_id: UUID, db: Session = Depends(get_db), user=Depends(current_user)):
     """
-    Fetches price history sorted by date
+    Fetches the card's market price history sorted by date
     """
-    trends = (
-        db.query(CardPrice)
-        .join(Card)
-        .filter(CardPrice.card_id == card_id)
-        .filter(Card.user_id == user['user_id'])
-        .order_by(asc(CardPrice.created_at))  # Oldest first for the chart
-        .all()
-    )
+    card = db.query(Card).filter(Card.id == card_id).filter(Card.user_id == user['user_id']).first()
 
-    return trends  # For response_model above, no ok
+    if not card:
+        return []
+
+    return market_series(db, card_key(card))  # Oldest first for the chart; for response_model above, no ok
 
 
 @app.get('/saved-cards')
@@ -478,3 +650,18 @@ def ready(db: Session = Depends(get_db)):
         return {'status': 'ready'}
     except Exception:
         return {'status': 'not_ready'}
+
+
+# Cache counters, to see how much upstream and CPU work is being saved; for scrapers holding METRICS_TOKEN
+@app.get('/metrics', dependencies=[Depends(metrics_access)])
+def metrics():
+    return {
+        'auth_token_cache': verified_tokens.stats(),
+        'jwks': {'fetches': jwks_cache.fetches, 'fetch_errors': jwks_cache.fetch_errors},
+        'pricing_cache': pricing_cache.info(),
+        'observations': observation_store.info(),
+        'ebay': ebay_client_info(),
+        'quotas': quotas.info(),
+        'debug_artifacts': debug_artifacts.info(),
+        'detection': pipeline_one.info() if pipeline_one is not None else {},
+    }
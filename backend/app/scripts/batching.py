@@ -0,0 +1,113 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+logger = logging.getLogger('app')
+
+
+class MicroBatcher:
+    """Collects items submitted by concurrent callers and runs them through run_batch together.
+
+    A batch starts with the first waiting item and closes when it holds max_batch_size items
+    or max_wait seconds have passed, whichever comes first. run_batch(items) must return one
+    result per item, in order; if it raises or returns a different number of results, every
+    caller in that batch gets an exception. One worker thread runs the batches, so the model
+    only ever sees one batch at a time. Calls wait at most timeout seconds for their result.
+    """
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait=0.005, name='batcher', timeout=None):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.timeout = timeout
+
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._worker.start()
+
+        self.stats = Counter()
+
+    def submit(self, item):
+        """Queues item; returns a Future for its result"""
+
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item):
+        """Runs item in the next batch and waits for its result; raises TimeoutError after timeout seconds"""
+
+        future = self.submit(item)
+
+        try:
+            return future.result(self.timeout)
+        except FutureTimeoutError:
+            # Still queued: withdraw it so the model doesn't spend time on an abandoned item
+            future.cancel()
+            self.stats['timeouts'] += 1
+            raise
+
+    def info(self):
+        batches = self.stats['batches']
+        return {**self.stats, 'mean_batch_size': round(self.stats['items'] / batches, 2) if batches else None}
+
+    def close(self):
+        self._queue.put(None)
+        self._worker.join()
+
+    def _collect(self):
+        """Blocks for the first item, then gathers more until the batch is full or max_wait is up"""
+
+        first = self._queue.get()
+        if first is None:
+            return None
+
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if entry is None:
+                self._queue.put(None)  # Finish this batch, then stop
+                break
+
+            batch.append(entry)
+
+        return batch
+
+    def _loop(self):
+        while (batch := self._collect()) is not None:
+            # Callers that timed out before their batch started have cancelled their futures
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+
+            if not batch:
+                continue
+
+            items = [item for item, _ in batch]
+            self.stats['batches'] += 1
+            self.stats['items'] += len(items)
+
+            try:
+                results = list(self.run_batch(items))
+
+                # zip would leave the extra callers waiting forever
+                if len(results) != len(items):
+                    raise RuntimeError(f'run_batch returned {len(results)} results for {len(items)} items')
+            except Exception as e:
+                logger.error('batch_failed', exc_info=True)
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
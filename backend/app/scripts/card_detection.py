@@ -1,27 +1,48 @@
+import os
+
 import cv2
 
-from .helpers import detect_card, load_models
+from .batching import MicroBatcher
+from .helpers import detect_cards, load_models
+
+# Concurrent requests share one YOLO forward pass; 1 turns batching off
+YOLO_MAX_BATCH_SIZE = int(os.getenv('YOLO_MAX_BATCH_SIZE', '8'))
+YOLO_MAX_WAIT_MS = float(os.getenv('YOLO_MAX_WAIT_MS', '5'))  # How long a request waits for others to join its batch
+YOLO_BATCH_TIMEOUT_SECONDS = float(os.getenv('YOLO_BATCH_TIMEOUT_SECONDS', '30'))  # Longest a request waits for its batch result
 
 
 class CardDetectionPipeline:
-    def __init__(self, yolo):
+    def __init__(self, yolo, max_batch_size=YOLO_MAX_BATCH_SIZE, max_wait_ms=YOLO_MAX_WAIT_MS):
         self.yolo = yolo
+        self.batcher = None
 
-    def run(self, image_path):
-        """Card Detection on image"""
+        if max_batch_size > 1:
+            self.batcher = MicroBatcher(
+                lambda images: detect_cards(yolo, images), max_batch_size, max_wait_ms / 1000, name='yolo-batcher', timeout=YOLO_BATCH_TIMEOUT_SECONDS
+            )
 
-        image = cv2.imread(image_path)
+    def run(self, image):
+        """Card Detection on a BGR image array, or on an image file path"""
+
+        if isinstance(image, str):
+            image = cv2.imread(image)
 
         if image is None:
             raise ValueError('Could not load image')
 
-        result = detect_card(self.yolo, image)
+        if self.batcher is not None:
+            result = self.batcher(image)
+        else:
+            result = detect_cards(self.yolo, [image])[0]
 
         if result is None:
             return None
 
         return result
 
+    def info(self):
+        return self.batcher.info() if self.batcher is not None else {}
+
 
 def test_a():
     yolo, _, _ = load_models()
@@ -0,0 +1,122 @@
+import re
+import unicodedata
+
+# Set-name spellings that refer to the same product, applied in order after lowercasing
+SET_ALIASES = [
+    (r'\bupper\s*deck\b', 'ud'),
+    (r'\bo\s*pee\s*chee\b', 'opc'),
+    (r'\bseries\s+one\b', 'series 1'),
+    (r'\bseries\s+two\b', 'series 2'),
+    (r'\bs([12])\b', r'series \1'),
+    (r'\b(hockey|nhl|trading cards?|cards?)\b', ''),
+]
+
+# Parallel / insert spellings; anything not listed is kept as typed (lowercased)
+PARALLEL_ALIASES = {
+    '': 'base',
+    'base': 'base',
+    'base set': 'base',
+    'yg': 'young guns',
+    'young gun': 'young guns',
+    'young guns': 'young guns',
+    'yg canvas': 'young guns canvas',
+    'young guns canvas': 'young guns canvas',
+    'canvas': 'canvas',
+    'ud canvas': 'canvas',
+    'exclusives': 'exclusives',
+    'ud exclusives': 'exclusives',
+    'high gloss': 'high gloss',
+    'ud high gloss': 'high gloss',
+    'rc': 'rookie',
+    'rookie': 'rookie',
+    'rookie card': 'rookie',
+    'opc rainbow': 'rainbow',
+    'rainbow': 'rainbow',
+}
+
+SEASON_RE = re.compile(r'(?<!\d)((?:19|20)\d{2})(?:\s*[-/]\s*(\d{2}|\d{4}))?(?!\d)')
+
+
+def simplify(text):
+    """Lowercase ASCII words separated by single spaces"""
+
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode()
+    text = re.sub(r'[^a-z0-9\s]', ' ', text.lower())
+    return ' '.join(text.split())
+
+
+def canonical_season(series):
+    """'2021-22', '2021-2022', '2021/22' and '2021' all mean the 2021-22 season"""
+
+    match = SEASON_RE.search(series or '')
+
+    if not match:
+        return ''
+
+    start = int(match.group(1))
+    return f'{start}-{(start + 1) % 100:02d}'
+
+
+def canonical_set(series):
+    text = SEASON_RE.sub(' ', series or '')
+    text = simplify(text)
+
+    for pattern, replacement in SET_ALIASES:
+        text = re.sub(pattern, replacement, text)
+
+    return ' '.join(text.split())
+
+
+def canonical_name(name):
+    """First initial plus the rest, so 'Cole Caufield', 'C. Caufield' and 'Caufield, Cole' match"""
+
+    name = name or ''
+
+    # "Last, First"
+    if ',' in name:
+        last, _, first = name.partition(',')
+        name = f'{first} {last}'
+
+    # Initials like "J.T." or "P.-L." are one token
+    name = re.sub(r'(?<=\b\w)[.\-]\s*(?=\w\b)', '', name)
+    tokens = simplify(name).split()
+
+    if len(tokens) < 2:
+        return ' '.join(tokens)
+
+    return ' '.join([tokens[0][0], *tokens[1:]])
+
+
+def canonical_number(card_number):
+    """'#201', '201' and '0201' match; letter prefixes keep their letters ('YG-12' -> 'yg12')"""
+
+    number = re.sub(r'[^a-z0-9]', '', simplify(card_number))
+    return number.lstrip('0') or number
+
+
+def canonical_parallel(card_type):
+    text = simplify(card_type)
+    return PARALLEL_ALIASES.get(text, text)
+
+
+def card_identity(fields):
+    """Stable key for one card, whatever casing, spacing or spelling the fields came in with.
+
+    Used to key the pricing caches; the eBay search still uses normalize_query.
+    """
+
+    series = fields.get('card_series', '')
+
+    parts = [
+        canonical_season(series),
+        canonical_set(series),
+        canonical_name(fields.get('name', '')),
+        canonical_number(fields.get('card_number', '')),
+        canonical_parallel(fields.get('card_type', 'Base')),
+    ]
+
+    # Nothing to price without a player
+    if not parts[2]:
+        return ''
+
+    return '|'.join(parts)
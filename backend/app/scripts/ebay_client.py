@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+
+import httpx
+
+from .ebay_token import EbayTokenManager, request_ebay_token
+from .resilience import CircuitBreaker, CircuitOpen, LatencyTracker, RateLimited, TokenBucket
+
+logger = logging.getLogger('pricing')
+
+EBAY_BROWSE_URL = os.getenv('EBAY_BROWSE_URL', 'https://api.ebay.com/buy/browse/v1/item_summary/search')
+
+EBAY_MAX_CONNECTIONS = int(os.getenv('EBAY_MAX_CONNECTIONS', '50'))
+EBAY_KEEPALIVE_CONNECTIONS = int(os.getenv('EBAY_KEEPALIVE_CONNECTIONS', '20'))
+
+# Per worker; size rate to the eBay call quota divided by the number of workers
+EBAY_RATE_PER_SECOND = float(os.getenv('EBAY_RATE_PER_SECOND', '5'))
+EBAY_RATE_BURST = int(os.getenv('EBAY_RATE_BURST', '10'))
+EBAY_RATE_MAX_WAIT_SECONDS = float(os.getenv('EBAY_RATE_MAX_WAIT_SECONDS', '2'))
+
+EBAY_BREAKER_FAILURES = int(os.getenv('EBAY_BREAKER_FAILURES', '5'))  # Consecutive failures that open a breaker
+EBAY_BREAKER_RESET_SECONDS = float(os.getenv('EBAY_BREAKER_RESET_SECONDS', '30'))
+
+# A Browse call still running after this percentile of recent latencies gets a duplicate; first answer wins
+EBAY_HEDGE_PERCENTILE = float(os.getenv('EBAY_HEDGE_PERCENTILE', '95'))
+EBAY_HEDGE_MIN_SAMPLES = int(os.getenv('EBAY_HEDGE_MIN_SAMPLES', '20'))  # No hedging until this many calls were timed
+EBAY_HEDGE_WINDOW = int(os.getenv('EBAY_HEDGE_WINDOW', '200'))
+
+
+class EbayUnavailable(Exception):
+    """eBay could not be reached or kept failing; unlike an empty result this must never be cached"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class EbayCircuitOpen(EbayUnavailable):
+    """eBay has been failing, so the call was refused without trying; retrying now won't help"""
+
+
+class EbayRateLimited(EbayUnavailable):
+    """Our own call budget is used up for the moment; eBay itself may be fine"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message, 429)
+        self.retry_after = retry_after  # Seconds until the limiter frees a token
+
+
+class EbayClient:
+    """Async eBay Browse client on one pooled, keep-alive httpx.AsyncClient.
+
+    Browse calls go through a token bucket, and Browse and OAuth each have a circuit breaker,
+    so an outage costs one fast EbayCircuitOpen per request instead of a full retry loop.
+    A Browse call slower than EBAY_HEDGE_PERCENTILE of recent calls is hedged with a duplicate
+    when the bucket has a spare token.
+    """
+
+    def __init__(self, http=None):
+        self.http = http or httpx.AsyncClient(
+            timeout=httpx.Timeout(10.0, connect=3.0),
+            limits=httpx.Limits(max_connections=EBAY_MAX_CONNECTIONS, max_keepalive_connections=EBAY_KEEPALIVE_CONNECTIONS),
+        )
+        self.tokens = EbayTokenManager(self._request_token)
+        self.limiter = TokenBucket(EBAY_RATE_PER_SECOND, EBAY_RATE_BURST, EBAY_RATE_MAX_WAIT_SECONDS)
+        self.browse_breaker = CircuitBreaker('ebay_browse', EBAY_BREAKER_FAILURES, EBAY_BREAKER_RESET_SECONDS)
+        self.oauth_breaker = CircuitBreaker('ebay_oauth', EBAY_BREAKER_FAILURES, EBAY_BREAKER_RESET_SECONDS)
+        self.latency = LatencyTracker(EBAY_HEDGE_WINDOW, EBAY_HEDGE_MIN_SAMPLES)
+
+        self.stats = Counter()
+
+    async def search(self, params):
+        """Calls Browse item_summary/search and returns the raw response"""
+
+        try:
+            token = await self.tokens.get_token()
+        except CircuitOpen as e:
+            raise EbayCircuitOpen(str(e)) from e
+        except httpx.HTTPError as e:
+            raise EbayUnavailable(f'eBay OAuth failed: {e!r}') from e
+
+        try:
+            self.browse_breaker.check()
+        except CircuitOpen as e:
+            raise EbayCircuitOpen(str(e)) from e
+
+        try:
+            await self.limiter.acquire()
+        except RateLimited as e:
+            raise EbayRateLimited(str(e), e.retry_after) from e
+
+        headers = {
+            'Authorization': f'Bearer {token}',
+            'Content-Type': 'application/json',
+            'X-EBAY-C-MARKETPLACE-ID': 'EBAY_US',
+        }
+
+        try:
+            response = await self._hedged_get(headers, params)
+        except httpx.TransportError:
+            self.browse_breaker.record_failure()
+            raise
+
+        # Throttling and server errors count against eBay's health; other 4xx are our requests' fault
+        if response.status_code >= 500 or response.status_code == 429:
+            self.browse_breaker.record_failure()
+        else:
+            self.browse_breaker.record_success()
+
+        # Token revoked or expired early; the next call fetches a new one
+        if response.status_code == 401:
+            self.tokens.invalidate()
+
+        return response
+
+    def info(self):
+        threshold = self.latency.percentile(EBAY_HEDGE_PERCENTILE)
+
+        return {
+            'rate_limiter': self.limiter.info(),
+            'browse_breaker': self.browse_breaker.info(),
+            'oauth_breaker': self.oauth_breaker.info(),
+            'token_fetches': self.tokens.fetches,
+            'hedge_threshold_ms': round(threshold * 1000) if threshold is not None else None,
+            **self.stats,
+        }
+
+    async def _hedged_get(self, headers, params):
+        """GET Browse, sending one duplicate if the first is slower than the hedge threshold"""
+
+        threshold = self.latency.percentile(EBAY_HEDGE_PERCENTILE)
+        first = asyncio.create_task(self._timed_get(headers, params))
+        tasks = {first}
+
+        try:
+            if threshold is not None:
+                done, _ = await asyncio.wait(tasks, timeout=threshold)
+
+                # Hedges are optional, so they only use spare rate tokens
+                if not done and self.limiter.try_acquire():
+                    self.stats['hedged'] += 1
+                    tasks.add(asyncio.create_task(self._timed_get(headers, params)))
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.stats['hedge_wins'] += 1
+                        return task.result()
+
+            # Every attempt failed; surface the original one's error
+            return first.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _timed_get(self, headers, params):
+        started = time.monotonic()
+        response = await self.http.get(EBAY_BROWSE_URL, headers=headers, params=params)
+        self.latency.record(time.monotonic() - started)
+        return response
+
+    async def _request_token(self):
+        self.oauth_breaker.check()
+
+        try:
+            token = await request_ebay_token(self.http)
+        except httpx.HTTPError:
+            self.oauth_breaker.record_failure()
+            raise
+
+        self.oauth_breaker.record_success()
+        return token
+
+    async def aclose(self):
+        await self.http.aclose()
+
+
+# Shared by every pricing call in this process; created on first use inside the running loop
+_client = None
+
+
+def get_ebay_client():
+    global _client
+
+    if _client is None:
+        _client = EbayClient()
+
+    return _client
+
+
+def ebay_client_info():
+    """Limiter and breaker counters; empty until the first eBay call creates the client"""
+    return _client.info() if _client is not None else {}
+
+
+async def close_ebay_client():
+    global _client
+
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,112 @@
+import asyncio
+import base64
+import logging
+import os
+import time
+
+logger = logging.getLogger('pricing')
+
+EBAY_OAUTH_URL = os.getenv('EBAY_OAUTH_URL', 'https://api.ebay.com/identity/v1/oauth2/token')
+
+TOKEN_REFRESH_MARGIN = 60  # Stop handing out a token this many seconds before it expires
+TOKEN_EARLY_REFRESH = 600  # Start a background refresh this many seconds before it expires
+
+
+async def request_ebay_token(http):
+    """Authenticates with eBay; returns an OAuth access token and its lifetime in seconds"""
+
+    client_id = os.getenv('EBAY_CLIENT_ID')
+    client_secret = os.getenv('EBAY_CLIENT_SECRET')
+
+    if not client_id or not client_secret:
+        raise ValueError('Missing EBAY_CLIENT_ID or EBAY_CLIENT_SECRET in .env')
+
+    # Encode client_id:client_secret in base64
+    auth = base64.b64encode(f'{client_id}:{client_secret}'.encode()).decode()
+
+    # Request headers
+    headers = {
+        'Authorization': f'Basic {auth}',
+        'Content-Type': 'application/x-www-form-urlencoded',
+    }
+
+    # OAuth request body
+    data = {
+        'grant_type': 'client_credentials',
+        'scope': 'https://api.ebay.com/oauth/api_scope',
+    }
+
+    # Request access token
+    response = await http.post(EBAY_OAUTH_URL, headers=headers, data=data, timeout=8)
+
+    response.raise_for_status()
+
+    body = response.json()
+    return body['access_token'], int(body.get('expires_in', 7200))
+
+
+class EbayTokenManager:
+    """Holds the client-credentials token until shortly before it expires, shared by all pricing calls"""
+
+    def __init__(self, fetch, refresh_margin=TOKEN_REFRESH_MARGIN, early_refresh=TOKEN_EARLY_REFRESH, clock=time.monotonic):
+        self.fetch = fetch  # Coroutine function returning (token, expires_in)
+        self.refresh_margin = refresh_margin
+        self.early_refresh = early_refresh
+        self.clock = clock
+
+        self._token = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()  # Held for the duration of a token request
+        self._background = None
+
+        self.fetches = 0
+
+    async def get_token(self):
+        """Returns a usable token, only waiting when there is none"""
+
+        now = self.clock()
+
+        if self._usable(now):
+            if now >= self._expires_at - self.early_refresh:
+                self._refresh_in_background()
+            return self._token
+
+        # No usable token; concurrent callers queue on the lock and reuse the one fetch
+        async with self._lock:
+            if not self._usable(self.clock()):
+                await self._refresh()
+            return self._token
+
+    def invalidate(self):
+        """Drops the current token, e.g. after eBay rejected it"""
+        self._token = None
+        self._expires_at = 0.0
+
+    def _usable(self, now):
+        return self._token is not None and now < self._expires_at - self.refresh_margin
+
+    async def _refresh(self):
+        self.fetches += 1
+        started = self.clock()
+        token, expires_in = await self.fetch()
+
+        self._token = token
+        self._expires_at = started + expires_in
+        logger.info('ebay_token_refreshed', extra={'expires_in': expires_in})
+
+    def _refresh_in_background(self):
+        # Skip if a refresh is already in flight
+        if self._lock.locked() or (self._background is not None and not self._background.done()):
+            return
+
+        self._background = asyncio.create_task(self._background_refresh())
+
+    async def _background_refresh(self):
+        async with self._lock:
+            if self.clock() < self._expires_at - self.early_refresh:
+                return
+            try:
+                await self._refresh()
+            except Exception:
+                # Current token is still valid, the next caller will try again
+                logger.warning('ebay_token_background_refresh_failed', exc_info=True)
@@ -1,44 +1,90 @@
+import os
+
 import cv2
 import easyocr
 import numpy as np
-import torch
 import torchvision.transforms as T
-from torchvision.models.detection import fasterrcnn_resnet50_fpn
+from easyocr.easyocr import imgH as OCR_LINE_HEIGHT
+from easyocr.recognition import get_text
+from easyocr.utils import get_image_list
 from ultralytics import YOLO
 
 from app.utils.s3_models import download_model
 
+from .onnx_export import export_frcnn, export_yolo, load_frcnn
+
+MODEL_BACKEND = os.getenv('MODEL_BACKEND', 'torch')  # torch, or onnx for onnxruntime on CPU
 
-def load_models():
+
+def load_models(backend=MODEL_BACKEND):
     yolo_path = 'models/final_model.pt'
     frcnn_path = 'models/best_model.pth'
 
     download_model('models/final_model.pt', yolo_path)
     download_model('models/best_model.pth', frcnn_path)
 
-    yolo = YOLO(yolo_path)
-
-    frcnn = fasterrcnn_resnet50_fpn(num_classes=6)
-    checkpoint = torch.load(frcnn_path, map_location='cpu')
-    frcnn.load_state_dict(checkpoint['model_state_dict'])
-    frcnn.eval()
+    if backend == 'onnx':
+        # Exported once from the downloaded weights, then reused
+        yolo = YOLO(export_yolo(yolo_path), task='detect')  # ultralytics runs .onnx through onnxruntime
+        frcnn = OnnxFieldDetector(export_frcnn(frcnn_path))
+    else:
+        yolo = YOLO(yolo_path)
+        frcnn = load_frcnn(frcnn_path)
 
     reader = easyocr.Reader(['en'], gpu=False)
 
     return yolo, frcnn, reader
 
 
+class OnnxFieldDetector:
+    """Faster R-CNN exported by onnx_export, run by onnxruntime on CPU.
+
+    Called like the torchvision model, model([image tensor]) -> [{'boxes', 'labels', 'scores'}],
+    with numpy arrays in place of tensors, so detect_boxes works with either.
+    """
+
+    def __init__(self, path, threads=None):
+        import onnxruntime as ort  # Only needed for MODEL_BACKEND=onnx
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+    def eval(self):
+        return self
+
+    def __call__(self, images):
+        results = []
+
+        for image in images:
+            boxes, labels, scores = self.session.run(None, {'image': image.numpy()})
+            results.append({'boxes': boxes, 'labels': labels, 'scores': scores})
+
+        return results
+
+
 def detect_card(yolo, image):
     """Using yolo, detect the card in the image and return the cropped card image."""
 
+    return detect_cards(yolo, [image])[0]
+
+
+def detect_cards(yolo, images):
+    """detect_card for many images in one batched YOLO forward pass; one result (or None) per image"""
+
     # Error handling for model loading
     if yolo is None:
-        return None
+        return [None] * len(images)
 
     # Yolo detection
-    res = yolo(image)[0]
-    print('Detected classes:', [int(box.cls[0]) for box in res.boxes])
-    print('Class names:', yolo.names)
+    results = yolo(images, verbose=False)
+    return [card_from_result(yolo, image, res) for image, res in zip(images, results)]
+
+
+def card_from_result(yolo, image, res):
+    """The first hockey_card box in a YOLO result, with its crop from image"""
 
     # Loop through all boxes
     for box in res.boxes:
@@ -121,3 +167,51 @@ def deskew(image):
 def easy_ocr(reader, image):
     result = reader.readtext(image, detail=0)
     return ' '.join(result)
+
+
+def recognize_batch(reader, crops):
+    """Text of each BGR crop from one batched pass of EasyOCR's recognizer, skipping its text detector.
+
+    Each crop is read as a single line of text. The crops are stacked on one grey canvas and
+    recognized together; Reader.recognize would run them one by one on CPU.
+    """
+
+    greys = [cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.size else None for crop in crops]
+    lines = [grey for grey in greys if grey is not None]
+
+    if not lines:
+        return [''] * len(crops)
+
+    canvas = np.zeros((sum(g.shape[0] for g in lines), max(g.shape[1] for g in lines)), dtype=np.uint8)
+    boxes, tops, y = [], [], 0
+
+    for grey in greys:
+        if grey is None:
+            tops.append(None)
+            continue
+
+        h, w = grey.shape
+        canvas[y : y + h, :w] = grey
+        boxes.append([0, w, y, y + h])
+        tops.append(y)
+        y += h
+
+    image_list, max_width = get_image_list(boxes, [], canvas, model_height=OCR_LINE_HEIGHT, sort_output=False)
+    ignore_char = ''.join(set(reader.character) - set(reader.lang_char))
+
+    results = get_text(
+        reader.character,
+        OCR_LINE_HEIGHT,
+        int(max_width),
+        reader.recognizer,
+        reader.converter,
+        image_list,
+        ignore_char,
+        batch_size=len(image_list),
+        workers=0,
+        device=reader.device,
+    )
+
+    # Boxes come back as corner points; the top edge identifies the crop
+    texts = {box[0][1]: text for box, text, _ in results}
+    return [texts.get(top, '') if top is not None else '' for top in tops]
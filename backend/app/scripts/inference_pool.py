@@ -0,0 +1,292 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import pickle
+import queue
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from app.utils.debug_artifacts import DebugArtifacts, DebugSession
+
+logger = logging.getLogger('app')
+
+INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', '0'))  # Model processes; 0 runs models in the API process
+INFERENCE_THREADS_PER_WORKER = int(os.getenv('INFERENCE_THREADS_PER_WORKER', '1'))  # torch/OpenCV threads in each worker
+INFERENCE_PIN_CPUS = os.getenv('INFERENCE_PIN_CPUS', '0') == '1'  # Pin each worker to its own threads_per_worker cores
+INFERENCE_TIMEOUT_SECONDS = float(os.getenv('INFERENCE_TIMEOUT_SECONDS', '30'))
+INFERENCE_LIVENESS_SECONDS = float(os.getenv('INFERENCE_LIVENESS_SECONDS', '1'))  # How often dead workers are looked for, busy or idle
+
+
+class InferenceError(Exception):
+    """A model call failed or its worker died"""
+
+
+def build_pipelines():
+    """The card detection and OCR pipelines, built once in each worker"""
+
+    from .card_detection import CardDetectionPipeline
+    from .helpers import load_models
+    from .text_detection import TextExtraction
+
+    yolo, frcnn, reader = load_models()
+
+    # One request at a time reaches a worker, so there is nothing to micro-batch
+    return {'detect': CardDetectionPipeline(yolo, max_batch_size=1), 'ocr': TextExtraction(frcnn, reader)}
+
+
+class WorkerDebugSession(DebugSession):
+    """Copies images out of shared memory, which is unmapped before the background write runs"""
+
+    def add(self, name, image):
+        super().add(name, image.copy())
+
+
+def worker_cpus(index, threads, cpu_count):
+    """Cores for worker index when each worker gets threads cores of its own, wrapping around"""
+    return {(index * threads + i) % cpu_count for i in range(threads)}
+
+
+def _serve(index, build, tasks, results, threads, pin):
+    """Worker process: loads the models, then runs tasks until it gets None"""
+
+    if pin and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, worker_cpus(index, threads, os.cpu_count()))
+
+    import cv2
+
+    cv2.setNumThreads(threads)
+    pipelines = build()
+
+    if 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(threads)
+
+    debug_sink = DebugArtifacts()  # Sampling was decided in the API process; this only writes
+
+    while (task := tasks.get()) is not None:
+        task_id, kind, shm_name, shape, dtype, debug_id = task
+
+        try:
+            shm = shared_memory.SharedMemory(name=shm_name)
+        except FileNotFoundError:
+            continue  # The caller gave up and freed the image
+
+        image = None
+
+        try:
+            image = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+            if kind == 'ocr':
+                debug = WorkerDebugSession(debug_sink, debug_id) if debug_id else None
+                result = pipelines['ocr'].run(image, debug=debug)
+            else:
+                result = pipelines['detect'].run(image)
+                if result is not None:
+                    result = {'bbox': result['bbox']}  # The crop is a view of shared memory; callers crop themselves
+
+            # Pickled now, while any array in the result can still read the shared memory
+            results.put((task_id, True, pickle.dumps(result)))
+        except Exception as e:
+            results.put((task_id, False, repr(e)))
+        finally:
+            del image
+            shm.close()
+
+    debug_sink.flush()
+
+
+class InferencePool:
+    """Worker processes that own the models, so inference doesn't compete with API threads for the GIL.
+
+    Images go to workers through shared memory: one copy into a block the worker maps, no
+    pickling. Every worker takes tasks from one queue, and results come back as Futures
+    resolved by a collector thread. A worker that dies is replaced within liveness_interval
+    seconds, even under load; the task it was running times out.
+    """
+
+    def __init__(
+        self,
+        workers=INFERENCE_WORKERS,
+        threads=INFERENCE_THREADS_PER_WORKER,
+        pin=INFERENCE_PIN_CPUS,
+        build=build_pipelines,
+        liveness_interval=INFERENCE_LIVENESS_SECONDS,
+    ):
+        self.threads = threads
+        self.pin = pin
+        self.build = build
+        self.liveness_interval = liveness_interval
+
+        self._ctx = mp.get_context('spawn')  # Forking a process that holds torch threads can deadlock
+        self._tasks = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._ids = itertools.count()
+        self._pending = {}  # task id -> (future, shared memory)
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self.stats = Counter()
+
+        self._workers = [self._start_worker(i) for i in range(workers)]
+        self._collector = threading.Thread(target=self._collect, name='inference-results', daemon=True)
+        self._collector.start()
+
+    def submit(self, kind, image, debug=None):
+        """Queues image for kind ('detect' or 'ocr'); returns a Future for the result"""
+
+        image = np.ascontiguousarray(image)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, image.nbytes))
+        np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)[...] = image
+
+        future = Future()
+        future.set_running_or_notify_cancel()  # Uncancellable, so an awaiting caller giving up can't race the collector's set_result
+        task_id = next(self._ids)
+
+        with self._lock:
+            self._pending[task_id] = (future, shm)
+            self.stats['submitted'] += 1
+
+        debug_id = debug.request_id if debug is not None else None
+        self._tasks.put((task_id, kind, shm.name, image.shape, image.dtype.str, debug_id))
+        return future
+
+    def run(self, kind, image, debug=None, timeout=INFERENCE_TIMEOUT_SECONDS):
+        """submit and wait; raises InferenceError on failure or timeout"""
+
+        future = self.submit(kind, image, debug)
+
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:  # Not the builtin TimeoutError before Python 3.11
+            self._abandon(future)
+            raise InferenceError(f'{kind} took longer than {timeout}s') from None
+
+    async def run_async(self, kind, image, debug=None, timeout=INFERENCE_TIMEOUT_SECONDS):
+        """run for async callers: waits on the event loop instead of blocking a thread"""
+
+        future = self.submit(kind, image, debug)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:  # Not the builtin TimeoutError before Python 3.11
+            self._abandon(future)
+            raise InferenceError(f'{kind} took longer than {timeout}s') from None
+
+    def info(self):
+        return {
+            **self.stats,
+            'workers': len(self._workers),
+            'alive': sum(w.is_alive() for w in self._workers),
+            'in_flight': len(self._pending),
+        }
+
+    def close(self):
+        self._closed = True
+
+        for _ in self._workers:
+            self._tasks.put(None)
+
+        for worker in self._workers:
+            worker.join(timeout=10)
+            if worker.is_alive():
+                worker.terminate()
+
+        self._collector.join(timeout=5)
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        for future, shm in pending.values():
+            future.set_exception(InferenceError('Inference pool closed'))
+            self._free(shm)
+
+    def _start_worker(self, index):
+        worker = self._ctx.Process(
+            target=_serve,
+            args=(index, self.build, self._tasks, self._results, self.threads, self.pin),
+            name=f'inference-{index}',
+            daemon=True,
+        )
+        worker.start()
+        return worker
+
+    def _collect(self):
+        checked = time.monotonic()
+
+        while not self._closed:
+            # On a timer rather than only when idle, so steady traffic doesn't keep the pool short a worker
+            if time.monotonic() - checked >= self.liveness_interval:
+                self._replace_dead_workers()
+                checked = time.monotonic()
+
+            try:
+                task_id, success, result = self._results.get(timeout=self.liveness_interval)
+            except queue.Empty:
+                continue
+
+            with self._lock:
+                entry = self._pending.pop(task_id, None)
+
+            if entry is None:
+                continue
+
+            future, shm = entry
+            self._free(shm)
+
+            if success:
+                self.stats['completed'] += 1
+                future.set_result(pickle.loads(result))
+            else:
+                self.stats['errors'] += 1
+                future.set_exception(InferenceError(result))
+
+    def _abandon(self, future):
+        """Frees a timed-out task's image; a worker that still picks it up skips it"""
+
+        with self._lock:
+            task_id = next((i for i, (f, _) in self._pending.items() if f is future), None)
+            entry = self._pending.pop(task_id, None)
+
+        self.stats['timeouts'] += 1
+        if entry is not None:
+            self._free(entry[1])
+
+    def _replace_dead_workers(self):
+        for i, worker in enumerate(self._workers):
+            if not worker.is_alive() and not self._closed:
+                logger.error('inference_worker_died', extra={'worker': i, 'exitcode': worker.exitcode})
+                self.stats['restarts'] += 1
+                self._workers[i] = self._start_worker(i)
+
+    @staticmethod
+    def _free(shm):
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class PooledPipeline:
+    """Stands in for CardDetectionPipeline or TextExtraction, running them in an InferencePool"""
+
+    def __init__(self, pool, kind):
+        self.pool = pool
+        self.kind = kind
+
+    def run(self, image, debug=None):
+        return self.pool.run(self.kind, image, debug=debug)
+
+    async def run_async(self, image, debug=None):
+        return await self.pool.run_async(self.kind, image, debug=debug)
+
+    def info(self):
+        return self.pool.info()
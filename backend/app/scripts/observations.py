@@ -0,0 +1,159 @@
+import argparse
+import asyncio
+import logging
+import os
+from collections import Counter
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from app.db.database import SessionLocal
+from app.db.model import SaleObservation
+from app.utils.clock import utcnow
+
+logger = logging.getLogger('pricing')
+
+PRICING_OBSERVATION_LIMIT = int(os.getenv('PRICING_OBSERVATION_LIMIT', '100'))  # Most recent sales an estimate uses
+
+
+class ObservationStore:
+    """Raw sold listings per query, stored once per eBay item id.
+
+    Estimates are computed from these rows, so eBay only has to be asked for listings newer than
+    the last sync. Like the pricing cache this is an optimization: database errors are logged and
+    callers fall back to what they just fetched.
+    """
+
+    def __init__(self, session_factory=SessionLocal, limit=PRICING_OBSERVATION_LIMIT, clock=utcnow):
+        self.session_factory = session_factory
+        self.limit = limit
+        self.clock = clock
+
+        self.stats = Counter()
+
+    def known_ids(self, query):
+        """Item ids already stored for query; empty when the table can't be read"""
+
+        try:
+            with self.session_factory() as db:
+                rows = db.query(SaleObservation.item_id).filter(SaleObservation.query_key == query).all()
+        except SQLAlchemyError:
+            logger.warning('observations_load_failed', exc_info=True)
+            self.stats['db_errors'] += 1
+            return set()
+
+        return {item_id for (item_id,) in rows}
+
+    def add(self, query, listings):
+        """Stores listings that aren't known yet; returns how many were new"""
+
+        seen_at = self.clock()
+        unique = {listing['item_id']: listing for listing in listings if listing.get('item_id')}
+
+        if not unique:
+            return 0
+
+        try:
+            with self.session_factory() as db:
+                known = {
+                    item_id
+                    for (item_id,) in db.query(SaleObservation.item_id).filter(
+                        SaleObservation.query_key == query, SaleObservation.item_id.in_(list(unique))
+                    )
+                }
+                rows = [
+                    SaleObservation(query_key=query, item_id=item_id, price=listing['price'], sold_at=listing.get('sold_at'), seen_at=seen_at)
+                    for item_id, listing in unique.items()
+                    if item_id not in known
+                ]
+                db.add_all(rows)
+
+                try:
+                    db.commit()
+                except IntegrityError:
+                    # Another worker stored some of them first; merge instead
+                    db.rollback()
+                    for row in rows:
+                        db.merge(row)
+                    db.commit()
+        except SQLAlchemyError:
+            logger.warning('observations_save_failed', exc_info=True)
+            self.stats['db_errors'] += 1
+            return 0
+
+        self.stats['stored'] += len(rows)
+        self.stats['duplicates'] += len(unique) - len(rows)
+        return len(rows)
+
+    def prices(self, query):
+        """The limit most recent prices for query, or None when the table can't be read"""
+
+        recency = func.coalesce(SaleObservation.sold_at, SaleObservation.seen_at)
+
+        try:
+            with self.session_factory() as db:
+                rows = db.query(SaleObservation.price).filter(SaleObservation.query_key == query).order_by(recency.desc()).limit(self.limit).all()
+        except SQLAlchemyError:
+            logger.warning('observations_load_failed', exc_info=True)
+            self.stats['db_errors'] += 1
+            return None
+
+        return [price for (price,) in rows]
+
+    def segments(self):
+        """Every stored query as (keys, values, offsets) for estimate_prices_batch, limit sales per query"""
+
+        recency = func.coalesce(SaleObservation.sold_at, SaleObservation.seen_at)
+
+        with self.session_factory() as db:
+            rows = db.query(SaleObservation.query_key, SaleObservation.price).order_by(SaleObservation.query_key, recency.desc()).all()
+
+        keys, values, counts = [], [], []
+
+        for query, price in rows:
+            if not keys or keys[-1] != query:
+                keys.append(query)
+                counts.append(0)
+            if counts[-1] < self.limit:
+                values.append(price)
+                counts[-1] += 1
+
+        return keys, np.asarray(values, dtype=np.float64), np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+    def info(self):
+        return dict(self.stats)
+
+
+async def reestimate_all(store, cache):
+    """Re-prices every stored query from local observations and refreshes the pricing cache; no eBay calls"""
+    from .pricing import estimate_prices_batch
+
+    keys, values, offsets = await asyncio.to_thread(store.segments)
+    batch = estimate_prices_batch(values, offsets)
+
+    for i, query in enumerate(keys):
+        result = {
+            'estimate': float(batch['estimate'][i]),
+            'price_low': float(batch['low'][i]),
+            'price_high': float(batch['high'][i]),
+            'confidence': float(batch['confidence'][i]),
+            'sales_count': int(batch['num_sales'][i]),
+        }
+        await cache.store(query, result)
+
+    return len(keys)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Re-price every stored query from local sale observations')
+    parser.parse_args()
+
+    from .pricing import observation_store, pricing_cache
+
+    print(f'reestimated {await reestimate_all(observation_store, pricing_cache)} queries')
+
+
+# Backfill after changing the outlier rule or confidence weights: python -m app.scripts.observations
+if __name__ == '__main__':
+    asyncio.run(main())
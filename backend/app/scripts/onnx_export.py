@@ -0,0 +1,76 @@
+import argparse
+import inspect
+import os
+
+import torch
+from torchvision.models.detection import fasterrcnn_resnet50_fpn
+from ultralytics import YOLO
+
+FRCNN_OPSET = 11  # Oldest opset torchvision's Faster R-CNN exports to; widest onnxruntime support
+
+
+def onnx_path(path):
+    return os.path.splitext(path)[0] + '.onnx'
+
+
+def export_yolo(path, imgsz=640, force=False):
+    """Exports YOLO weights to <path>.onnx with a dynamic batch, for micro-batched detection; returns the ONNX path"""
+
+    target = onnx_path(path)
+
+    if force or not os.path.exists(target):
+        # Class names go into the graph's metadata, so YOLO(target) keeps yolo.names
+        exported = YOLO(path).export(format='onnx', imgsz=imgsz, dynamic=True, simplify=False)
+        os.replace(exported, target)
+
+    return target
+
+
+def load_frcnn(path):
+    frcnn = fasterrcnn_resnet50_fpn(num_classes=6, weights=None, weights_backbone=None)
+    frcnn.load_state_dict(torch.load(path, map_location='cpu')['model_state_dict'])
+    return frcnn.eval()
+
+
+def export_frcnn(path, force=False, model=None):
+    """Exports the field detector to <path>.onnx taking one CHW float image of any size; returns the ONNX path"""
+
+    target = onnx_path(path)
+
+    if not force and os.path.exists(target):
+        return target
+
+    model = model if model is not None else load_frcnn(path)
+
+    # torch >= 2.5 defaults to the dynamo exporter, which can't trace the detection heads yet
+    legacy = {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            ([torch.rand(3, 800, 600)],),
+            target,
+            opset_version=FRCNN_OPSET,
+            input_names=['image'],
+            output_names=['boxes', 'labels', 'scores'],
+            dynamic_axes={'image': {1: 'height', 2: 'width'}, 'boxes': {0: 'detections'}, 'labels': {0: 'detections'}, 'scores': {0: 'detections'}},
+            **legacy,
+        )
+
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the card and field detectors to ONNX for MODEL_BACKEND=onnx')
+    parser.add_argument('--yolo', default='models/final_model.pt')
+    parser.add_argument('--frcnn', default='models/best_model.pth')
+    parser.add_argument('--force', action='store_true', help='Re-export even if the .onnx file exists')
+    args = parser.parse_args()
+
+    print(export_yolo(args.yolo, force=args.force))
+    print(export_frcnn(args.frcnn, force=args.force))
+
+
+# python -m app.scripts.onnx_export [--yolo models/final_model.pt] [--frcnn models/best_model.pth] [--force]
+if __name__ == '__main__':
+    main()
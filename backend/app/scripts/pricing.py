@@ -1,14 +1,20 @@
-import base64
+import asyncio
 import logging
 import os
+import random
 import re
 import time
-from functools import lru_cache
+from datetime import datetime, timezone
 
+import httpx
 import numpy as np
-import requests
 from dotenv import load_dotenv
 
+from .card_identity import card_identity
+from .ebay_client import EbayCircuitOpen, EbayRateLimited, EbayUnavailable, get_ebay_client
+from .observations import ObservationStore
+from .pricing_cache import PricingCache
+
 load_dotenv()
 
 logger = logging.getLogger('pricing')
@@ -16,44 +22,25 @@ logging.basicConfig(level=logging.INFO)
 
 MIN_SALES = 3
 MAX_RETRIES = 3
-BACKOFF_SECONDS = 1.5
-
+BACKOFF_SECONDS = 0.5  # Base of the exponential, jittered backoff between retries
+RETRY_STATUS_CODES = {401, 429}  # Plus every 5xx
 
-def get_ebay_token():
-    """Authenticates with eBay and returns an OAuth access token to browse their API"""
+# Adaptive sold-listing fetch: page until the estimate is confident enough, out of pages or out of time
+PRICING_PAGE_SIZE = int(os.getenv('PRICING_PAGE_SIZE', '20'))  # compute_confidence's sample score saturates at 20 sales
+PRICING_MAX_PAGES = int(os.getenv('PRICING_MAX_PAGES', '5'))
+PRICING_TARGET_CONFIDENCE = float(os.getenv('PRICING_TARGET_CONFIDENCE', '75'))
+PRICING_FETCH_DEADLINE_SECONDS = float(os.getenv('PRICING_FETCH_DEADLINE_SECONDS', '8'))
 
-    client_id = os.getenv('EBAY_CLIENT_ID')
-    client_secret = os.getenv('EBAY_CLIENT_SECRET')
+PRICING_BATCH_CONCURRENCY = int(os.getenv('PRICING_BATCH_CONCURRENCY', '8'))  # eBay lookups in flight per batch
 
-    if not client_id or not client_secret:
-        raise ValueError('Missing EBAY_CLIENT_ID or EBAY_CLIENT_SECRET in .env')
+# Shared with other workers through the pricing_cache table
+pricing_cache = PricingCache()
+observation_store = ObservationStore()
 
-    # Encode client_id:client_secret in base64
-    auth = base64.b64encode(f'{client_id}:{client_secret}'.encode()).decode()
 
-    # Request headers
-    headers = {
-        'Authorization': f'Basic {auth}',
-        'Content-Type': 'application/x-www-form-urlencoded',
-    }
-
-    # OAuth request body
-    data = {
-        'grant_type': 'client_credentials',
-        'scope': 'https://api.ebay.com/oauth/api_scope',
-    }
-
-    # Request access token
-    response = requests.post(
-        'https://api.ebay.com/identity/v1/oauth2/token',
-        headers=headers,
-        data=data,
-        timeout=(3, 8),
-    )
-
-    response.raise_for_status()
-
-    return response.json()['access_token']
+async def get_ebay_token():
+    """Returns the shared eBay OAuth access token, refreshing it only when close to expiry"""
+    return await get_ebay_client().tokens.get_token()
 
 
 def normalize_query(fields):
@@ -80,49 +67,133 @@ def normalize_query(fields):
     return query
 
 
-def get_sold_prices(query, limit=25):
-    """eBay sold listings search active; Returns a list of sale prices"""
+async def get_sold_prices(query, **kwargs):
+    """eBay sold listings search active; Returns a list of sale prices (empty when there are no sales)"""
+    return [listing['price'] for listing in await get_sold_listings(query, **kwargs)]
 
-    token = get_ebay_token()
 
-    headers = {
-        'Authorization': f'Bearer {token}',
-        'Content-Type': 'application/json',
-        'X-EBAY-C-MARKETPLACE-ID': 'EBAY_US',
-    }
+async def get_sold_listings(
+    query,
+    page_size=PRICING_PAGE_SIZE,
+    max_pages=PRICING_MAX_PAGES,
+    target_confidence=PRICING_TARGET_CONFIDENCE,
+    deadline=PRICING_FETCH_DEADLINE_SECONDS,
+    known_ids=frozenset(),
+):
+    """Sold listings newest first, as dicts with item_id, price and sold_at
+
+    Pages through results and re-estimates after each page, stopping once compute_confidence reaches
+    target_confidence, results run out, max_pages were read or deadline seconds have passed.
+    Listings in known_ids were stored by an earlier sync and are skipped. Results come in listing
+    order, not sale order, so a listing created before the last sync that sold since can sit among
+    known ones; an incremental sync only ends at a page that is entirely known.
+    Raises EbayUnavailable when the first page fails, so callers can tell an outage from "no sales".
+    """
+
+    started = time.monotonic()
+    listings = []
+
+    # At least one page, or there is nothing to tell no sales from an outage
+    for page in range(max(1, max_pages)):
+        try:
+            page_listings, has_more = await get_sold_page(query, offset=page * page_size, limit=page_size)
+        except EbayUnavailable:
+            if page == 0:
+                raise
+            # Later pages only refine the estimate; keep what we have
+            logger.warning('ebay_page_failed', extra={'query': query, 'page': page})
+            break
+
+        new = [listing for listing in page_listings if listing['item_id'] not in known_ids]
+        listings.extend(new)
+
+        caught_up = known_ids and not new
+        if caught_up or not has_more:
+            break
+
+        confidence = compute_confidence(estimate_price([listing['price'] for listing in listings]))
+
+        if confidence >= target_confidence or time.monotonic() - started >= deadline:
+            break
+
+    logger.info('sold_prices_fetched', extra={'query': query, 'pages': page + 1, 'sales': len(listings)})
+    return listings
+
+
+async def get_sold_page(query, offset=0, limit=PRICING_PAGE_SIZE):
+    """One page of sold listings; returns (listings, has_more). Retries transient failures.
+
+    An open circuit breaker or exhausted rate limit fails immediately instead of retrying.
+    """
 
     params = {
         'q': query,
         'limit': limit,
+        'offset': offset,
         'filter': 'soldItems:true',
-        'sort': 'price',  # Sort by price (lowest first helps find the 'floor')
+        'sort': 'newlyListed',  # Recency, so every page is a fair sample rather than the cheapest sales
     }
 
-    # Browse API
-    url = 'https://api.ebay.com/buy/browse/v1/item_summary/search'
+    client = get_ebay_client()
+
+    failure = None
 
     for attempt in range(MAX_RETRIES):
-        response = requests.get(url, headers=headers, params=params, timeout=(3, 10))
+        # Browse API
+        try:
+            response = await client.search(params)
+        except (EbayCircuitOpen, EbayRateLimited):
+            raise
+        except httpx.TransportError as e:
+            failure = EbayUnavailable(f'eBay transport error: {e!r}')
+            response = None
+        except EbayUnavailable as e:
+            failure = e
+            response = None
 
         # Handle API errors
-        if response.status_code == 200:
+        if response is not None and response.status_code == 200:
             data = response.json()
-            prices = []
+            listings = []
 
             for item in data.get('itemSummaries', []):
                 price_obj = item.get('price', {})
                 price = price_obj.get('value')
                 try:
-                    prices.append(float(price))
+                    listings.append({'item_id': item.get('itemId'), 'price': float(price), 'sold_at': parse_sold_at(item)})
                 except (TypeError, ValueError):
                     continue
 
-            return prices
+            has_more = 'next' in data or offset + limit < data.get('total', 0)
+            return listings, has_more
+
+        if response is not None:
+            failure = EbayUnavailable(f'eBay returned {response.status_code}', response.status_code)
+
+            # Bad request; retrying the same query won't help
+            if response.status_code < 500 and response.status_code not in RETRY_STATUS_CODES:
+                break
 
         logger.warning('ebay_failed', extra={'query': query, 'attempt': attempt})
-        time.sleep(BACKOFF_SECONDS * (attempt + 1))
 
-    return []
+        # Exponential with full jitter so workers don't retry in lockstep; no sleep after the last attempt
+        if attempt + 1 < MAX_RETRIES:
+            await asyncio.sleep(random.uniform(0, BACKOFF_SECONDS * 2**attempt))  # Yields the event loop instead of holding a worker
+
+    raise failure
+
+
+def parse_sold_at(item):
+    """itemEndDate as a naive UTC datetime, or None when missing or malformed"""
+
+    try:
+        ended = datetime.fromisoformat(item['itemEndDate'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    if ended.tzinfo is not None:
+        ended = ended.astimezone(timezone.utc).replace(tzinfo=None)
+    return ended
 
 
 def estimate_price(prices):
@@ -183,8 +254,92 @@ def compute_confidence(stats):
     return round(100 * (0.6 * sample_score + 0.4 * spread_score), 2)
 
 
-def price_card(fields):
-    """Takes confirmed card fields and returns a market estimate"""
+def per_segment(values, starts, counts, reduce, width=1):
+    """reduce(block) for every segment; returns width arrays with one entry per segment, nan for empty ones.
+
+    Segments of equal length are stacked into a (segments, length) block and reduced along axis 1,
+    so each row goes through the same numpy call the scalar path makes on its prices. Loops over
+    distinct lengths, not segments.
+    """
+
+    result = np.full((len(counts), width), np.nan)
+
+    for n in np.unique(counts[counts > 0]):
+        rows = np.flatnonzero(counts == n)
+        block = values[starts[rows, None] + np.arange(n)]
+        result[rows] = np.reshape(reduce(block), (width, len(rows))).T
+
+    return result.T
+
+
+def round_cents(values):
+    """round(x, 2) per element, as the scalar path rounds; np.round can land a cent away near half cents"""
+    return np.array([round(float(value), 2) for value in values], dtype=np.float64)
+
+
+def estimate_prices_batch(values, offsets):
+    """Vectorized estimate_price + compute_confidence over many ragged price lists.
+
+    Segment i is values[offsets[i]:offsets[i + 1]]. Returns a dict of arrays (one entry per segment):
+    estimate, low, high, num_sales, iqr (nan below MIN_SALES) and confidence, equal to what the
+    scalar path returns. Segments with no prices have num_sales 0, nan prices and confidence 0,
+    where the scalar path returns None.
+    """
+
+    def quartiles(block):
+        return np.percentile(block, [25, 75], axis=1)
+
+    values = np.asarray(values, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    counts = np.diff(offsets)
+    segment = np.repeat(np.arange(len(counts)), counts)
+    starts = offsets[:-1]
+
+    q1, q3 = per_segment(values, starts, counts, quartiles, width=2)
+    iqr = q3 - q1
+
+    # IQR outlier rule, only for segments with enough sales (same as the scalar path)
+    filtered = counts >= MIN_SALES
+    lower = np.where(filtered, q1 - 1.5 * iqr, -np.inf)[segment]
+    upper = np.where(filtered, q3 + 1.5 * iqr, np.inf)[segment]
+    keep = (values >= lower) & (values <= upper)
+
+    kept_values = values[keep]
+    kept_counts = np.bincount(segment[keep], minlength=len(counts))
+    kept_starts = np.concatenate(([0], np.cumsum(kept_counts)[:-1])).astype(np.int64)
+
+    (estimate,) = per_segment(kept_values, kept_starts, kept_counts, lambda block: np.median(block, axis=1))
+    low, high = per_segment(kept_values, kept_starts, kept_counts, quartiles, width=2)
+    estimate, low, high = round_cents(estimate), round_cents(low), round_cents(high)
+    iqr = np.where(filtered, round_cents(iqr), np.nan)
+
+    # compute_confidence on the rounded stats; float64 arithmetic matches Python's floats
+    spread = np.nan_to_num(iqr, nan=0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        spread_ratio = np.where(estimate != 0, spread / estimate, 1.0)
+    sample_score = np.minimum(1.0, kept_counts / 20)
+    spread_score = np.maximum(0.0, 1.0 - spread_ratio)
+    confidence = round_cents(100 * (0.6 * sample_score + 0.4 * spread_score))
+    confidence = np.where(kept_counts > 0, confidence, 0.0)
+
+    return {
+        'estimate': estimate,
+        'low': low,
+        'high': high,
+        'num_sales': kept_counts,
+        'iqr': iqr,
+        'confidence': confidence,
+    }
+
+
+async def price_card(fields, budget=None, refresh=False):
+    """Takes confirmed card fields and returns a market estimate
+
+    With a budget (seconds), gives up waiting on eBay when it runs out and returns the last known
+    estimate flagged stale: True, or a PRICING_TIMEOUT error. The lookup keeps running in the
+    background and fills the cache for the next request. refresh skips cached results and always
+    asks eBay; the new result is still cached.
+    """
 
     query = normalize_query(fields)
 
@@ -192,25 +347,75 @@ def price_card(fields):
         return {'query': None, 'error': 'Invalid query'}
 
     logger.info('Pricing request', extra={'fields': fields})
-    result = cached_pricing(query)
 
-    cache_info = cached_pricing.cache_info()
-
-    logger.info(
-        'pricing_cache',
-        extra={
-            'hits': cache_info.hits,
-            'misses': cache_info.misses,
-            'size': cache_info.currsize,
-        },
-    )
+    key = card_identity(fields) or query
+
+    try:
+        result = await asyncio.wait_for(cached_pricing(query, key, refresh), budget)
+    except asyncio.TimeoutError:
+        logger.warning('pricing_deadline_exceeded', extra={'query': query, 'budget': budget})
+        return await last_known_price(key) or {'query': query, 'error': 'eBay too slow', 'error_code': 'PRICING_TIMEOUT'}
+    except EbayRateLimited as e:
+        # Our own eBay budget is spent for now, which says nothing about eBay's health
+        logger.warning('pricing_rate_limited', extra={'query': query, 'retry_after': e.retry_after})
+        return await last_known_price(key) or {
+            'query': query,
+            'error': 'Pricing rate limited',
+            'error_code': 'PRICING_RATE_LIMITED',
+            'retry_after': e.retry_after,
+        }
+    except EbayUnavailable as e:
+        # Nothing was cached, so the next request tries eBay again
+        logger.warning('pricing_upstream_failed', extra={'query': query, 'error': str(e)})
+        return await last_known_price(key) or {'query': query, 'error': 'eBay unavailable', 'error_code': 'PRICING_UPSTREAM_ERROR'}
+    finally:
+        logger.info('pricing_cache', extra=pricing_cache.info())
 
     if not result:
-        return {'query': query, 'error': 'Pricing empty'}
+        return {'query': query, 'error': 'Pricing empty', 'error_code': 'PRICING_NO_DATA'}
 
     return result
 
 
+async def last_known_price(key):
+    """Best answer without eBay: an expired cache entry, else an estimate from stored sales.
+
+    Flagged stale: True so callers don't record it as a new price. None if there is nothing.
+    """
+
+    result = await pricing_cache.peek(key) or pricing_core(await asyncio.to_thread(observation_store.prices, key) or ())
+    return {**result, 'stale': True} if result else None
+
+
+async def price_many(fields_list, concurrency=PRICING_BATCH_CONCURRENCY, budget=None, refresh=False):
+    """Prices many cards, once per distinct card identity, with at most concurrency lookups in flight.
+
+    Yields (indexes, result) as each lookup finishes, where indexes are the positions in fields_list
+    that share that identity and result is what price_card returned for it. budget and refresh
+    apply to each lookup as in price_card.
+    """
+
+    groups = {}
+    for i, fields in enumerate(fields_list):
+        groups.setdefault(card_identity(fields) or normalize_query(fields), []).append(i)
+
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(indexes):
+        async with limit:
+            return indexes, await price_card(fields_list[indexes[0]], budget, refresh)
+
+    tasks = [asyncio.create_task(one(indexes)) for indexes in groups.values()]
+
+    try:
+        for done in asyncio.as_completed(tasks):
+            yield await done
+    finally:
+        # Client went away mid-stream
+        for task in tasks:
+            task.cancel()
+
+
 def pricing_core(prices: list[float]):
     stats = estimate_price(prices)
 
@@ -229,12 +434,36 @@ def pricing_core(prices: list[float]):
 
 
 # Caching pricing to keep some info so API calls aren't as expensive
-@lru_cache(maxsize=256)
-def cached_pricing(query: str):
-    prices = get_sold_prices(query)
+async def cached_pricing(query: str, key: str = None, refresh: bool = False):
+    """Cached by card identity when given, so spelling variants of one card share an entry"""
+
+    def fetch(key):
+        return fetch_pricing(query, key)
+
+    if refresh:
+        return await pricing_cache.refresh(key or query, fetch)
+
+    return await pricing_cache.get_or_fetch(key or query, fetch)
+
+
+async def fetch_pricing(query: str, key: str = None):
+    # EbayUnavailable propagates, so failures never reach the cache; None (no sales) is negative-cached
+    key = key or query
+    known = await asyncio.to_thread(observation_store.known_ids, key)
+    listings = await get_sold_listings(query, known_ids=known)
+
+    await asyncio.to_thread(observation_store.add, key, listings)
+    prices = await asyncio.to_thread(observation_store.prices, key)
+
+    # Table unavailable; price from this fetch alone
+    if prices is None:
+        prices = [listing['price'] for listing in listings]
+
+    logger.info('sold_listings_synced', extra={'query': query, 'new': len(listings), 'known': len(known)})
     return pricing_core(tuple(prices))
 
 
+# Calls real eBay unless EBAY_OAUTH_URL / EBAY_BROWSE_URL point at a stand-in (python -m tests.fakes serve)
 def test():
     test_card = {
         'card_series': '2021-22 Upper Deck Series 2 Hockey',
@@ -243,7 +472,7 @@ def test():
         'card_type': 'Base',
     }
 
-    result = price_card(test_card)
+    result = asyncio.run(price_card(test_card))
     print(result)
 
 
@@ -0,0 +1,253 @@
+import asyncio
+import logging
+import os
+from collections import Counter, OrderedDict
+from datetime import timedelta
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.db.database import SessionLocal
+from app.db.model import PricingCacheEntry
+from app.utils.clock import utcnow
+
+logger = logging.getLogger('pricing')
+
+PRICING_CACHE_TTL_SECONDS = int(os.getenv('PRICING_CACHE_TTL_SECONDS', str(6 * 3600)))
+PRICING_CACHE_STALE_SECONDS = int(os.getenv('PRICING_CACHE_STALE_SECONDS', str(24 * 3600)))
+PRICING_NEGATIVE_TTL_SECONDS = int(os.getenv('PRICING_NEGATIVE_TTL_SECONDS', '900'))
+PRICING_L1_SIZE = int(os.getenv('PRICING_L1_SIZE', '256'))
+PRICING_CACHE_PURGE_EVERY = int(os.getenv('PRICING_CACHE_PURGE_EVERY', '500'))  # Table writes between purges of dead rows; 0 never purges
+
+# Result kinds; a fetch that raises is a failure and is never cached
+KIND_OK = 'ok'
+KIND_NO_SALES = 'no_sales'
+
+
+class CachedPrice:
+    """One cached pricing result and its freshness window"""
+
+    __slots__ = ('result', 'kind', 'fetched_at', 'expires_at', 'stale_until')
+
+    def __init__(self, result, kind, fetched_at, expires_at, stale_until):
+        self.result = result
+        self.kind = kind
+        self.fetched_at = fetched_at
+        self.expires_at = expires_at
+        self.stale_until = stale_until
+
+
+class PricingCache:
+    """Two-level pricing cache: an in-process LRU (L1) in front of the pricing_cache table (L2).
+
+    The table is shared by every worker and survives restarts. Entries are fresh for ttl seconds,
+    then served stale for up to stale seconds while one background task refetches them.
+    A None result means eBay had no sales; it is kept for negative_ttl seconds with no stale window.
+    If fetch raises, nothing is stored and the error reaches the caller.
+    Every purge_every writes to the table, rows past their stale window are deleted.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        ttl=PRICING_CACHE_TTL_SECONDS,
+        stale=PRICING_CACHE_STALE_SECONDS,
+        negative_ttl=PRICING_NEGATIVE_TTL_SECONDS,
+        l1_size=PRICING_L1_SIZE,
+        clock=utcnow,
+        purge_every=PRICING_CACHE_PURGE_EVERY,
+    ):
+        self.session_factory = session_factory
+        self.ttl = timedelta(seconds=ttl)
+        self.stale = timedelta(seconds=stale)
+        self.negative_ttl = timedelta(seconds=negative_ttl)
+        self.l1_size = l1_size
+        self.clock = clock
+        self.purge_every = purge_every
+
+        self._l1 = OrderedDict()
+        self._inflight = {}  # key -> task fetching it; shared by concurrent misses and revalidation
+        self._writes = 0
+
+        self.stats = Counter()
+
+    async def get_or_fetch(self, key, fetch):
+        """Returns the cached result for key, calling fetch(key) on a miss"""
+
+        entry = self._get_l1(key)
+        level = 'l1'
+
+        # Another worker may already have refreshed what this process holds
+        if entry is None or self.clock() >= entry.expires_at:
+            stored = await asyncio.to_thread(self._load, key)
+            level = 'l2'
+
+            if stored is not None and (entry is None or stored.fetched_at > entry.fetched_at):
+                entry = stored
+                self._put_l1(key, entry)
+
+        now = self.clock()
+
+        if entry is not None and now < entry.expires_at:
+            self.stats[f'{level}_hits'] += 1
+            if entry.kind == KIND_NO_SALES:
+                self.stats['negative_hits'] += 1
+            return entry.result
+
+        if entry is not None and now < entry.stale_until:
+            self.stats['stale_hits'] += 1
+            self._revalidate(key, fetch)
+            return entry.result
+
+        self.stats['misses'] += 1
+
+        # Shielded so one caller disconnecting doesn't cancel the fetch for everyone waiting on it
+        return await asyncio.shield(self._fetch_once(key, fetch))
+
+    async def refresh(self, key, fetch):
+        """Calls fetch(key) whatever is cached and stores the result; shares a fetch already in flight"""
+
+        self.stats['refreshes'] += 1
+        return await asyncio.shield(self._fetch_once(key, fetch))
+
+    async def store(self, key, result):
+        now = self.clock()
+
+        if result is None:
+            entry = CachedPrice(None, KIND_NO_SALES, now, now + self.negative_ttl, now + self.negative_ttl)
+        else:
+            entry = CachedPrice(result, KIND_OK, now, now + self.ttl, now + self.ttl + self.stale)
+
+        self._put_l1(key, entry)
+        await asyncio.to_thread(self._save, key, entry)
+
+        # The table outlives the process; without this, dead rows (negative entries most of all) pile up
+        self._writes += 1
+        if self.purge_every and self._writes % self.purge_every == 0:
+            await asyncio.to_thread(self.purge_expired)
+
+    async def peek(self, key):
+        """The last stored result for key whatever its age, without fetching; None if there is none"""
+
+        entry = self._l1.get(key)
+
+        if entry is None:
+            entry = await asyncio.to_thread(self._load, key)
+
+        return entry.result if entry is not None else None
+
+    def info(self):
+        return {**self.stats, 'l1_size': len(self._l1), 'inflight': len(self._inflight)}
+
+    def clear_l1(self):
+        self._l1.clear()
+
+    def purge_expired(self):
+        """Deletes rows that are past their stale window; returns how many were removed"""
+
+        try:
+            with self.session_factory() as db:
+                removed = db.query(PricingCacheEntry).filter(PricingCacheEntry.stale_until <= self.clock()).delete()
+                db.commit()
+        except SQLAlchemyError:
+            logger.warning('pricing_cache_purge_failed', exc_info=True)
+            self.stats['db_errors'] += 1
+            return 0
+
+        self.stats['l2_evictions'] += removed
+        return removed
+
+    def _get_l1(self, key):
+        entry = self._l1.get(key)
+
+        if entry is None:
+            return None
+
+        # Past its stale window, so useless to everyone
+        if self.clock() >= entry.stale_until:
+            del self._l1[key]
+            self.stats['l1_expired'] += 1
+            return None
+
+        self._l1.move_to_end(key)
+        return entry
+
+    def _put_l1(self, key, entry):
+        self._l1[key] = entry
+        self._l1.move_to_end(key)
+
+        while len(self._l1) > self.l1_size:
+            self._l1.popitem(last=False)
+            self.stats['l1_evictions'] += 1
+
+    def _fetch_once(self, key, fetch):
+        """Starts fetch(key) unless one is already in flight; concurrent callers share its task"""
+
+        task = self._inflight.get(key)
+
+        if task is not None:
+            self.stats['coalesced'] += 1
+            return task
+
+        async def run():
+            try:
+                result = await fetch(key)
+            except Exception:
+                self.stats['fetch_failures'] += 1
+                raise
+
+            await self.store(key, result)
+            return result
+
+        task = asyncio.create_task(run())
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    def _revalidate(self, key, fetch):
+        """Refetches key in the background, at most once at a time per key"""
+
+        if key in self._inflight:
+            return
+
+        self.stats['revalidations'] += 1
+        task = self._fetch_once(key, fetch)
+
+        def done(task):
+            # Keep serving the stale entry; the next request will try again
+            if not task.cancelled() and task.exception() is not None:
+                logger.warning('pricing_cache_revalidate_failed', extra={'query': key, 'error': str(task.exception())})
+
+        task.add_done_callback(done)
+
+    def _load(self, key):
+        try:
+            with self.session_factory() as db:
+                row = db.get(PricingCacheEntry, key)
+
+                if row is None:
+                    return None
+
+                return CachedPrice(row.result, row.kind, row.fetched_at, row.expires_at, row.stale_until)
+        except SQLAlchemyError:
+            # Cache is an optimization; pricing still works without the table
+            logger.warning('pricing_cache_load_failed', exc_info=True)
+            self.stats['db_errors'] += 1
+            return None
+
+    def _save(self, key, entry):
+        try:
+            with self.session_factory() as db:
+                db.merge(
+                    PricingCacheEntry(
+                        query_key=key,
+                        result=entry.result,
+                        kind=entry.kind,
+                        fetched_at=entry.fetched_at,
+                        expires_at=entry.expires_at,
+                        stale_until=entry.stale_until,
+                    )
+                )
+                db.commit()
+        except SQLAlchemyError:
+            logger.warning('pricing_cache_save_failed', exc_info=True)
+            self.stats['db_errors'] += 1
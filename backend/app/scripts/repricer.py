@@ -0,0 +1,257 @@
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import timedelta
+
+from sqlalchemy import case, func, or_
+from sqlalchemy.exc import IntegrityError
+
+from app.db.database import SessionLocal
+from app.db.market_prices import card_fields, record_market_price
+from app.db.model import Card, MarketPrice, RepricerBudget, SchedulerLease
+from app.utils.clock import utcnow
+
+from .card_identity import card_identity
+from .ebay_client import close_ebay_client
+from .pricing import normalize_query, price_many
+
+logger = logging.getLogger('repricer')
+
+REPRICER_DAILY_BUDGET = int(os.getenv('REPRICER_DAILY_BUDGET', '2000'))  # eBay lookups per UTC day for background repricing
+REPRICER_BATCH_SIZE = int(os.getenv('REPRICER_BATCH_SIZE', '20'))  # Cards per tick
+REPRICER_MIN_AGE_HOURS = float(os.getenv('REPRICER_MIN_AGE_HOURS', '24'))  # Skip cards priced more recently than this
+REPRICER_LEASE_TICKS = float(os.getenv('REPRICER_LEASE_TICKS', '3'))  # Missed ticks before another process takes over
+
+
+class RepricingScheduler:
+    """Refreshes saved cards' market prices in small batches, stalest first, spread evenly over the day.
+
+    Each tick prices at most batch_size cards and never spends more than daily_budget eBay
+    lookups per UTC day; copies of one card held by different users cost one lookup.
+    In dry-run mode ticks only report what they would price.
+
+    The day's spend lives in the repricer_budget table and only the holder of the 'repricer'
+    lease in scheduler_lease prices anything, so extra replicas stand by instead of doubling calls.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        daily_budget=REPRICER_DAILY_BUDGET,
+        batch_size=REPRICER_BATCH_SIZE,
+        min_age_hours=REPRICER_MIN_AGE_HOURS,
+        dry_run=False,
+        clock=utcnow,
+        sleep=asyncio.sleep,
+        lease_ticks=REPRICER_LEASE_TICKS,
+    ):
+        self.session_factory = session_factory
+        self.daily_budget = daily_budget
+        self.batch_size = batch_size
+        self.min_age = timedelta(hours=min_age_hours)
+        self.dry_run = dry_run
+        self.clock = clock
+        self.sleep = sleep
+        self.lease_ticks = lease_ticks
+        self.holder = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+    @property
+    def interval(self):
+        """Seconds between ticks so a full day's budget is spent evenly"""
+        ticks_per_day = max(1, self.daily_budget // self.batch_size)
+        return 86400 / ticks_per_day
+
+    def remaining_budget(self):
+        with self.session_factory() as db:
+            row = db.get(RepricerBudget, self.clock().date().isoformat())
+            return self.daily_budget - (row.spent if row else 0)
+
+    def acquire_lease(self):
+        """Takes or renews the repricer lease; False while another live process holds it"""
+
+        now = self.clock()
+
+        try:
+            with self.session_factory() as db:
+                lease = db.query(SchedulerLease).filter(SchedulerLease.name == 'repricer').with_for_update().first()
+
+                if lease is None:
+                    lease = SchedulerLease(name='repricer', holder=self.holder, expires_at=now)
+                    db.add(lease)
+                elif lease.holder != self.holder and lease.expires_at > now:
+                    return False
+
+                lease.holder = self.holder
+                lease.expires_at = now + timedelta(seconds=self.interval * self.lease_ticks)
+                db.commit()
+                return True
+        except IntegrityError:
+            # Another process created the lease first
+            return False
+
+    def release_lease(self):
+        with self.session_factory() as db:
+            db.query(SchedulerLease).filter(SchedulerLease.name == 'repricer', SchedulerLease.holder == self.holder).delete()
+            db.commit()
+
+    def spend(self, lookups):
+        """Reserves lookups from today's budget; False (and nothing reserved) if they don't fit"""
+
+        day = self.clock().date().isoformat()
+
+        for attempt in range(2):
+            try:
+                with self.session_factory() as db:
+                    row = db.query(RepricerBudget).filter(RepricerBudget.day == day).with_for_update().first()
+
+                    if row is None:
+                        row = RepricerBudget(day=day, spent=0)
+                        db.add(row)
+
+                    if row.spent + lookups > self.daily_budget:
+                        return False
+
+                    row.spent += lookups
+                    db.commit()
+                    return True
+            except IntegrityError:
+                # Another process created today's row first; its lock now applies
+                continue
+
+        return False
+
+    def stalest_cards(self, db, limit):
+        """Saved cards whose market price is missing or oldest.
+
+        A card counts as refreshed when its series got a point or when the repricer last looked it
+        up, whichever is later, so cards with no sales wait min_age like everything else.
+        """
+
+        last_priced = func.max(MarketPrice.created_at)
+        attempted = Card.reprice_attempted_at
+        last_refreshed = case((attempted > last_priced, attempted), else_=func.coalesce(last_priced, attempted))
+        cutoff = self.clock() - self.min_age
+
+        return (
+            db.query(Card)
+            .outerjoin(MarketPrice, MarketPrice.identity == Card.identity)
+            .filter(Card.saved)
+            .group_by(Card.id)
+            .having(or_(last_refreshed.is_(None), last_refreshed < cutoff))
+            .order_by(last_refreshed.asc().nulls_first(), Card.created_at.asc())
+            .limit(limit)
+            .all()
+        )
+
+    async def run_once(self):
+        """One tick; returns a report of what was (or in dry-run, would be) priced"""
+
+        idle = {'planned': [], 'lookups': 0, 'saved': 0, 'dry_run': self.dry_run}
+
+        if not self.dry_run and not await asyncio.to_thread(self.acquire_lease):
+            logger.info('repricer_standby')
+            return idle
+
+        budget = await asyncio.to_thread(self.remaining_budget)
+
+        if budget <= 0:
+            return idle
+
+        cards = await asyncio.to_thread(self._load_batch, self.batch_size)
+
+        # Cards sharing an identity cost one lookup, so trim to the budget by distinct identity
+        batch, queries = [], set()
+        for card in cards:
+            fields = card_fields(card)
+            query = card_identity(fields) or normalize_query(fields)
+            if query not in queries and len(queries) >= budget:
+                continue
+            queries.add(query)
+            batch.append(card)
+
+        report = {'planned': [str(card.id) for card in batch], 'lookups': len(queries), 'saved': 0, 'dry_run': self.dry_run}
+
+        if self.dry_run or not batch:
+            logger.info('repricer_tick', extra=report)
+            return report
+
+        if not await asyncio.to_thread(self.spend, len(queries)):
+            return idle
+
+        priced = {}  # identity -> (pricing, card ids)
+
+        # Cards are only due once their price is older than min_age, usually well past the cache's TTL,
+        # so a cached (or stale-while-revalidate) answer would re-record an old price as new
+        async for indexes, pricing in price_many([card_fields(card) for card in batch], refresh=True):
+            if 'estimate' not in pricing or pricing.get('stale'):
+                continue
+
+            identity = card_identity(card_fields(batch[indexes[0]]))
+
+            # A name that normalizes to nothing would merge every such card into one series
+            if identity:
+                priced[identity] = (pricing, [batch[i].id for i in indexes])
+
+        report['saved'] = await asyncio.to_thread(self._save, priced, [card.id for card in batch])
+        logger.info('repricer_tick', extra=report)
+        return report
+
+    async def run_forever(self, ticks=None):
+        """Ticks every interval seconds; ticks limits the number of iterations (for tests)"""
+
+        done = 0
+        while ticks is None or done < ticks:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.error('repricer_tick_failed', exc_info=True)
+
+            done += 1
+            await self.sleep(self.interval)
+
+    def _load_batch(self, limit):
+        with self.session_factory() as db:
+            return self.stalest_cards(db, limit)
+
+    def _save(self, priced, attempted):
+        """Records a tick's market prices, links the cards to them and marks every attempted card in one transaction"""
+
+        priced_at = self.clock()  # Same clock as the staleness cutoff
+
+        with self.session_factory() as db:
+            for identity, (pricing, card_ids) in priced.items():
+                record_market_price(db, identity, pricing, now=priced_at)
+                db.query(Card).filter(Card.id.in_(card_ids)).update({Card.identity: identity}, synchronize_session=False)
+
+            # Including cards with no sales or a failed lookup, which would otherwise head every tick's batch
+            db.query(Card).filter(Card.id.in_(attempted)).update({Card.reprice_attempted_at: priced_at}, synchronize_session=False)
+            db.commit()
+
+        return len(priced)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Background repricing of saved cards')
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--once', action='store_true')
+    args = parser.parse_args()
+
+    scheduler = RepricingScheduler(dry_run=args.dry_run)
+
+    try:
+        if args.once:
+            print(await scheduler.run_once())
+        else:
+            await scheduler.run_forever()
+    finally:
+        if not args.dry_run:
+            scheduler.release_lease()
+        await close_ebay_client()
+
+
+# Run as a separate worker: python -m app.scripts.repricer [--dry-run] [--once]
+if __name__ == '__main__':
+    asyncio.run(main())
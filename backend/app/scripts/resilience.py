@@ -0,0 +1,158 @@
+import asyncio
+import time
+from collections import Counter, deque
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpen(Exception):
+    """The dependency has been failing; calls are refused until the breaker's reset timeout passes"""
+
+
+class RateLimited(Exception):
+    """No token would be free within the caller's maximum wait; retry_after is when one will be"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Async token bucket: rate tokens per second, bursts of up to capacity.
+
+    Callers reserve a token and sleep until it is due, so waiters are served in arrival order
+    without a lock. A caller that would wait longer than max_wait is refused instead.
+    """
+
+    def __init__(self, rate, capacity, max_wait, clock=time.monotonic, sleep=asyncio.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_wait = max_wait
+        self.clock = clock
+        self.sleep = sleep
+
+        self._tokens = float(capacity)
+        self._updated = clock()
+
+        self.stats = Counter()
+
+    async def acquire(self):
+        self._refill()
+
+        # Negative tokens are reservations already handed to earlier waiters
+        wait = (1 - self._tokens) / self.rate if self._tokens < 1 else 0.0
+
+        if wait > self.max_wait:
+            self.stats['rejected'] += 1
+            raise RateLimited(f'rate limited, next token in {wait:.2f}s', wait)
+
+        self._tokens -= 1
+        self.stats['acquired'] += 1
+
+        if wait > 0:
+            self.stats['waited'] += 1
+            self.stats['wait_ms'] += round(wait * 1000)
+            await self.sleep(wait)
+
+    def try_acquire(self):
+        """Takes a token only if one is free right now; for optional calls like hedges"""
+
+        self._refill()
+
+        if self._tokens < 1:
+            return False
+
+        self._tokens -= 1
+        self.stats['acquired'] += 1
+        return True
+
+    def info(self):
+        return {**self.stats, 'tokens': round(self._tokens, 2), 'rate': self.rate, 'capacity': self.capacity}
+
+    def _refill(self):
+        now = self.clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures and refuses calls for reset_timeout seconds.
+
+    After that one probe call is let through (half-open): success closes the breaker, failure
+    opens it again. A probe that never reports back is replaced after another reset_timeout.
+    """
+
+    def __init__(self, name, failure_threshold, reset_timeout, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_at = None
+
+        self.stats = Counter()
+
+    def check(self):
+        """Raises CircuitOpen unless a call may go ahead now"""
+
+        if self.state == CLOSED:
+            return
+
+        now = self.clock()
+
+        if self.state == OPEN and now - self._opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+            self._probe_at = None
+
+        if self.state == HALF_OPEN and (self._probe_at is None or now - self._probe_at >= self.reset_timeout):
+            self._probe_at = now
+            self.stats['probes'] += 1
+            return
+
+        self.stats['rejected'] += 1
+        raise CircuitOpen(f'{self.name} circuit open')
+
+    def record_success(self):
+        self.stats['successes'] += 1
+        self._failures = 0
+
+        if self.state != CLOSED:
+            self.state = CLOSED
+            self.stats['closed'] += 1
+
+    def record_failure(self):
+        self.stats['failures'] += 1
+        self._failures += 1
+
+        if self.state == HALF_OPEN or (self.state == CLOSED and self._failures >= self.failure_threshold):
+            self.state = OPEN
+            self._opened_at = self.clock()
+            self.stats['opened'] += 1
+
+    def info(self):
+        return {**self.stats, 'state': self.state, 'consecutive_failures': self._failures}
+
+
+class LatencyTracker:
+    """Rolling window of recent call latencies, for percentile thresholds such as when to hedge"""
+
+    def __init__(self, window, min_samples):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds):
+        self._samples.append(seconds)
+
+    def percentile(self, p):
+        """Nearest-rank percentile of the window, or None until min_samples calls were seen"""
+
+        if len(self._samples) < self.min_samples:
+            return None
+
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
@@ -1,14 +1,26 @@
+import os
+
 import cv2
 
-from .helpers import detect_boxes, easy_ocr, load_models
+from .helpers import detect_boxes, easy_ocr, load_models, recognize_batch
+
+# 'readtext' runs EasyOCR's detector and recognizer on each field crop;
+# 'recognize' skips the detector and reads all of a card's field crops in one batched pass
+OCR_MODE = os.getenv('OCR_MODE', 'readtext')
 
 
 class TextExtraction:
-    def __init__(self, model, ocr):
+    def __init__(self, model, ocr, mode=OCR_MODE):
         self.model = model
         self.ocr = ocr
+        self.mode = mode
+
+    def run(self, image, debug=None):
+        """Fields read from a card image; debug is an optional DebugSession that keeps the crops"""
+
+        if self.mode == 'recognize':
+            return self.run_many([image], [debug])[0]
 
-    def run(self, image):
         # Find boxes
         detections = detect_boxes(self.model, image)
         fields = {}
@@ -25,12 +37,36 @@ class TextExtraction:
             crop = cv2.resize(crop, None, fx=3, fy=3, interpolation=cv2.INTER_CUBIC)
             text = easy_ocr(self.ocr, crop)  # Extract text via OCR
 
-            cv2.imwrite(f'debug_{field}.jpg', crop)
+            if debug is not None:
+                debug.add(field, crop)
 
             fields[field] = text  # Add to results
 
         return fields
 
+    def run_many(self, images, debug=None):
+        """Fields for each card image, with every card's field crops recognized in one batched call"""
+
+        debug = debug or [None] * len(images)
+        crops, owners = [], []  # owners[i] is (card index, field) of crops[i]
+
+        for i, image in enumerate(images):
+            for det in detect_boxes(self.model, image):
+                x1, y1, x2, y2 = det['bbox']
+                crop = image[y1:y2, x1:x2]  # No upscaling; the recognizer resizes lines to its own height
+                crops.append(crop)
+                owners.append((i, det['field']))
+
+                if debug[i] is not None:
+                    debug[i].add(det['field'], crop)
+
+        fields = [{} for _ in images]
+
+        for (i, field), text in zip(owners, recognize_batch(self.ocr, crops)):
+            fields[i][field] = text
+
+        return fields
+
 
 def pipeline_b():
     _, frcnn, reader = load_models()
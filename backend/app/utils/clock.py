@@ -0,0 +1,6 @@
+from datetime import datetime, timezone
+
+
+def utcnow():
+    """Naive UTC now, matching what the DateTime columns store"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
@@ -0,0 +1,124 @@
+import logging
+import os
+import random
+import threading
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from .images import encode_image
+from .s3_images import upload_bytes
+
+logger = logging.getLogger('app')
+
+DEBUG_ARTIFACTS = os.getenv('DEBUG_ARTIFACTS', 'off')  # off, local or s3
+DEBUG_ARTIFACTS_SAMPLE_RATE = float(os.getenv('DEBUG_ARTIFACTS_SAMPLE_RATE', '0.01'))  # Share of requests that keep artifacts
+DEBUG_ARTIFACTS_DIR = os.getenv('DEBUG_ARTIFACTS_DIR', 'debug')  # Local directory, or S3 key prefix
+DEBUG_ARTIFACTS_MAX_PENDING = int(os.getenv('DEBUG_ARTIFACTS_MAX_PENDING', '100'))  # Writes queued beyond this are dropped
+
+
+class DebugSession:
+    """Artifacts of one sampled request, stored under their own request id"""
+
+    def __init__(self, sink, request_id):
+        self.sink = sink
+        self.request_id = request_id
+
+    def add(self, name, image):
+        """Queues a BGR image to be encoded and written as <request_id>/<name>.jpg; never blocks on I/O"""
+        self.sink.submit(f'{self.request_id}/{name}.jpg', image)
+
+
+class DebugArtifacts:
+    """Keeps intermediate images (OCR crops etc.) for a sample of requests, written off the request path.
+
+    Off unless target is 'local' or 's3'. start() samples a request and returns a DebugSession,
+    or None for requests that keep nothing. Encoding and writing happen on one background thread;
+    when it falls more than max_pending writes behind, new artifacts are dropped.
+    Images must not be modified after add().
+    """
+
+    def __init__(
+        self,
+        target=DEBUG_ARTIFACTS,
+        sample_rate=DEBUG_ARTIFACTS_SAMPLE_RATE,
+        directory=DEBUG_ARTIFACTS_DIR,
+        max_pending=DEBUG_ARTIFACTS_MAX_PENDING,
+        rng=random.random,
+    ):
+        self.target = target
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.max_pending = max_pending
+        self.rng = rng
+
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+        self.stats = Counter()
+
+    @property
+    def enabled(self):
+        return self.target in ('local', 's3') and self.sample_rate > 0
+
+    def start(self, request_id=None):
+        if not self.enabled or self.rng() >= self.sample_rate:
+            return None
+
+        self.stats['sampled_requests'] += 1
+        return DebugSession(self, request_id or str(uuid.uuid4()))
+
+    def submit(self, path, image):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.stats['dropped'] += 1
+                return
+
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='debug-artifacts')
+
+            self._pending += 1
+
+            # Under the lock, so a concurrent flush can't swap out or shut down the executor in between
+            try:
+                self._executor.submit(self._write, path, image)
+            except RuntimeError:
+                self._pending -= 1
+                self.stats['dropped'] += 1
+
+    def flush(self):
+        """Waits for every queued write (tests, shutdown)"""
+
+        with self._lock:
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def info(self):
+        return {**self.stats, 'target': self.target if self.enabled else 'off', 'pending': self._pending}
+
+    def _write(self, path, image):
+        try:
+            data = encode_image(image, 'jpg')
+
+            if self.target == 's3':
+                upload_bytes(data, f'{self.directory}/{path}')
+            else:
+                full_path = os.path.join(self.directory, path)
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+                with open(full_path, 'wb') as f:
+                    f.write(data)
+
+            self.stats['written'] += 1
+        except (OSError, ValueError, RuntimeError):
+            logger.warning('debug_artifact_write_failed', extra={'path': path}, exc_info=True)
+            self.stats['write_errors'] += 1
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+debug_artifacts = DebugArtifacts()
@@ -0,0 +1,85 @@
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+MAX_LONG_SIDE = 1600  # Detection input size; phone photos are scaled down to this
+
+
+def load_upload(fp, max_long_side=MAX_LONG_SIDE):
+    """Decodes an uploaded photo into an upright BGR array no larger than max_long_side.
+
+    JPEGs are decoded at a reduced DCT scale when they are much larger than needed, then the
+    pixels are copied out of PIL exactly once, already in OpenCV's BGR order. The array is
+    read-only; slices of it (crops) share its memory.
+    """
+
+    img = Image.open(fp)
+
+    # Only JPEG supports this; a 12MP photo decodes at 1/2 scale, far cheaper than a full decode
+    w, h = img.size
+    scale = min(1.0, max_long_side / max(w, h))
+    img.draft('RGB', (int(w * scale), int(h * scale)))
+
+    img = ImageOps.exif_transpose(img)
+    w, h = img.size
+    scale = min(1.0, max_long_side / max(w, h))
+
+    if scale < 1.0:
+        img = img.resize((int(w * scale), int(h * scale)), Image.LANCZOS)
+
+    img = img.convert('RGB')
+    w, h = img.size
+
+    return np.frombuffer(img.tobytes('raw', 'BGR'), dtype=np.uint8).reshape(h, w, 3)
+
+
+def clip_box(bbox, shape):
+    """bbox as integer (left, top, right, bottom) inside an image of the given array shape"""
+
+    h, w = shape[:2]
+    x1, y1, x2, y2 = bbox[:4]
+    return max(0, int(x1)), max(0, int(y1)), min(w, int(x2)), min(h, int(y2))
+
+
+def encode_image(image, ext, quality=92):
+    """Encodes a BGR array in the format ext names ('jpg', 'png', ...); raises ValueError if it can't"""
+
+    try:
+        ok, buffer = cv2.imencode(f'.{ext.lower()}', image, [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_WEBP_QUALITY, quality])
+    except cv2.error as e:
+        raise ValueError(f'Cannot encode .{ext} images') from e
+
+    if not ok:
+        raise ValueError(f'Cannot encode .{ext} images')
+
+    return buffer.tobytes()
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def read_upload(fp, max_bytes, chunk_size=1 << 20):
+    """Reads an upload in chunks, stopping as soon as it passes max_bytes; returns a memoryview of the bytes
+
+    Bounds the copy made here only; Starlette has already spooled the request, which UploadSizeLimit caps.
+    """
+
+    data = bytearray()
+
+    while chunk := fp.read(chunk_size):
+        data += chunk
+
+        if len(data) > max_bytes:
+            raise UploadTooLarge(f'Image is larger than {max_bytes // (1 << 20)}MB')
+
+    return memoryview(data)
+
+
+def decode_image(data):
+    """BGR array from encoded image bytes (any buffer, not copied first); None if they aren't an image"""
+
+    if not len(data):
+        return None
+
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
@@ -1,3 +1,4 @@
+import io
 import logging
 import os
 
@@ -20,3 +21,13 @@ def upload_image(local_path, s3_key):
     except (BotoCoreError, ClientError):
         logger.error('s3_upload_failed', exc_info=True)
         raise RuntimeError('S3_UPLOAD_FAILED')
+
+
+def upload_bytes(data, s3_key):
+    """Uploads an in-memory file; same errors as upload_image"""
+    try:
+        s3.upload_fileobj(io.BytesIO(data), S3_BUCKET, s3_key)
+        return s3_key
+    except (BotoCoreError, ClientError):
+        logger.error('s3_upload_failed', exc_info=True)
+        raise RuntimeError('S3_UPLOAD_FAILED')
@@ -0,0 +1,71 @@
+import json
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class UploadSizeLimit:
+    """ASGI middleware refusing request bodies over max_bytes on the given paths with a 413.
+
+    Starlette spools a multipart upload to memory/disk before the endpoint runs, so a limit in the
+    endpoint only bounds what it copies. This one checks Content-Length up front and counts a
+    chunked body as it arrives, so an oversized upload is never buffered. body is the JSON
+    response sent instead.
+    """
+
+    def __init__(self, app, max_bytes, paths, body):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = set(paths)
+        self.body = json.dumps(body).encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] not in self.paths:
+            return await self.app(scope, receive, send)
+
+        length = dict(scope['headers']).get(b'content-length', b'')
+        if length.isdigit() and int(length) > self.max_bytes:
+            return await self.refuse(send)
+
+        received = 0
+        too_large = False
+        responded = False
+
+        async def counted_receive():
+            nonlocal received, too_large
+
+            message = await receive()
+
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+
+                if received > self.max_bytes:
+                    too_large = True
+                    raise BodyTooLarge()
+
+            return message
+
+        async def checked_send(message):
+            nonlocal responded
+
+            # FastAPI turns errors while reading the form into a 400; answer 413 instead
+            if too_large:
+                if message['type'] == 'http.response.start' and not responded:
+                    responded = True
+                    await self.refuse(send)
+                return
+
+            responded = True
+            await send(message)
+
+        try:
+            await self.app(scope, counted_receive, checked_send)
+        except BodyTooLarge:
+            if not responded:
+                await self.refuse(send)
+
+    async def refuse(self, send):
+        headers = [(b'content-type', b'application/json'), (b'content-length', str(len(self.body)).encode()), (b'connection', b'close')]
+        await send({'type': 'http.response.start', 'status': 413, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': self.body})
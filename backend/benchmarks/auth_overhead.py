@@ -0,0 +1,86 @@
+"""Auth overhead per request: no cache, JWKS cache, and JWKS + verified-token cache.
+
+Run from backend/:  python -m benchmarks.auth_overhead [--requests 200] [--latency 0.03]
+
+The JWKS endpoint is a local stand-in; --latency simulates the round trip to Supabase.
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+os.environ.setdefault('SUPABASE_URL', 'http://supabase.local')
+
+import httpx  # noqa: E402
+from fastapi import Request  # noqa: E402
+from jose import jwt  # noqa: E402
+
+from app.auth import supabase_auth  # noqa: E402
+from app.auth.jwks import JWKSCache  # noqa: E402
+from tests.fakes import FakeJWKS, FakeServer, make_key, make_token  # noqa: E402
+
+
+def uncached_current_user(request, jwks_url):
+    """The pre-cache code path: one JWKS download per request"""
+    token = request.headers['Authorization'].split(' ')[1]
+
+    with httpx.Client() as client:
+        jwks = client.get(jwks_url).json()
+
+    payload = jwt.decode(
+        token,
+        jwks,
+        algorithms=['ES256'],
+        audience='authenticated',
+        issuer=f'{supabase_auth.SUPABASE_URL}/auth/v1',
+    )
+    return {'user_id': payload['sub']}
+
+
+def measure(fn, n):
+    timings = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f'{label:<8} mean={statistics.mean(timings):8.3f}ms  p50={statistics.median(timings):8.3f}ms  p95={p95:8.3f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.03)
+    args = parser.parse_args()
+
+    pem, public = make_key('bench')
+    token = make_token(pem, 'bench')
+    request = Request({'type': 'http', 'headers': [(b'authorization', f'Bearer {token}'.encode())]})
+
+    with FakeServer({FakeJWKS.path: FakeJWKS([public])}, latency=args.latency) as server:
+        jwks_url = server.url + FakeJWKS.path
+        supabase_auth.jwks_cache = JWKSCache(jwks_url)
+
+        def jwks_cached_only():
+            supabase_auth.verified_tokens.clear()
+            return supabase_auth.current_user(request)
+
+        before = measure(lambda: uncached_current_user(request, jwks_url), args.requests)
+        after = measure(jwks_cached_only, args.requests)
+        token_cached = measure(lambda: supabase_auth.current_user(request), args.requests)
+
+        print(f'{args.requests} requests, simulated JWKS latency {args.latency * 1000:.0f}ms')
+        report('before', before)
+        report('after', after)
+        report('+tokens', token_cached)
+        print(f'JWKS fetches: before={args.requests} after={server.calls[FakeJWKS.path] - args.requests}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""estimate_price + compute_confidence per card vs estimate_prices_batch over one flat array.
+
+Run from backend/:  python -m benchmarks.batch_estimate [--segments 10000 100000] [--max-sales 60]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from app.scripts import pricing
+
+
+def make_segments(count, max_sales, seed=0):
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(1, max_sales + 1, count)
+    values = np.round(rng.lognormal(3, 0.5, int(counts.sum())), 2)
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    return values, offsets
+
+
+def run_scalar(values, offsets):
+    start = time.perf_counter()
+    for i in range(len(offsets) - 1):
+        stats = pricing.estimate_price(values[offsets[i] : offsets[i + 1]].tolist())
+        if stats is not None:
+            pricing.compute_confidence(stats)
+    return time.perf_counter() - start
+
+
+def run_batch(values, offsets):
+    start = time.perf_counter()
+    pricing.estimate_prices_batch(values, offsets)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--segments', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--max-sales', type=int, default=60)
+    args = parser.parse_args()
+
+    for count in args.segments:
+        values, offsets = make_segments(count, args.max_sales)
+        scalar = run_scalar(values, offsets)
+        batch = run_batch(values, offsets)
+
+        print(f'{count} segments, {len(values)} prices')
+        print(f'scalar  {scalar * 1000:9.1f} ms  {count / scalar:12.0f} segments/s')
+        print(f'batch   {batch * 1000:9.1f} ms  {count / batch:12.0f} segments/s  ({scalar / batch:.0f}x)')
+
+
+if __name__ == '__main__':
+    main()
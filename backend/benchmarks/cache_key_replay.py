@@ -0,0 +1,102 @@
+"""Pricing cache hit rate with normalize_query vs card_identity keys, replaying a pricing request log.
+
+Run from backend/:  python -m benchmarks.cache_key_replay [--log requests.jsonl] [--requests 5000]
+
+--log takes one JSON object of card fields per line (the 'fields' of the 'Pricing request' log
+line). Without it a synthetic log is generated: a catalogue of cards with a skewed popularity,
+each request spelled the way OCR output or a user would type it.
+Cache size and TTL are ignored; a hit is any key that was seen earlier in the replay.
+"""
+
+import argparse
+import json
+import logging
+import random
+
+from app.scripts.card_identity import card_identity
+from app.scripts.pricing import normalize_query
+
+PLAYERS = [
+    ('Cole', 'Caufield'),
+    ('Connor', 'Bedard'),
+    ('Connor', 'McDavid'),
+    ('Nick', 'Suzuki'),
+    ('Tim', 'Stützle'),
+    ('Auston', 'Matthews'),
+    ('Cale', 'Makar'),
+    ('Trevor', 'Zegras'),
+    ('Lane', 'Hutson'),
+    ('Macklin', 'Celebrini'),
+]
+SETS = ['Upper Deck Series 1', 'Upper Deck Series 2', 'O-Pee-Chee', 'Upper Deck Extended Series']
+TYPES = ['Base', 'Young Guns', 'Canvas', 'Exclusives']
+
+
+def spell_name(first, last, rng):
+    return rng.choice([f'{first} {last}', f'{first} {last}'.lower(), f'{first[0]}. {last}', f'{last}, {first}', f' {first}  {last} '])
+
+
+def spell_series(year, set_name, rng):
+    season = rng.choice([f'{year}-{(year + 1) % 100:02d}', str(year), f'{year}/{year + 1}'])
+    set_name = rng.choice([set_name, set_name.lower(), set_name.replace('Upper Deck', 'UD'), set_name + ' Hockey'])
+    return f'{season} {set_name}'
+
+
+def spell_type(card_type, rng):
+    if card_type == 'Young Guns':
+        return rng.choice(['Young Guns', 'YG', 'young guns'])
+    return rng.choice([card_type, card_type.lower()])
+
+
+def synthetic_log(count, seed=0):
+    rng = random.Random(seed)
+    cards = [
+        (player, year, set_name, str(rng.randint(1, 500)), card_type)
+        for player in PLAYERS
+        for year in (2020, 2021, 2022, 2023)
+        for set_name in SETS
+        for card_type in TYPES
+    ]
+    weights = [1 / (rank + 1) for rank in range(len(cards))]  # Zipf-like: a few cards get most lookups
+
+    for (first, last), year, set_name, number, card_type in rng.choices(cards, weights, k=count):
+        yield {
+            'name': spell_name(first, last, rng),
+            'card_series': spell_series(year, set_name, rng),
+            'card_number': rng.choice([number, f'#{number}']),
+            'card_type': spell_type(card_type, rng),
+        }
+
+
+def hit_rate(keys):
+    seen, hits = set(), 0
+    for key in keys:
+        hits += key in seen
+        seen.add(key)
+    return hits / max(1, len(keys)), len(seen)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--log', help='JSONL of pricing request fields')
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    logging.getLogger('pricing').setLevel(logging.WARNING)
+
+    if args.log:
+        with open(args.log) as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+    else:
+        requests = list(synthetic_log(args.requests))
+
+    before, before_keys = hit_rate([normalize_query(fields) for fields in requests])
+    after, after_keys = hit_rate([card_identity(fields) or normalize_query(fields) for fields in requests])
+
+    print(f'{len(requests)} pricing requests')
+    print(f'before (normalize_query)  hit rate {before:6.1%}  distinct keys {before_keys}')
+    print(f'after  (card_identity)    hit rate {after:6.1%}  distinct keys {after_keys}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Per-request /detect-card image handling on 12MP phone photos, before and after the in-memory path.
+
+Run from backend/:  python -m benchmarks.detect_image_path [--requests 20] [--yolo models/final_model.pt]
+
+"before" replays the old code path: full PIL decode, resize, JPEG to disk, cv2.imread for
+detection, then the crop encoded to disk, all before the response. "after" decodes at reduced
+DCT scale straight into a BGR array and crops a slice of it; encoding moved off the response
+path and is reported separately. Without --yolo detection is a fixed box, so only image
+handling is timed; S3 uploads are left out of both.
+"""
+
+import argparse
+import io
+import statistics
+import tempfile
+import time
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+from app.utils.images import clip_box, encode_image, load_upload
+
+BBOX = [300, 200, 1100, 1300]
+
+
+def phone_photo(seed=0):
+    """A 4000x3000 JPEG with enough texture to compress like a real photo (several MB)"""
+    rng = np.random.default_rng(seed)
+    pixels = cv2.GaussianBlur(rng.integers(0, 256, (3000, 4000, 3), dtype=np.uint8), (5, 5), 0)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def run_before(data, detect, tmp):
+    img = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    w, h = img.size
+    scale = min(1.0, 1600 / max(w, h))
+    if scale < 1.0:
+        img = img.resize((int(w * scale), int(h * scale)), Image.LANCZOS)
+    img = img.convert('RGB')
+    img.save(f'{tmp}/image.jpg', quality=92, optimize=True)
+
+    image = cv2.imread(f'{tmp}/image.jpg')
+    left, top, right, bottom = clip_box(detect(image), image.shape)
+    img.crop((left, top, right, bottom)).save(f'{tmp}/crop.jpg', quality=95)
+
+
+def run_after(data, detect):
+    image = load_upload(io.BytesIO(data))
+    left, top, right, bottom = clip_box(detect(image), image.shape)
+    return image, image[top:bottom, left:right]
+
+
+def encode_after(image, crop):
+    encode_image(image, 'jpg', 92)
+    encode_image(crop, 'jpg', 95)
+
+
+def timed(fn, *args, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        times.append((time.perf_counter() - start) * 1000)
+    return times, result
+
+
+def report(label, times):
+    print(f'{label:22} p50 {statistics.median(times):7.1f}ms   p95 {sorted(times)[int(len(times) * 0.95) - 1]:7.1f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--yolo', help='YOLO weights to run real detection instead of a fixed box')
+    args = parser.parse_args()
+
+    if args.yolo:
+        from ultralytics import YOLO
+
+        from app.scripts.helpers import detect_card
+
+        model = YOLO(args.yolo)
+
+        def detect(image):
+            result = detect_card(model, image)
+            return result['bbox'] if result else BBOX
+    else:
+
+        def detect(image):
+            return BBOX
+
+    data = phone_photo()
+    print(f'{len(data) / 1e6:.1f}MB 4000x3000 JPEG, {args.requests} requests')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before, _ = timed(run_before, data, detect, tmp, repeat=args.requests)
+
+    after, (image, crop) = timed(run_after, data, detect, repeat=args.requests)
+    encode, _ = timed(encode_after, image, crop, repeat=args.requests)
+
+    report('before (in response)', before)
+    report('after (in response)', after)
+    report('after (background)', encode)
+
+
+if __name__ == '__main__':
+    main()
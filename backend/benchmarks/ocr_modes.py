@@ -0,0 +1,133 @@
+"""Per-card OCR latency and field accuracy: readtext on each field vs one batched recognizer pass.
+
+Run from backend/:  python -m benchmarks.ocr_modes [--cards 30] [--cases DIR --frcnn models/best_model.pth]
+
+Without --cases the test set is synthetic and fixed by --seed: card crops with rendered field
+text at known boxes, so only OCR differs between modes. With --cases, DIR holds card crops and
+labels.json ({"file.jpg": {"name": ..., "card_number": ...}}), and Faster R-CNN finds the boxes.
+Needs EasyOCR's English models (downloaded on first use). Runs on CPU.
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+from pathlib import Path
+
+import cv2
+import easyocr
+import numpy as np
+import torch
+from torchvision.models.detection import fasterrcnn_resnet50_fpn
+
+from app.scripts import text_detection
+from app.scripts.text_detection import TextExtraction
+
+NAMES = ['Cole Caufield', 'Ivan Demidov', 'Connor McDavid', 'Lane Hutson', 'Juraj Slafkovsky', 'Nick Suzuki', 'Kirby Dach']
+SERIES = ['2021-22 Upper Deck Series 1', '2024-25 Upper Deck Series 2', '2023-24 O-Pee-Chee', '2022-23 SP Authentic']
+TYPES = ['Young Guns', 'Base', 'Canvas', 'Retro']
+
+
+def synthetic_cards(count, seed):
+    """Card crops with fields rendered at known boxes; returns [(image, boxes, labels)]"""
+    rng = random.Random(seed)
+    cards = []
+
+    for _ in range(count):
+        labels = {
+            'name': rng.choice(NAMES),
+            'card_number': str(rng.randint(1, 500)),
+            'card_series': rng.choice(SERIES),
+            'card_type': rng.choice(TYPES),
+        }
+        image = np.full((700, 500, 3), (rng.randint(200, 255), rng.randint(200, 255), rng.randint(200, 255)), np.uint8)
+        boxes = []
+
+        for i, (field, text) in enumerate(labels.items()):
+            x, y = 20, 450 + 55 * i
+            scale = rng.uniform(0.6, 0.8)
+            (w, h), base = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, 2)
+            cv2.putText(image, text, (x, y), cv2.FONT_HERSHEY_SIMPLEX, scale, (20, 20, 20), 2, cv2.LINE_AA)
+            boxes.append({'bbox': (x - 6, y - h - 6, x + w + 6, y + base + 6), 'field': field})
+
+        cards.append((image, boxes, labels))
+
+    return cards
+
+
+def labelled_cards(path):
+    labels = json.loads((Path(path) / 'labels.json').read_text())
+    return [(cv2.imread(str(Path(path) / name)), None, fields) for name, fields in sorted(labels.items())]
+
+
+def edit_distance(a, b):
+    row = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        prev, row[0] = row[0], i
+        for j, cb in enumerate(b, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (ca != cb))
+    return row[-1]
+
+
+def score(predictions, cards):
+    exact, errors, chars = 0, 0, 0
+    for fields, (_, _, labels) in zip(predictions, cards):
+        for field, truth in labels.items():
+            got = ' '.join(fields.get(field, '').split()).lower()
+            truth = ' '.join(truth.split()).lower()
+            exact += got == truth
+            errors += edit_distance(got, truth)
+            chars += len(truth)
+    total = sum(len(labels) for _, _, labels in cards)
+    return exact / total, errors / max(chars, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cards', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--cases')
+    parser.add_argument('--frcnn', default='models/best_model.pth')
+    args = parser.parse_args()
+
+    reader = easyocr.Reader(['en'], gpu=False)
+
+    if args.cases:
+        cards = labelled_cards(args.cases)
+        frcnn = fasterrcnn_resnet50_fpn(num_classes=6)
+        frcnn.load_state_dict(torch.load(args.frcnn, map_location='cpu')['model_state_dict'])
+        frcnn.eval()
+    else:
+        cards = synthetic_cards(args.cards, args.seed)
+        frcnn = None
+        boxes = {id(image): card_boxes for image, card_boxes, _ in cards}
+        text_detection.detect_boxes = lambda model, image: boxes[id(image)]  # Ground-truth boxes
+
+    images = [image for image, _, _ in cards]
+    readtext = TextExtraction(frcnn, reader, mode='readtext')
+    recognize = TextExtraction(frcnn, reader, mode='recognize')
+    readtext.run(images[0])  # Warm up
+    recognize.run(images[0])
+
+    print(f'{len(cards)} cards, {sum(len(labels) for _, _, labels in cards)} fields, {torch.get_num_threads()} torch threads')
+
+    for label, extraction in (('readtext', readtext), ('recognize', recognize)):
+        latencies, predictions = [], []
+        for image in images:
+            start = time.perf_counter()
+            predictions.append(extraction.run(image))
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        accuracy, cer = score(predictions, cards)
+        print(f'{label:16} p50 {statistics.median(latencies):7.0f}ms/card   exact {accuracy:6.1%}   CER {cer:6.1%}')
+
+    start = time.perf_counter()
+    predictions = recognize.run_many(images)
+    per_card = (time.perf_counter() - start) * 1000 / len(images)
+    accuracy, cer = score(predictions, cards)
+    print(f'{"recognize, all":16} avg {per_card:7.0f}ms/card   exact {accuracy:6.1%}   CER {cer:6.1%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Card and field detector latency and memory: eager PyTorch vs onnxruntime on CPU.
+
+Run from backend/:  python -m benchmarks.onnx_backend [--runs 20] [--yolo models/final_model.pt --frcnn models/best_model.pth]
+
+Each backend runs in a fresh process so peak RSS covers only its own models. Without weights,
+randomly initialised models of the same architectures are exported to a temp directory; cost
+per forward pass is the same as trained weights. Needs onnx and onnxruntime.
+"""
+
+import argparse
+import multiprocessing as mp
+import resource
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+
+def load(backend, yolo_path, frcnn_path):
+    from ultralytics import YOLO
+
+    from app.scripts.helpers import OnnxFieldDetector
+    from app.scripts.onnx_export import export_frcnn, export_yolo, load_frcnn
+
+    if backend == 'onnx':
+        return YOLO(export_yolo(yolo_path), task='detect'), OnnxFieldDetector(export_frcnn(frcnn_path))
+
+    return YOLO(yolo_path), load_frcnn(frcnn_path)
+
+
+def measure(backend, yolo_path, frcnn_path, runs, out):
+    import torch
+
+    from app.scripts.helpers import detect_boxes, detect_cards
+
+    torch.set_num_threads(1)
+    rng = np.random.default_rng(0)
+    photo = rng.integers(0, 256, (1200, 1600, 3), dtype=np.uint8)
+    card = rng.integers(0, 256, (700, 500, 3), dtype=np.uint8)
+
+    yolo, frcnn = load(backend, yolo_path, frcnn_path)
+    detect_cards(yolo, [photo])  # Warm up
+    detect_boxes(frcnn, card)
+
+    timings = {'yolo': [], 'frcnn': []}
+    with torch.no_grad():
+        for _ in range(runs):
+            start = time.perf_counter()
+            detect_cards(yolo, [photo])
+            timings['yolo'].append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            detect_boxes(frcnn, card)
+            timings['frcnn'].append((time.perf_counter() - start) * 1000)
+
+    out.put((timings, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def prepare_weights(directory):
+    """Random-init weights in the files load_models expects"""
+    import torch
+    from torchvision.models.detection import fasterrcnn_resnet50_fpn
+    from ultralytics import YOLO
+
+    yolo_path, frcnn_path = f'{directory}/final_model.pt', f'{directory}/best_model.pth'
+    YOLO('yolov8n.yaml').save(yolo_path)
+    frcnn = fasterrcnn_resnet50_fpn(num_classes=6, weights=None, weights_backbone=None)
+    torch.save({'model_state_dict': frcnn.state_dict()}, frcnn_path)
+    return yolo_path, frcnn_path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--yolo')
+    parser.add_argument('--frcnn')
+    args = parser.parse_args()
+
+    ctx = mp.get_context('spawn')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        yolo_path, frcnn_path = (args.yolo, args.frcnn) if args.yolo and args.frcnn else prepare_weights(tmp)
+
+        # Export up front so neither measurement includes it
+        from app.scripts.onnx_export import export_frcnn, export_yolo
+
+        export_yolo(yolo_path)
+        export_frcnn(frcnn_path)
+
+        print(f'{args.runs} runs, 1 thread: YOLO on 1600x1200 photos, Faster R-CNN on 500x700 card crops')
+
+        for backend in ('torch', 'onnx'):
+            out = ctx.Queue()
+            worker = ctx.Process(target=measure, args=(backend, yolo_path, frcnn_path, args.runs, out))
+            worker.start()
+            timings, peak_mb = out.get()
+            worker.join()
+
+            print(
+                f'{backend:6} yolo p50 {statistics.median(timings["yolo"]):6.0f}ms   '
+                f'frcnn p50 {statistics.median(timings["frcnn"]):6.0f}ms   peak RSS {peak_mb:6.0f}MB'
+            )
+
+
+if __name__ == '__main__':
+    main()
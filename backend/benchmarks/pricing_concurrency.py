@@ -0,0 +1,99 @@
+"""Pricing throughput at N concurrent requests against a local fake Browse API.
+
+Run from backend/:  python -m benchmarks.pricing_concurrency [--concurrency 50] [--latency 0.1]
+
+"before" replays the old code path: sync requests.get with no session and a token per
+call, run on a 40-thread pool like FastAPI's default. "after" awaits the pooled async client.
+The fake server shares this process's GIL, so absolute numbers are a lower bound.
+"""
+
+import argparse
+import asyncio
+import base64
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from app.scripts import ebay_client, ebay_token, pricing
+from tests.fakes import FakeEbay, FakeServer
+
+
+def sync_get_sold_prices(base_url, query):
+    """The pre-async path: one OAuth call and one fresh connection per lookup"""
+    auth = base64.b64encode(b'client:secret').decode()
+    token = requests.post(
+        base_url + FakeEbay.oauth_path,
+        headers={'Authorization': f'Basic {auth}'},
+        data={'grant_type': 'client_credentials'},
+        timeout=(3, 8),
+    ).json()['access_token']
+
+    response = requests.get(
+        base_url + FakeEbay.browse_path,
+        headers={'Authorization': f'Bearer {token}'},
+        params={'q': query, 'limit': 25, 'filter': 'soldItems:true', 'sort': 'price'},
+        timeout=(3, 10),
+    )
+    return [float(item['price']['value']) for item in response.json()['itemSummaries']]
+
+
+def run_before(base_url, queries):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=40) as pool:
+        list(pool.map(lambda q: sync_get_sold_prices(base_url, q), queries))
+    return time.perf_counter() - start
+
+
+async def run_after(queries, concurrency):
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(query):
+        async with limit:
+            return await pricing.get_sold_prices(query)
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*[one(q) for q in queries])
+    finally:
+        await ebay_client.close_ebay_client()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.1)
+    parser.add_argument('--rate', type=float, default=100000, help='Client-side eBay calls per second')
+    args = parser.parse_args()
+
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    os.environ['EBAY_CLIENT_ID'] = 'client'
+    os.environ['EBAY_CLIENT_SECRET'] = 'secret'
+    # Measures the client, not our eBay budget; the default 5/s limiter refuses most of the burst
+    ebay_client.EBAY_RATE_PER_SECOND = args.rate
+    ebay_client.EBAY_RATE_BURST = int(args.rate)
+
+    queries = [f'2021-22 Player {i} {i}' for i in range(args.concurrency * args.rounds)]
+    ebay = FakeEbay()
+
+    with FakeServer(ebay.routes, latency=args.latency) as server:
+        ebay_token.EBAY_OAUTH_URL = server.url + FakeEbay.oauth_path
+        ebay_client.EBAY_BROWSE_URL = server.url + FakeEbay.browse_path
+
+        before = run_before(server.url, queries)
+        before_calls = dict(server.calls)
+        server.calls.clear()
+
+        after = asyncio.run(run_after(queries, args.concurrency))
+
+        print(f'{len(queries)} lookups, {args.concurrency} concurrent, simulated eBay latency {args.latency * 1000:.0f}ms')
+        print(f'before  {len(queries) / before:8.1f} req/s  upstream calls={sum(before_calls.values())}')
+        print(f'after   {len(queries) / after:8.1f} req/s  upstream calls={sum(server.calls.values())}')
+
+
+if __name__ == '__main__':
+    main()
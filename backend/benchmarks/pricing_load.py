@@ -0,0 +1,196 @@
+"""Load test for price_card and POST /price-card against the local eBay stand-in.
+
+Run from backend/:
+    python -m benchmarks.pricing_load [--requests 2000] [--concurrency 50] [--distinct 200]
+        [--latency 0.1] [--jitter 0.2] [--error-rate 0.02] [--results 40] [--budget 4]
+        [--target both|price_card|endpoint] [--replay fixture.json --cards cards.jsonl]
+
+Each target starts with cold caches in a throwaway SQLite database. Requests pick cards with a
+Zipf-like popularity, so the cache hit rate is realistic rather than 0% or 100%.
+--cards takes one JSON object of card fields per line; with --replay record the fixture for the
+queries those cards produce (python -m tests.fakes record ...).
+The stand-in shares this process's GIL, so absolute numbers are a lower bound.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+import uuid
+
+import httpx
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import app.main as api
+from app.auth.supabase_auth import current_user
+from app.db.database import Base
+from app.db.model import Card, MarketPrice, PricingCacheEntry, SaleObservation
+from app.scripts import ebay_client, ebay_token, pricing
+from tests.fakes import FakeEbay, FakeServer, ReplayEbay
+
+USER_ID = uuid.uuid4()
+
+
+def synthetic_cards(count):
+    return [
+        {
+            'name': f'Player {i}',
+            'card_series': f'{2015 + i % 10}-{16 + i % 10} Upper Deck Series {1 + i % 2}',
+            'card_number': str(1 + i % 500),
+            'card_type': 'Young Guns' if i % 3 == 0 else 'Base',
+        }
+        for i in range(count)
+    ]
+
+
+def workload(cards, count, seed=0):
+    """Indexes into cards, popular ones first"""
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(cards))]
+    return rng.choices(range(len(cards)), weights, k=count)
+
+
+def reset(session_factory):
+    """Cold caches and a fresh eBay client for the next target"""
+    pricing.pricing_cache.clear_l1()
+    with session_factory() as db:
+        for model in (PricingCacheEntry, SaleObservation, MarketPrice):
+            db.query(model).delete()
+        db.commit()
+
+
+async def drive(one, picks, concurrency):
+    limit = asyncio.Semaphore(concurrency)
+    latencies, outcomes = [], {}
+
+    async def timed(i):
+        async with limit:
+            started = time.perf_counter()
+            outcome = await one(i)
+            latencies.append(time.perf_counter() - started)
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*[timed(i) for i in picks])
+    finally:
+        await ebay_client.close_ebay_client()
+    return time.perf_counter() - started, latencies, outcomes
+
+
+def outcome_of(pricing_result):
+    if 'estimate' in pricing_result:
+        return 'stale' if pricing_result.get('stale') else 'ok'
+    return pricing_result.get('error_code', 'error')
+
+
+async def run_price_card(cards, picks, concurrency, budget):
+    async def one(i):
+        return outcome_of(await pricing.price_card(cards[i], budget))
+
+    return await drive(one, picks, concurrency)
+
+
+async def run_endpoint(cards, card_ids, picks, concurrency):
+    transport = httpx.ASGITransport(app=api.app)
+
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=60) as http:
+
+        async def one(i):
+            body = (await http.post('/price-card', json={'card_id': str(card_ids[i]), **cards[i]})).json()
+            return 'ok' if body['status'] == 'ok' else body['error']['code']
+
+        return await drive(one, picks, concurrency)
+
+
+def report(name, elapsed, latencies, outcomes, calls):
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    print(
+        f'{name:<11} {len(latencies) / elapsed:8.1f} req/s  p50 {p50:7.1f}ms  p95 {p95:7.1f}ms  p99 {p99:7.1f}ms  '
+        f'browse calls {calls[FakeEbay.browse_path]:5d}  oauth calls {calls[FakeEbay.oauth_path]:3d}  {outcomes}'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--distinct', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.1)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--results', type=int, default=40)
+    parser.add_argument('--budget', type=float, default=None)
+    parser.add_argument('--rate', type=float, default=1000, help='Client-side eBay calls per second')
+    parser.add_argument('--target', choices=['both', 'price_card', 'endpoint'], default='both')
+    parser.add_argument('--replay')
+    parser.add_argument('--cards')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    os.environ['EBAY_CLIENT_ID'] = 'client'
+    os.environ['EBAY_CLIENT_SECRET'] = 'secret'
+    ebay_client.EBAY_RATE_PER_SECOND = args.rate
+    ebay_client.EBAY_RATE_BURST = int(args.rate)
+
+    if args.cards:
+        with open(args.cards) as f:
+            cards = [json.loads(line) for line in f if line.strip()]
+    else:
+        cards = synthetic_cards(args.distinct)
+    picks = workload(cards, args.requests)
+
+    # Throwaway database for every cache and table pricing touches
+    tmp = tempfile.TemporaryDirectory()
+    engine = create_engine(f'sqlite:///{tmp.name}/bench.db', connect_args={'check_same_thread': False})
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    pricing.pricing_cache.session_factory = session_factory
+    pricing.observation_store.session_factory = session_factory
+    api.SessionLocal = session_factory
+
+    with session_factory() as db:
+        rows = [Card(user_id=USER_ID, **fields) for fields in cards]
+        db.add_all(rows)
+        db.commit()
+        card_ids = [row.id for row in rows]
+
+    def get_db():
+        with session_factory() as db:
+            yield db
+
+    api.app.dependency_overrides[current_user] = lambda: {'user_id': USER_ID}
+    api.app.dependency_overrides[api.get_db] = get_db
+
+    ebay = ReplayEbay(args.replay, error_rate=args.error_rate) if args.replay else FakeEbay(error_rate=args.error_rate, result_size=args.results)
+
+    with FakeServer(ebay.routes, latency=args.latency, jitter=args.jitter) as server:
+        ebay_token.EBAY_OAUTH_URL = server.url + FakeEbay.oauth_path
+        ebay_client.EBAY_BROWSE_URL = server.url + FakeEbay.browse_path
+
+        print(
+            f'{args.requests} requests over {len(cards)} cards, {args.concurrency} concurrent, '
+            f'eBay latency {args.latency * 1000:.0f}ms +{args.jitter * 1000:.0f}ms jitter, error rate {args.error_rate:.0%}'
+        )
+
+        if args.target in ('both', 'price_card'):
+            reset(session_factory)
+            server.calls.clear()
+            report('price_card', *asyncio.run(run_price_card(cards, picks, args.concurrency, args.budget)), server.calls)
+
+        if args.target in ('both', 'endpoint'):
+            reset(session_factory)
+            server.calls.clear()
+            report('/price-card', *asyncio.run(run_endpoint(cards, card_ids, picks, args.concurrency)), server.calls)
+
+    tmp.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""YOLO card detection throughput and latency with N concurrent requests, per micro-batch size.
+
+Run from backend/:  python -m benchmarks.yolo_batching [--clients 8] [--requests 48] [--batch-sizes 1,4,8] [--wait-ms 5]
+
+Batch size 1 is the old path: each request thread calls YOLO itself. Larger sizes go through
+CardDetectionPipeline's MicroBatcher. Without --weights a randomly initialised yolov8n is used,
+which costs the same per forward pass as trained weights of that size. Runs on CPU.
+"""
+
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+from ultralytics import YOLO
+
+from app.scripts.card_detection import CardDetectionPipeline
+
+
+def run(pipeline, images, clients):
+    latencies = []
+
+    def one(image):
+        start = time.perf_counter()
+        pipeline.run(image)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(one, images))
+    return time.perf_counter() - start, sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=48)
+    parser.add_argument('--batch-sizes', default='1,4,8')
+    parser.add_argument('--wait-ms', type=float, default=5)
+    parser.add_argument('--weights', default='yolov8n.yaml')
+    args = parser.parse_args()
+
+    yolo = YOLO(args.weights)
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, (1200, 1600, 3), dtype=np.uint8) for _ in range(args.requests)]
+    yolo(images[:2], verbose=False)  # Warm up
+
+    print(f'{args.requests} requests from {args.clients} clients, 1600x1200 images, {torch.get_num_threads()} torch threads')
+
+    for size in map(int, args.batch_sizes.split(',')):
+        pipeline = CardDetectionPipeline(yolo, max_batch_size=size, max_wait_ms=args.wait_ms)
+        elapsed, latencies = run(pipeline, images, args.clients)
+        batch = pipeline.info().get('mean_batch_size') or 1
+
+        print(
+            f'batch {size:2}  {args.requests / elapsed:6.2f} img/s   p50 {statistics.median(latencies):7.0f}ms   '
+            f'p95 {latencies[int(len(latencies) * 0.95) - 1]:7.0f}ms   mean batch {batch}'
+        )
+
+        if pipeline.batcher is not None:
+            pipeline.batcher.close()
+
+
+if __name__ == '__main__':
+    main()
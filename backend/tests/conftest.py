@@ -12,8 +12,11 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 import app.main as main
+from app.auth.quotas import MemoryQuotaStore, quotas
 from app.auth.supabase_auth import current_user
 from app.db.database import Base
+from app.db.model import SaleObservation
+from app.scripts import pricing
 
 # SQLite URL for testing
 TEST_DB_URL = 'sqlite:///./tests_test.db'
@@ -43,6 +46,25 @@ def setup_test_db():
     Base.metadata.drop_all(bind=engine)
 
 
+@pytest.fixture(autouse=True)
+def observation_store(monkeypatch):
+    """Each test starts with no stored sale observations"""
+    monkeypatch.setattr(pricing.observation_store, 'session_factory', TestingSessionLocal)
+
+    with TestingSessionLocal() as db:
+        db.query(SaleObservation).delete()
+        db.commit()
+
+    return pricing.observation_store
+
+
+@pytest.fixture(autouse=True)
+def fresh_quotas(monkeypatch):
+    """Each test starts with full per-user quota buckets"""
+    monkeypatch.setattr(quotas, 'store', MemoryQuotaStore())
+    return quotas
+
+
 @pytest.fixture
 def client(monkeypatch):
     # Replace with fake user
@@ -61,6 +83,8 @@ def client(monkeypatch):
 
     # Patch to use SQLite session for tests
     monkeypatch.setattr(main, 'SessionLocal', TestingSessionLocal)
+    monkeypatch.setattr(main.pricing_cache, 'session_factory', TestingSessionLocal)
+    main.pricing_cache.clear_l1()
 
     with TestClient(main.app) as c:
         yield c
@@ -0,0 +1,355 @@
+"""Local stand-in HTTP servers so tests never reach Supabase or eBay
+
+Also runs on its own, for load tests or for pointing a dev server at (EBAY_OAUTH_URL / EBAY_BROWSE_URL):
+
+    python -m tests.fakes serve [--port 8900] [--latency 0.1] [--jitter 0.2] [--error-rate 0.05] [--results 40]
+    python -m tests.fakes serve --replay fixture.json
+    python -m tests.fakes record fixture.json "2021-22 Cole Caufield 201" ...   (real eBay credentials)
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from jose import jwk, jwt
+
+from app.auth import supabase_auth
+
+
+class FakeServer:
+    """Tiny threaded HTTP server; routes map a path to a handler returning (status, body)"""
+
+    def __init__(self, routes=None, latency=0.0, jitter=0.0, port=0):
+        self.routes = routes or {}
+        self.latency = latency
+        self.jitter = jitter  # Extra uniform(0, jitter) seconds per request
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, so pooled clients can reuse connections
+
+            def do_GET(self):
+                self._dispatch()
+
+            def do_POST(self):
+                self._dispatch()
+
+            def _dispatch(self):
+                url = urlparse(self.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length).decode() if length else ''
+
+                with server._lock:
+                    server.calls[url.path] += 1
+
+                if server.latency or server.jitter:
+                    time.sleep(server.latency + random.uniform(0, server.jitter))
+
+                route = server.routes.get(url.path)
+                if route is None:
+                    status, payload = 404, {'error': 'not found'}
+                else:
+                    status, payload = route(parse_qs(url.query), self.headers, body)
+
+                data = json.dumps(payload).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Client gave up waiting (deadline, hedge loser)
+                    self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            request_queue_size = 128
+
+        self._httpd = Server(('127.0.0.1', port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class FakeJWKS:
+    """Serves a JWKS document that tests can rotate or break"""
+
+    path = '/auth/v1/.well-known/jwks.json'
+
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.status = 200
+
+    def __call__(self, query, headers, body):
+        if self.status != 200:
+            return self.status, {'error': 'unavailable'}
+        return 200, {'keys': self.keys}
+
+
+def make_key(kid):
+    """Returns a private PEM and its public JWK"""
+    private = ec.generate_private_key(ec.SECP256R1())
+    pem = private.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    public = jwk.construct(pem, 'ES256').public_key().to_dict()
+    public['kid'] = kid
+    return pem, public
+
+
+def make_token(pem, kid, sub='user-1'):
+    claims = {
+        'sub': sub,
+        'email': f'{sub}@example.com',
+        'aud': 'authenticated',
+        'iss': f'{supabase_auth.SUPABASE_URL}/auth/v1',
+        'exp': int(time.time()) + 3600,
+    }
+    return jwt.encode(claims, pem, algorithm='ES256', headers={'kid': kid})
+
+
+class FakeEbay:
+    """OAuth + Browse routes for a local eBay stand-in.
+
+    Every query gets the same prices unless result_size is set, in which case each query gets its
+    own deterministic list of that many sales. error_rate is the share of Browse calls answered 503.
+    """
+
+    oauth_path = '/identity/v1/oauth2/token'
+    browse_path = '/buy/browse/v1/item_summary/search'
+
+    def __init__(self, prices=(10.0, 12.0, 11.0, 13.0, 12.5), expires_in=7200, error_rate=0.0, result_size=None, seed=0):
+        self.items = [(f'v1|{i}|0', p) for i, p in enumerate(prices)]  # Newest first, like sort=newlyListed
+        self.expires_in = expires_in
+        self.error_rate = error_rate
+        self.result_size = result_size
+        self.tokens_issued = 0
+        self.browse_status = 200
+
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()  # Server threads share it
+
+    @property
+    def prices(self):
+        return [p for _, p in self.items]
+
+    def sell(self, *prices, position=0):
+        """New sales show up ahead of older ones, or at position for listings created before them"""
+        start = len(self.items)
+        self.items[position:position] = [(f'v1|{start + i}|0', p) for i, p in enumerate(prices)]
+
+    @property
+    def routes(self):
+        return {self.oauth_path: self.oauth, self.browse_path: self.browse}
+
+    def oauth(self, query, headers, body):
+        self.tokens_issued += 1
+        return 200, {'access_token': f'token-{self.tokens_issued}', 'expires_in': self.expires_in, 'token_type': 'Application Access Token'}
+
+    def browse(self, query, headers, body):
+        if not headers.get('Authorization', '').startswith('Bearer token-'):
+            return 401, {'errors': [{'message': 'Invalid access token'}]}
+        if self.browse_status != 200:
+            return self.browse_status, {'errors': [{'message': 'Upstream error'}]}
+
+        if self.injected_error():
+            return 503, {'errors': [{'message': 'Injected error'}]}
+
+        items = self.items if self.result_size is None else self.items_for(query.get('q', [''])[0])
+        offset = int(query.get('offset', ['0'])[0])
+        limit = int(query.get('limit', ['50'])[0])
+        page = items[offset : offset + limit]
+
+        body = {
+            'total': len(items),
+            'offset': offset,
+            'limit': limit,
+            'itemSummaries': [{'itemId': item_id, 'price': {'value': str(p), 'currency': 'USD'}} for item_id, p in page],
+        }
+        if offset + limit < len(items):
+            body['next'] = f'?offset={offset + limit}&limit={limit}'
+        return 200, body
+
+    def injected_error(self):
+        if not self.error_rate:
+            return False
+        with self._rng_lock:
+            return self._rng.random() < self.error_rate
+
+    def items_for(self, q):
+        """result_size sales around a per-query base price, the same on every call"""
+        digest = int(hashlib.sha256(q.encode()).hexdigest()[:8], 16)
+        rng = random.Random(digest)
+        base = 5 + digest % 200
+        return [(f'v1|{digest}-{i}|0', round(base * rng.uniform(0.8, 1.25), 2)) for i in range(self.result_size)]
+
+
+class ReplayEbay(FakeEbay):
+    """Serves Browse responses recorded from real eBay (see record_fixture); OAuth stays fake"""
+
+    def __init__(self, fixture, **kwargs):
+        super().__init__(**kwargs)
+        with open(fixture) as f:
+            self.responses = json.load(f)
+        self.misses = 0
+
+    def browse(self, query, headers, body):
+        if not headers.get('Authorization', '').startswith('Bearer token-'):
+            return 401, {'errors': [{'message': 'Invalid access token'}]}
+        if self.injected_error():
+            return 503, {'errors': [{'message': 'Injected error'}]}
+
+        recorded = self.responses.get(fixture_key(query.get('q', [''])[0], query.get('offset', ['0'])[0], query.get('limit', ['50'])[0]))
+
+        if recorded is None:
+            self.misses += 1
+            return 200, {'total': 0, 'itemSummaries': []}
+
+        return recorded['status'], recorded['body']
+
+
+def fixture_key(q, offset, limit):
+    return f'{q}|{offset}|{limit}'
+
+
+async def record_fixture(path, queries, page_size=20, max_pages=5):
+    """Calls real eBay with the app's own client and saves every Browse page for ReplayEbay"""
+    from app.scripts.ebay_client import close_ebay_client, get_ebay_client
+
+    client = get_ebay_client()
+    responses = {}
+
+    try:
+        for q in queries:
+            for page in range(max_pages):
+                params = {'q': q, 'limit': page_size, 'offset': page * page_size, 'filter': 'soldItems:true', 'sort': 'newlyListed'}
+                response = await client.search(params)
+                body = response.json()
+                responses[fixture_key(q, params['offset'], page_size)] = {'status': response.status_code, 'body': body}
+
+                if response.status_code != 200 or 'next' not in body:
+                    break
+    finally:
+        await close_ebay_client()
+
+    with open(path, 'w') as f:
+        json.dump(responses, f, indent=1)
+
+    return len(responses)
+
+
+@contextmanager
+def fake_ebay_server(monkeypatch, ebay=None, **kwargs):
+    """Starts a FakeEbay server (or the given stand-in) and points the eBay client at it"""
+    from app.scripts import ebay_client, ebay_token
+
+    ebay = ebay or FakeEbay(**kwargs)
+    with FakeServer(ebay.routes) as server:
+        monkeypatch.setenv('EBAY_CLIENT_ID', 'client')
+        monkeypatch.setenv('EBAY_CLIENT_SECRET', 'secret')
+        monkeypatch.setattr(ebay_token, 'EBAY_OAUTH_URL', server.url + FakeEbay.oauth_path)
+        monkeypatch.setattr(ebay_client, 'EBAY_BROWSE_URL', server.url + FakeEbay.browse_path)
+        monkeypatch.setattr(ebay_client, '_client', None)
+        server.ebay = ebay
+        yield server
+
+
+class MeanPipeline:
+    """Model stand-in for inference workers; reports what it saw of the shared-memory image"""
+
+    def run(self, image, debug=None):
+        if image.mean() == 255:
+            os._exit(1)  # Simulates a worker crashing mid-inference
+        if image.mean() == 13:
+            raise ValueError('unreadable card')
+
+        h, w = image.shape[:2]
+        return {
+            'bbox': [0, 0, w, h],
+            'card_crop': image,
+            'mean': float(image.mean()),
+            'pid': os.getpid(),
+            'debug': getattr(debug, 'request_id', None),
+        }
+
+
+def fake_pipelines():
+    """build for InferencePool in tests: no models, no torch"""
+    return {'detect': MeanPipeline(), 'ocr': MeanPipeline()}
+
+
+def run_async(coro):
+    """Runs a coroutine on a fresh loop, closing the pooled eBay client before the loop goes away"""
+    from app.scripts.ebay_client import close_ebay_client
+
+    async def main():
+        try:
+            return await coro
+        finally:
+            await close_ebay_client()
+
+    return asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local eBay stand-in')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('serve')
+    serve.add_argument('--port', type=int, default=8900)
+    serve.add_argument('--latency', type=float, default=0.0)
+    serve.add_argument('--jitter', type=float, default=0.0)
+    serve.add_argument('--error-rate', type=float, default=0.0)
+    serve.add_argument('--results', type=int, default=40)
+    serve.add_argument('--replay', help='Fixture written by the record command')
+
+    record = commands.add_parser('record')
+    record.add_argument('fixture')
+    record.add_argument('queries', nargs='+')
+
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        print(f'recorded {asyncio.run(record_fixture(args.fixture, args.queries))} pages to {args.fixture}')
+        return
+
+    ebay = ReplayEbay(args.replay, error_rate=args.error_rate) if args.replay else FakeEbay(error_rate=args.error_rate, result_size=args.results)
+
+    with FakeServer(ebay.routes, latency=args.latency, jitter=args.jitter, port=args.port) as server:
+        print(f'EBAY_OAUTH_URL={server.url}{FakeEbay.oauth_path}')
+        print(f'EBAY_BROWSE_URL={server.url}{FakeEbay.browse_path}')
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
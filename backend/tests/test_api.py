@@ -1,4 +1,5 @@
 import app.main as main
+from app.auth import internal
 
 
 def test_health(client):
@@ -15,6 +16,19 @@ def test_ready(client):
     assert response.json() == {'status': 'ready'}
 
 
+def test_metrics(client, monkeypatch):
+    """GET /metrics exposes auth cache counters to holders of METRICS_TOKEN only"""
+    assert client.get('/metrics').status_code == 404  # No token configured
+
+    monkeypatch.setattr(internal, 'METRICS_TOKEN', 'scrape-secret')
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'})
+    assert response.status_code == 200
+    assert {'hits', 'misses', 'verify_ms_saved'} <= response.json()['auth_token_cache'].keys()
+
+
 def test_not_ready(client):
     """GET /ready returns not_ready when DB fails"""
 
@@ -0,0 +1,189 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+from fakes import FakeJWKS, FakeServer, make_key, make_token
+from fastapi import HTTPException, Request
+
+from app.auth import supabase_auth
+from app.auth.jwks import JWKSCache
+from app.auth.supabase_auth import current_user
+from app.auth.token_cache import VerifiedTokenCache
+
+
+def make_request(token):
+    return Request({'type': 'http', 'headers': [(b'authorization', f'Bearer {token}'.encode())]})
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def jwks(monkeypatch):
+    pem, public = make_key('key-1')
+    fake = FakeJWKS([public])
+    clock = FakeClock()
+
+    with FakeServer({FakeJWKS.path: fake}) as server:
+        cache = JWKSCache(server.url + FakeJWKS.path, ttl=60, min_refresh=5, max_stale=600, clock=clock)
+        tokens = VerifiedTokenCache(maxsize=8)
+        monkeypatch.setattr(supabase_auth, 'jwks_cache', cache)
+        monkeypatch.setattr(supabase_auth, 'verified_tokens', tokens)
+        yield SimpleNamespace(server=server, fake=fake, cache=cache, tokens=tokens, clock=clock, pem=pem)
+
+
+def jwks_calls(jwks):
+    return jwks.server.calls[FakeJWKS.path]
+
+
+def test_keys_fetched_once(jwks):
+    """Repeated requests reuse the cached key set"""
+    token = make_token(jwks.pem, 'key-1')
+
+    for _ in range(5):
+        assert current_user(make_request(token))['user_id'] == 'user-1'
+
+    assert jwks_calls(jwks) == 1
+
+
+def test_keys_refetched_after_ttl(jwks):
+    """Key set is refreshed once its TTL has passed"""
+    token = make_token(jwks.pem, 'key-1')
+
+    current_user(make_request(token))
+    jwks.clock.now += 61
+    current_user(make_request(token))
+
+    assert jwks_calls(jwks) == 2
+
+
+def test_unknown_kid_triggers_refresh(jwks):
+    """A token signed by a rotated-in key refreshes the key set before TTL"""
+    current_user(make_request(make_token(jwks.pem, 'key-1')))
+
+    jwks.clock.now += 10
+    new_pem, new_public = make_key('key-2')
+    jwks.fake.keys.append(new_public)
+
+    assert current_user(make_request(make_token(new_pem, 'key-2')))['user_id'] == 'user-1'
+    assert jwks_calls(jwks) == 2
+
+
+def test_unknown_kid_refresh_is_throttled(jwks):
+    """Bogus kids cannot force a refetch on every request"""
+    current_user(make_request(make_token(jwks.pem, 'key-1')))
+
+    bogus_pem, _ = make_key('bogus')
+    for _ in range(3):
+        with pytest.raises(HTTPException) as e:
+            current_user(make_request(make_token(bogus_pem, 'bogus')))
+        assert e.value.status_code == 401
+
+    assert jwks_calls(jwks) == 1
+
+
+def test_concurrent_misses_single_fetch(jwks):
+    """Concurrent requests on a cold cache share one JWKS fetch"""
+    jwks.server.latency = 0.2
+    token = make_token(jwks.pem, 'key-1')
+    results = []
+
+    def call():
+        results.append(current_user(make_request(token)))
+
+    threads = [threading.Thread(target=call) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(results) == 10
+    assert jwks_calls(jwks) == 1
+
+
+def test_stale_keys_served_on_error(jwks):
+    """Expired keys are still used while the JWKS endpoint is failing"""
+    token = make_token(jwks.pem, 'key-1')
+    current_user(make_request(token))
+
+    jwks.fake.status = 500
+    jwks.clock.now += 120
+
+    assert current_user(make_request(token))['user_id'] == 'user-1'
+    assert jwks.cache.fetch_errors == 1
+
+
+def test_no_keys_and_endpoint_down(jwks):
+    """Returns 503 when keys were never fetched and the endpoint is down"""
+    jwks.fake.status = 500
+
+    with pytest.raises(HTTPException) as e:
+        current_user(make_request(make_token(jwks.pem, 'key-1')))
+
+    assert e.value.status_code == 503
+
+
+def test_verified_token_cache_hit(jwks, monkeypatch):
+    """The same bearer token is only signature-checked once"""
+    token = make_token(jwks.pem, 'key-1')
+    decodes = []
+    real_decode = supabase_auth.jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        decodes.append(1)
+        return real_decode(*args, **kwargs)
+
+    monkeypatch.setattr(supabase_auth.jwt, 'decode', counting_decode)
+
+    for _ in range(5):
+        assert current_user(make_request(token))['user_id'] == 'user-1'
+
+    assert len(decodes) == 1
+    stats = jwks.tokens.stats()
+    assert stats['hits'] == 4
+    assert stats['misses'] == 1
+
+
+def test_verified_token_cache_respects_exp():
+    """Entries are dropped once the token's exp has passed"""
+    now = [1000.0]
+    cache = VerifiedTokenCache(clock=lambda: now[0])
+    cache.put('tok', {'sub': 'u', 'exp': 1100}, key_version=1)
+
+    assert cache.get('tok', key_version=1) == {'sub': 'u', 'exp': 1100}
+
+    now[0] = 1100.0
+    assert cache.get('tok', key_version=1) is None
+    assert cache.stats()['size'] == 0
+
+
+def test_verified_token_cache_evicted_on_rotation(jwks):
+    """Rotating the key set invalidates claims verified with the old keys"""
+    token = make_token(jwks.pem, 'key-1')
+    current_user(make_request(token))
+
+    _, new_public = make_key('key-2')
+    jwks.fake.keys = [new_public]
+    jwks.clock.now += 61
+
+    with pytest.raises(HTTPException) as e:
+        current_user(make_request(token))
+
+    assert e.value.status_code == 401
+
+
+def test_verified_token_cache_is_bounded():
+    """Least recently used entries are evicted past maxsize"""
+    cache = VerifiedTokenCache(maxsize=2, clock=lambda: 0)
+
+    for i in range(3):
+        cache.put(f'tok-{i}', {'sub': str(i), 'exp': 10}, key_version=0)
+
+    assert cache.get('tok-0', key_version=0) is None
+    assert cache.get('tok-2', key_version=0) is not None
+    assert cache.stats()['evictions'] == 1
@@ -0,0 +1,92 @@
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import numpy as np
+import pytest
+
+from app.scripts.batching import MicroBatcher
+from app.scripts.card_detection import CardDetectionPipeline
+
+
+class RecordingModel:
+    """Doubles each item; holds the first batch until released so others can queue up"""
+
+    def __init__(self):
+        self.batches = []
+        self.release = threading.Event()
+
+    def __call__(self, items):
+        if not self.batches:
+            self.release.wait(5)
+        self.batches.append(list(items))
+        return [item * 2 for item in items]
+
+
+def test_concurrent_items_share_batches():
+    """Items queued while a batch runs go out together, capped at max_batch_size, each caller gets its own result"""
+    model = RecordingModel()
+    batcher = MicroBatcher(model, max_batch_size=3, max_wait=0.05)
+
+    futures = [batcher.submit(i) for i in range(7)]
+    model.release.set()
+
+    assert [f.result(5) for f in futures] == [0, 2, 4, 6, 8, 10, 12]
+    assert [len(batch) for batch in model.batches] == [3, 3, 1]
+    assert batcher.info()['mean_batch_size'] == pytest.approx(7 / 3, abs=0.01)
+    batcher.close()
+
+
+def test_lone_item_waits_at_most_max_wait():
+    model = RecordingModel()
+    model.release.set()
+    batcher = MicroBatcher(model, max_batch_size=8, max_wait=0.01)
+
+    assert batcher(21) == 42
+    batcher.close()
+
+
+def test_batch_failure_reaches_every_caller():
+    def broken(items):
+        raise RuntimeError('out of memory')
+
+    batcher = MicroBatcher(broken, max_batch_size=4, max_wait=0.05)
+    futures = [batcher.submit(i) for i in range(2)]
+
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(5)
+    batcher.close()
+
+
+def test_wrong_result_count_reaches_every_caller():
+    """A run_batch that drops results fails the whole batch instead of leaving callers waiting"""
+    batcher = MicroBatcher(lambda items: items[:-1], max_batch_size=3, max_wait=0.05)
+    futures = [batcher.submit(i) for i in range(3)]
+
+    for future in futures:
+        with pytest.raises(RuntimeError, match='2 results for 3 items'):
+            future.result(5)
+    batcher.close()
+
+
+def test_call_times_out_and_withdraws_item():
+    """A caller stuck behind a slow batch gives up after timeout and its item never runs"""
+    model = RecordingModel()
+    batcher = MicroBatcher(model, max_batch_size=1, max_wait=0, timeout=0.05)
+
+    first = batcher.submit(1)  # Holds the worker until released
+    with pytest.raises(FutureTimeoutError):  # Not the builtin TimeoutError before Python 3.11
+        batcher(2)
+
+    model.release.set()
+    assert first.result(5) == 2
+    batcher.close()
+
+    assert model.batches == [[1]]
+    assert batcher.info()['timeouts'] == 1
+
+
+def test_pipeline_without_model_finds_nothing():
+    pipeline = CardDetectionPipeline(None, max_batch_size=4, max_wait_ms=1)
+    assert pipeline.run(np.zeros((4, 4, 3), np.uint8)) is None
+    pipeline.batcher.close()
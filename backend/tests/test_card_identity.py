@@ -0,0 +1,64 @@
+import pytest
+from conftest import TestingSessionLocal
+from fakes import FakeEbay, fake_ebay_server, run_async
+
+from app.scripts import pricing
+from app.scripts.card_identity import card_identity
+
+CAUFIELD = {'name': 'Cole Caufield', 'card_series': '2021-22 Upper Deck Series 2 Hockey', 'card_number': '201', 'card_type': 'Young Guns'}
+
+
+@pytest.mark.parametrize(
+    'changes',
+    [
+        {'name': 'cole caufield'},
+        {'name': '  COLE   Caufield '},
+        {'name': 'C. Caufield'},
+        {'name': 'Caufield, Cole'},
+        {'card_series': '2021 Upper Deck Series 2'},
+        {'card_series': '2021/2022 UD Series Two'},
+        {'card_number': '#201'},
+        {'card_number': '0201'},
+        {'card_type': 'YG'},
+        {'card_type': 'young gun'},
+    ],
+)
+def test_variants_share_identity(changes):
+    """Casing, spacing, initials, year formats, set and parallel aliases map to one key"""
+    assert card_identity({**CAUFIELD, **changes}) == card_identity(CAUFIELD)
+
+
+@pytest.mark.parametrize(
+    'changes',
+    [
+        {'name': 'Nick Suzuki'},
+        {'card_series': '2022-23 Upper Deck Series 2'},
+        {'card_series': '2021-22 Upper Deck Series 1'},
+        {'card_number': '202'},
+        {'card_type': 'Base'},
+        {'card_type': 'Young Guns Canvas'},
+    ],
+)
+def test_different_cards_differ(changes):
+    assert card_identity({**CAUFIELD, **changes}) != card_identity(CAUFIELD)
+
+
+def test_missing_name_has_no_identity():
+    assert card_identity({**CAUFIELD, 'name': ' . '}) == ''
+
+
+def test_spelling_variants_share_cache(monkeypatch):
+    """Two spellings of one card cost one eBay lookup"""
+    monkeypatch.setattr(pricing.pricing_cache, 'session_factory', TestingSessionLocal)
+    pricing.pricing_cache.clear_l1()
+
+    async def scenario():
+        first = await pricing.price_card(CAUFIELD)
+        second = await pricing.price_card({**CAUFIELD, 'name': 'C. Caufield', 'card_series': '2021 UD Series 2'})
+        return first, second
+
+    with fake_ebay_server(monkeypatch) as server:
+        first, second = run_async(scenario())
+
+    assert first == second
+    assert server.calls[FakeEbay.browse_path] == 1
@@ -0,0 +1,27 @@
+import ast
+from pathlib import Path
+
+APP = Path(__file__).resolve().parent.parent / 'app'
+
+
+def caught_names(handler):
+    if handler.type is None:
+        return []
+    types = handler.type.elts if isinstance(handler.type, ast.Tuple) else [handler.type]
+    return [t.id for t in types if isinstance(t, ast.Name)]
+
+
+def test_no_bare_timeout_error_handlers():
+    """Before Python 3.11 (CI runs 3.10) asyncio and concurrent.futures raise their own TimeoutError classes.
+
+    A bare `except TimeoutError` passes on 3.11+ but misses them on 3.10, so catch
+    asyncio.TimeoutError or concurrent.futures.TimeoutError instead.
+    """
+    offenders = []
+
+    for path in APP.rglob('*.py'):
+        for node in ast.walk(ast.parse(path.read_text())):
+            if isinstance(node, ast.ExceptHandler) and 'TimeoutError' in caught_names(node):
+                offenders.append(f'{path.relative_to(APP.parent)}:{node.lineno}')
+
+    assert offenders == []
@@ -0,0 +1,102 @@
+import threading
+
+import cv2
+import numpy as np
+
+from app.scripts import text_detection
+from app.scripts.text_detection import TextExtraction
+from app.utils import debug_artifacts as artifacts_module
+from app.utils.debug_artifacts import DebugArtifacts
+
+CROP = np.full((20, 60, 3), 128, np.uint8)
+
+
+def test_off_by_default_and_sampled():
+    assert DebugArtifacts(target='off', sample_rate=1.0).start() is None
+
+    draws = iter([0.5, 0.005])
+    sink = DebugArtifacts(target='local', sample_rate=0.01, rng=lambda: next(draws))
+    assert sink.start() is None
+    assert sink.start() is not None
+    assert sink.info()['sampled_requests'] == 1
+
+
+def test_writes_per_request_directory(tmp_path):
+    sink = DebugArtifacts(target='local', sample_rate=1.0, directory=str(tmp_path))
+    first, second = sink.start('req-1'), sink.start('req-2')
+
+    first.add('name', CROP)
+    second.add('name', CROP)
+    sink.flush()
+
+    assert cv2.imread(str(tmp_path / 'req-1' / 'name.jpg')).shape == (20, 60, 3)
+    assert (tmp_path / 'req-2' / 'name.jpg').exists()  # Concurrent requests don't overwrite each other
+    assert sink.info()['written'] == 2
+
+
+def test_s3_target_and_backlog_limit(monkeypatch):
+    uploaded = []
+    monkeypatch.setattr(artifacts_module, 'upload_bytes', lambda data, key: uploaded.append(key))
+    sink = DebugArtifacts(target='s3', sample_rate=1.0, directory='debug', max_pending=0)
+
+    sink.start('req-1').add('name', CROP)
+    assert sink.info()['dropped'] == 1
+
+    sink.max_pending = 10
+    sink.start('req-1').add('name', CROP)
+    sink.flush()
+    assert uploaded == ['debug/req-1/name.jpg']
+
+
+def test_submit_races_flush(tmp_path):
+    """Requests adding artifacts while shutdown flushes never hit a missing or closed executor"""
+    sink = DebugArtifacts(target='local', sample_rate=1.0, directory=str(tmp_path), max_pending=1000)
+    errors = []
+
+    def add(n):
+        try:
+            for i in range(50):
+                sink.start(f'req-{n}').add(str(i), CROP)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=add, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for _ in range(20):
+        sink.flush()
+    for thread in threads:
+        thread.join()
+    sink.flush()
+
+    assert errors == []
+    assert sink.info()['written'] == 200
+    assert sink.info()['pending'] == 0
+
+
+def test_failed_submit_is_not_pending(tmp_path):
+    class ClosedExecutor:
+        def submit(self, *args):
+            raise RuntimeError('cannot schedule new futures after shutdown')
+
+    sink = DebugArtifacts(target='local', sample_rate=1.0, directory=str(tmp_path))
+    sink._executor = ClosedExecutor()
+
+    sink.start('req-1').add('name', CROP)
+    assert sink.info()['pending'] == 0
+    assert sink.info()['dropped'] == 1
+
+
+def test_extraction_writes_nothing_unless_sampled(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(text_detection, 'detect_boxes', lambda model, image: [{'bbox': (0, 0, 60, 20), 'field': 'name'}])
+    monkeypatch.setattr(text_detection, 'easy_ocr', lambda reader, crop: 'Cole Caufield')
+    image = np.zeros((100, 100, 3), np.uint8)
+
+    assert TextExtraction(None, None).run(image) == {'name': 'Cole Caufield'}
+    assert list(tmp_path.iterdir()) == []
+
+    sink = DebugArtifacts(target='local', sample_rate=1.0, directory=str(tmp_path))
+    TextExtraction(None, None).run(image, debug=sink.start('req-1'))
+    sink.flush()
+    assert cv2.imread(str(tmp_path / 'req-1' / 'name.jpg')).shape == (60, 180, 3)  # The 3x crop OCR read
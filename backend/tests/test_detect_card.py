@@ -0,0 +1,67 @@
+import io
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+import app.main as main
+
+
+class FakeDetector:
+    """Stands in for CardDetectionPipeline; finds the card at a fixed box"""
+
+    def __init__(self, bbox):
+        self.bbox = bbox
+        self.images = []
+
+    def run(self, image):
+        self.images.append(image)
+        return {'bbox': self.bbox}
+
+
+def photo(size, orientation=None):
+    buffer = io.BytesIO()
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    Image.new('RGB', size, (200, 30, 10)).save(buffer, 'JPEG', exif=exif)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def uploads(monkeypatch):
+    uploaded = {}
+    monkeypatch.setattr(main, 'upload_bytes', lambda data, key: uploaded.setdefault(key, data))
+    return uploaded
+
+
+def test_detects_in_memory_and_uploads_after(client, monkeypatch, uploads):
+    """YOLO gets the scaled BGR array, and the uploaded crop is that array's bbox"""
+    detector = FakeDetector([100, 50, 500, 650.7])
+    monkeypatch.setattr(main, 'pipeline_one', detector)
+
+    r = client.post('/detect-card', data={'image_type': 'front'}, files={'file': ('IMG_1.JPG', photo((4000, 3000)), 'image/jpeg')})
+    data = r.json()['data']
+
+    image = detector.images[0]
+    assert image.shape == (1200, 1600, 3)
+    assert tuple(image[0, 0]) == pytest.approx((10, 30, 200), abs=3)  # BGR
+
+    original = cv2.imdecode(np.frombuffer(uploads[data['s3_key_original']], np.uint8), cv2.IMREAD_COLOR)
+    crop = cv2.imdecode(np.frombuffer(uploads[data['s3_key_crop']], np.uint8), cv2.IMREAD_COLOR)
+    assert original.shape == (1200, 1600, 3)
+    assert crop.shape == (600, 400, 3)
+    assert data['s3_key_crop'].endswith('/front_crop.jpg')
+
+
+def test_exif_rotation_and_unwritable_format(client, monkeypatch, uploads):
+    """Sideways phone photos are turned upright; formats OpenCV can't write are stored as JPEG"""
+    detector = FakeDetector([0, 0, 10, 10])
+    monkeypatch.setattr(main, 'pipeline_one', detector)
+
+    r = client.post('/detect-card', data={'image_type': 'back'}, files={'file': ('IMG_2.heic', photo((400, 300), orientation=6), 'image/heic')})
+
+    assert detector.images[0].shape == (400, 300, 3)
+    assert r.json()['data']['s3_key_original'].endswith('/back.jpg')
+    assert len(uploads) == 2
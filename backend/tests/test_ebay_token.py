@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+from fakes import FakeEbay, fake_ebay_server, run_async
+
+from app.scripts import ebay_token, pricing
+from app.scripts.ebay_client import EbayClient, get_ebay_client
+from app.scripts.ebay_token import EbayTokenManager
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def ebay(monkeypatch):
+    with fake_ebay_server(monkeypatch) as server:
+        yield server
+
+
+def oauth_calls(server):
+    return server.calls[FakeEbay.oauth_path]
+
+
+def make_manager(**kwargs):
+    client = EbayClient()
+    return EbayTokenManager(lambda: ebay_token.request_ebay_token(client.http), **kwargs), client
+
+
+def test_token_reused_until_margin(ebay):
+    """Token is requested once and reused until shortly before expires_in"""
+    clock = FakeClock()
+
+    async def scenario():
+        manager, client = make_manager(refresh_margin=60, early_refresh=0, clock=clock)
+        tokens = [await manager.get_token()]
+        clock.now = 7000
+        tokens.append(await manager.get_token())
+        clock.now = 7141
+        tokens.append(await manager.get_token())
+        await client.aclose()
+        return tokens
+
+    assert run_async(scenario()) == ['token-1', 'token-1', 'token-2']
+    assert oauth_calls(ebay) == 2
+
+
+def test_early_refresh_runs_in_background(ebay):
+    """Inside the early-refresh window callers keep the old token while a new one is fetched"""
+    clock = FakeClock()
+
+    async def scenario():
+        manager, client = make_manager(refresh_margin=60, early_refresh=600, clock=clock)
+        await manager.get_token()
+        clock.now = 6700
+        during = await manager.get_token()
+        await manager._background
+        after = await manager.get_token()
+        await client.aclose()
+        return during, after
+
+    assert run_async(scenario()) == ('token-1', 'token-2')
+    assert oauth_calls(ebay) == 2
+
+
+def test_concurrent_callers_share_one_request(ebay):
+    """Callers arriving during a refresh wait on the in-flight request"""
+    ebay.latency = 0.2
+
+    async def scenario():
+        manager, client = make_manager()
+        tokens = await asyncio.gather(*[manager.get_token() for _ in range(10)])
+        await client.aclose()
+        return tokens
+
+    assert run_async(scenario()) == ['token-1'] * 10
+    assert oauth_calls(ebay) == 1
+
+
+def test_sold_prices_reuse_token(ebay):
+    """Pricing several cards costs one OAuth round trip"""
+
+    async def scenario():
+        queries = ['2021-22 Cole Caufield 201', '2021-22 Nick Suzuki 93', '2015-16 Connor McDavid 201']
+        return [await pricing.get_sold_prices(q) for q in queries]
+
+    assert run_async(scenario()) == [FakeEbay().prices] * 3
+    assert oauth_calls(ebay) == 1
+    assert ebay.calls[FakeEbay.browse_path] == 3
+
+
+def test_rejected_token_is_replaced(ebay, monkeypatch):
+    """A 401 from Browse drops the token so the retry gets a fresh one"""
+    monkeypatch.setattr(pricing, 'BACKOFF_SECONDS', 0)
+
+    async def scenario():
+        tokens = get_ebay_client().tokens
+        tokens._token = 'revoked'
+        tokens._expires_at = tokens.clock() + 7200
+        return await pricing.get_sold_prices('2021-22 Cole Caufield 201')
+
+    assert run_async(scenario()) == FakeEbay().prices
+    assert oauth_calls(ebay) == 1
+
+
+def test_missing_credentials(monkeypatch):
+    monkeypatch.delenv('EBAY_CLIENT_ID', raising=False)
+
+    with pytest.raises(ValueError):
+        asyncio.run(ebay_token.request_ebay_token(None))
@@ -0,0 +1,126 @@
+import io
+
+import cv2
+import numpy as np
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.scripts.inference_pool import PooledPipeline
+from app.utils.images import UploadTooLarge, read_upload
+from app.utils.upload_limit import UploadSizeLimit
+
+
+class FakeExtractor:
+    def __init__(self):
+        self.images = []
+
+    def run(self, image, debug=None):
+        self.images.append(image)
+        return {'name': 'Cole Caufield'}
+
+
+class FakePooledExtractor(PooledPipeline):
+    """A pooled pipeline that only answers when awaited"""
+
+    def __init__(self):
+        super().__init__(pool=None, kind='ocr')
+
+    def run(self, image, debug=None):
+        raise AssertionError('Pooled inference should not block a threadpool thread')
+
+    async def run_async(self, image, debug=None):
+        return {'name': 'Connor Bedard', 'shape': list(image.shape)}
+
+
+def png(h, w):
+    return cv2.imencode('.png', np.full((h, w, 3), (10, 20, 30), np.uint8))[1].tobytes()
+
+
+def test_decodes_upload_in_memory(client, monkeypatch):
+    extractor = FakeExtractor()
+    monkeypatch.setattr(main, 'pipeline_two', extractor)
+
+    r = client.post('/extract-text', files={'file': ('crop.png', png(40, 30), 'image/png')})
+
+    assert r.json()['data'] == {'name': 'Cole Caufield'}
+    assert extractor.images[0].shape == (40, 30, 3)
+    assert tuple(extractor.images[0][0, 0]) == (10, 20, 30)
+
+
+def test_pooled_pipeline_is_awaited(client, monkeypatch):
+    monkeypatch.setattr(main, 'pipeline_two', FakePooledExtractor())
+
+    r = client.post('/extract-text', files={'file': ('crop.png', png(40, 30), 'image/png')})
+
+    assert r.json()['data'] == {'name': 'Connor Bedard', 'shape': [40, 30, 3]}
+
+
+def test_rejects_oversized_and_invalid(client, monkeypatch):
+    monkeypatch.setattr(main, 'pipeline_two', FakeExtractor())
+    monkeypatch.setattr(main, 'MAX_UPLOAD_BYTES', 100)
+
+    r = client.post('/extract-text', files={'file': ('crop.png', png(400, 300) + b'x' * 100, 'image/png')})
+    assert r.json()['error']['code'] == 'IMAGE_TOO_LARGE'
+
+    r = client.post('/extract-text', files={'file': ('crop.png', b'not an image', 'image/png')})
+    assert r.json()['error']['code'] == 'INVALID_IMAGE'
+
+    r = client.post('/extract-text', files={'file': ('crop.png', b'', 'image/png')})
+    assert r.json()['error']['code'] == 'INVALID_IMAGE'
+
+
+def test_read_upload_stops_at_limit():
+    """Reading stops at the first chunk past the limit rather than buffering the whole upload"""
+    upload = io.BytesIO(b'x' * 10_000)
+
+    with pytest.raises(UploadTooLarge):
+        read_upload(upload, max_bytes=2500, chunk_size=1000)
+
+    assert upload.tell() == 3000
+    assert bytes(read_upload(io.BytesIO(b'abc'), max_bytes=3)) == b'abc'
+
+
+@pytest.fixture
+def limited_client():
+    """A one-route app behind UploadSizeLimit, recording whether the endpoint ran"""
+    app = FastAPI()
+    calls = []
+
+    @app.post('/upload')
+    def upload(file: UploadFile = File(...)):
+        calls.append(len(file.file.read()))
+        return {'status': 'ok'}
+
+    app.add_middleware(UploadSizeLimit, max_bytes=1000, paths=['/upload'], body=main.err('IMAGE_TOO_LARGE', 'too big'))
+    with TestClient(app) as client:
+        yield client, calls
+
+
+def test_request_over_limit_is_refused_before_the_endpoint(limited_client):
+    client, calls = limited_client
+
+    r = client.post('/upload', files={'file': ('crop.png', b'x' * 2000, 'image/png')})
+    assert r.status_code == 413
+    assert r.json()['error']['code'] == 'IMAGE_TOO_LARGE'
+
+    assert client.post('/upload', files={'file': ('crop.png', b'x' * 500, 'image/png')}).status_code == 200
+    assert calls == [500]
+
+
+def test_chunked_request_over_limit_is_refused(limited_client):
+    """Without a Content-Length the body is counted as it arrives"""
+    client, calls = limited_client
+    boundary = 'b0undary'
+    form = f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="a.png"\r\n\r\n'.encode()
+
+    def body():
+        yield form
+        for _ in range(5):
+            yield b'x' * 500
+        yield f'\r\n--{boundary}--\r\n'.encode()
+
+    r = client.post('/upload', content=body(), headers={'Content-Type': f'multipart/form-data; boundary={boundary}'})
+    assert r.status_code == 413
+    assert calls == []
@@ -54,7 +54,7 @@ def test_flow_confirm_price_and_get_prices(client, monkeypatch):
         'confidence': 0.91,
     }
 
-    def fake_price_lookup(*args, **kwargs):
+    async def fake_price_lookup(*args, **kwargs):
         return fake_result
 
     monkeypatch.setattr('app.main.run_pricing', fake_price_lookup)
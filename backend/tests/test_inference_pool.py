@@ -0,0 +1,109 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+from fakes import fake_pipelines
+
+from app.scripts.inference_pool import InferenceError, InferencePool, PooledPipeline, worker_cpus
+from app.utils.debug_artifacts import DebugSession
+
+
+@pytest.fixture(scope='module')
+def pool():
+    pool = InferencePool(workers=2, threads=1, build=fake_pipelines)
+    yield pool
+    pool.close()
+
+
+def test_images_reach_workers_through_shared_memory(pool):
+    images = [np.full((120, 160, 3), i, np.uint8) for i in range(8)]
+    futures = [pool.submit('ocr', image) for image in images]
+
+    results = [future.result(20) for future in futures]
+
+    assert [r['mean'] for r in results] == list(range(8))
+    assert {r['pid'] for r in results} - {None}  # Ran in worker processes
+    assert pool.info()['in_flight'] == 0
+
+
+def test_detection_returns_box_without_crop(pool):
+    result = PooledPipeline(pool, 'detect').run(np.zeros((30, 40, 3), np.uint8))
+    assert result == {'bbox': [0, 0, 40, 30]}
+
+
+def test_async_callers_wait_on_the_event_loop(pool):
+    """run_async resolves without a thread per caller; a caller that gives up frees its task"""
+    pipeline = PooledPipeline(pool, 'ocr')
+
+    async def scenario():
+        results = await asyncio.gather(*(pipeline.run_async(np.full((8, 8, 3), i, np.uint8)) for i in range(6)))
+
+        with pytest.raises(InferenceError, match='longer than'):
+            await pool.run_async('ocr', np.zeros((4, 4, 3), np.uint8), timeout=0)
+
+        return results
+
+    assert [r['mean'] for r in asyncio.run(scenario())] == list(range(6))
+    assert pool.info()['in_flight'] == 0
+
+
+def test_debug_session_crosses_by_request_id(pool):
+    result = pool.run('ocr', np.zeros((4, 4, 3), np.uint8), debug=DebugSession(None, 'req-1'))
+    assert result['debug'] == 'req-1'
+
+
+def test_model_errors_reach_caller(pool):
+    with pytest.raises(InferenceError, match='unreadable card'):
+        pool.run('ocr', np.full((4, 4, 3), 13, np.uint8))
+
+
+def test_dead_worker_is_replaced(pool):
+    with pytest.raises(InferenceError, match='longer than'):
+        pool.run('ocr', np.full((4, 4, 3), 255, np.uint8), timeout=3)
+
+    deadline = time.monotonic() + 20
+    while pool.info()['alive'] < 2 and time.monotonic() < deadline:
+        time.sleep(0.1)
+
+    assert pool.info()['restarts'] == 1
+    assert pool.run('ocr', np.full((4, 4, 3), 7, np.uint8))['mean'] == 7
+
+
+def test_dead_worker_is_replaced_under_load():
+    """Results that never stop arriving don't delay the replacement"""
+    pool = InferencePool(workers=2, threads=1, build=fake_pipelines, liveness_interval=0.2)
+    stop = threading.Event()
+
+    def steady_traffic():
+        while not stop.is_set():
+            try:
+                pool.run('ocr', np.full((4, 4, 3), 7, np.uint8), timeout=0.5)
+            except InferenceError:
+                pass  # A result the dead worker hadn't flushed yet
+
+    traffic = [threading.Thread(target=steady_traffic) for _ in range(4)]
+
+    try:
+        pool.run('ocr', np.zeros((4, 4, 3), np.uint8), timeout=20)  # Workers are up
+        for thread in traffic:
+            thread.start()
+        pool.submit('ocr', np.full((4, 4, 3), 255, np.uint8))
+
+        deadline = time.monotonic() + 5
+        while pool.info().get('restarts', 0) < 1 and time.monotonic() < deadline:
+            time.sleep(0.1)
+
+        assert pool.info()['restarts'] == 1  # Replaced while requests kept flowing
+    finally:
+        stop.set()
+        for thread in traffic:
+            thread.join(timeout=20)
+        pool.close()
+
+
+def test_worker_cpus_wrap():
+    assert worker_cpus(0, 2, 8) == {0, 1}
+    assert worker_cpus(3, 2, 8) == {6, 7}
+    assert worker_cpus(2, 3, 4) == {2, 3, 0}
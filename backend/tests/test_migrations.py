@@ -0,0 +1,59 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from app.db.database import Base
+from app.db.market_prices import card_key, market_series
+from app.db.migrations import MIGRATIONS, run_migrations
+from app.db.model import Card, CardPrice, SchemaMigration
+
+T0 = datetime(2025, 1, 1)
+
+
+@pytest.fixture
+def legacy_engine(tmp_path):
+    """A database from before market_price: card_info without identity or reprice_attempted_at, history in card_price"""
+    engine = create_engine(f'sqlite:///{tmp_path}/legacy.db')
+    Base.metadata.create_all(bind=engine)
+
+    with engine.begin() as conn:
+        conn.execute(text('DROP INDEX ix_card_info_identity'))
+        conn.execute(text('ALTER TABLE card_info DROP COLUMN identity'))
+        conn.execute(text('ALTER TABLE card_info DROP COLUMN reprice_attempted_at'))
+
+    yield engine
+    engine.dispose()
+
+
+def add_card(db, name, history):
+    card = Card(user_id=uuid.uuid4(), name=name, card_series='2023-24 Upper Deck Series 1', card_number='201', card_type='Young Guns')
+    db.add(card)
+    db.flush()
+    db.add_all([CardPrice(card_id=card.id, estimate=estimate, created_at=T0 + offset) for offset, estimate in history])
+    return card
+
+
+def test_legacy_history_moves_to_market_price(legacy_engine):
+    """Existing per-card history shows up in the shared series; copies of one card inside the refresh window merge into the newest"""
+    assert run_migrations(legacy_engine) == [version for version, _ in MIGRATIONS]
+    assert {'identity', 'reprice_attempted_at'} <= {column['name'] for column in inspect(legacy_engine).get_columns('card_info')}
+
+    # Rows priced before the upgrade, then the backfill runs again as it would on first deploy
+    Session = sessionmaker(bind=legacy_engine, expire_on_commit=False)
+    with Session() as db:
+        bedard = add_card(db, 'Connor Bedard', [(timedelta(0), 100.0), (timedelta(days=2), 120.0)])
+        add_card(db, 'Connor Bedard', [(timedelta(hours=1), 101.0)])  # Another user's copy
+        fantilli = add_card(db, 'Adam Fantilli', [(timedelta(days=1), 30.0)])
+        db.query(SchemaMigration).filter(SchemaMigration.version == '0002_backfill_market_prices').delete()
+        db.commit()
+
+    assert run_migrations(legacy_engine) == ['0002_backfill_market_prices']
+    assert run_migrations(legacy_engine) == []
+
+    with Session() as db:
+        assert [point.estimate for point in market_series(db, card_key(db.get(Card, bedard.id)))] == [101.0, 120.0]  # Newer copy wins
+        assert [point.estimate for point in market_series(db, card_key(db.get(Card, fantilli.id)))] == [30.0]
+        assert db.get(Card, bedard.id).identity is not None
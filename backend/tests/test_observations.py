@@ -0,0 +1,68 @@
+import asyncio
+
+from conftest import TestingSessionLocal
+from fakes import FakeEbay, fake_ebay_server, run_async
+
+from app.scripts import pricing
+from app.scripts.observations import reestimate_all
+from app.scripts.pricing_cache import PricingCache
+
+QUERY = '2021-22 Cole Caufield 201'
+PRICES = [5.0 + (i % 10) * 10 for i in range(30)]  # Never confident, so the first sync reads every page
+
+
+def test_incremental_sync_fetches_only_new_listings(monkeypatch, observation_store):
+    """A second sync stops at the first page of stored listings and prices from local data"""
+    with fake_ebay_server(monkeypatch, prices=PRICES * 2) as server:
+        first = run_async(pricing.fetch_pricing(QUERY))
+        assert server.calls[FakeEbay.browse_path] == 3  # 60 sales at 20 per page
+        assert first['sales_count'] == 60
+
+        server.ebay.sell(41.0, 42.0)
+        server.calls.clear()
+        second = run_async(pricing.fetch_pricing(QUERY))
+
+    assert server.calls[FakeEbay.browse_path] == 2  # The second page is all known
+    assert second['sales_count'] == 62
+    assert sorted(observation_store.prices(QUERY)) == sorted(PRICES * 2 + [41.0, 42.0])
+
+
+def test_incremental_sync_finds_older_listings_sold_since(monkeypatch, observation_store):
+    """A listing created before the last sync that sold after it sits among known ones and is still fetched"""
+    with fake_ebay_server(monkeypatch, prices=PRICES) as server:
+        run_async(pricing.fetch_pricing(QUERY))
+
+        server.ebay.sell(41.0)
+        server.ebay.sell(99.0, position=5)  # Listed before the sales behind it
+        second = run_async(pricing.fetch_pricing(QUERY))
+
+    assert second['sales_count'] == 32
+    assert sorted(observation_store.prices(QUERY)) == sorted(PRICES + [41.0, 99.0])
+
+
+def test_duplicate_listings_stored_once(observation_store):
+    """Listings are deduplicated by item id within a query"""
+    listings = [{'item_id': 'a', 'price': 10.0}, {'item_id': 'b', 'price': 11.0}, {'item_id': 'a', 'price': 10.0}]
+
+    assert observation_store.add(QUERY, listings) == 2
+    assert observation_store.add(QUERY, listings) == 0
+    assert observation_store.add('other query', listings) == 2
+    assert observation_store.known_ids(QUERY) == {'a', 'b'}
+
+
+def test_reestimate_all_is_local(observation_store):
+    """Backfill prices every stored query without eBay and refreshes the pricing cache"""
+    observation_store.add(QUERY, [{'item_id': str(i), 'price': p} for i, p in enumerate(PRICES)])
+    observation_store.add('2023-24 Connor Bedard 451', [{'item_id': 'x', 'price': 300.0}])
+    cache = PricingCache(session_factory=TestingSessionLocal)
+
+    async def scenario():
+        assert await reestimate_all(observation_store, cache) == 2
+
+        async def no_fetch(key):
+            raise AssertionError('eBay should not be called')
+
+        return await cache.get_or_fetch(QUERY, no_fetch)
+
+    result = asyncio.run(scenario())
+    assert result == pricing.pricing_core(PRICES)
@@ -0,0 +1,62 @@
+import numpy as np
+import torch
+from torchvision.models.detection import fasterrcnn_resnet50_fpn
+from ultralytics import YOLO
+
+from app.scripts.helpers import OnnxFieldDetector, detect_boxes
+from app.scripts.onnx_export import export_frcnn, export_yolo
+
+
+def card_image(seed):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, (700, 500, 3), dtype=np.uint8)
+
+
+def assert_same_detections(got, want, atol):
+    """Same (box, label, score) detections in any order; untrained heads score many boxes ~1.0, and those ties sort differently"""
+    assert len(got) == len(want)
+
+    for box, label, score in want:
+        distance = np.abs(np.array([g[0] for g in got]) - box).max(axis=1)
+        i = distance.argmin()
+        assert distance[i] <= atol and got[i][1] == label and abs(got[i][2] - score) <= 1e-3
+
+
+def test_frcnn_onnx_matches_eager(tmp_path):
+    """Same boxes, labels and scores from onnxruntime as from eager PyTorch, on an image size unlike the export's"""
+    torch.manual_seed(0)
+    eager = fasterrcnn_resnet50_fpn(num_classes=6, weights=None, weights_backbone=None).eval()
+    onnx = OnnxFieldDetector(export_frcnn(str(tmp_path / 'frcnn.pth'), model=eager))
+    image = torch.rand(3, 700, 500)
+
+    with torch.no_grad():
+        expected = eager([image])[0]
+    got = onnx([image])[0]
+
+    assert_same_detections(
+        list(zip(got['boxes'], got['labels'], got['scores'])),
+        list(zip(expected['boxes'].numpy(), expected['labels'].numpy(), expected['scores'].numpy())),
+        atol=0.5,
+    )
+
+    # detect_boxes takes either model
+    with torch.no_grad():
+        want = detect_boxes(eager, card_image(1))
+    got = detect_boxes(onnx, card_image(1))
+
+    assert_same_detections([(box['bbox'], box['field'], 1.0) for box in got], [(box['bbox'], box['field'], 1.0) for box in want], atol=1)
+
+
+def test_yolo_onnx_matches_eager(tmp_path):
+    weights = tmp_path / 'yolo.pt'
+    YOLO('yolov8n.yaml').save(str(weights))
+
+    eager = YOLO(str(weights))
+    onnx = YOLO(export_yolo(str(weights)), task='detect')
+    images = [card_image(2), card_image(3)]
+
+    for want, got in zip(eager(images, conf=0.01, verbose=False), onnx(images, conf=0.01, verbose=False)):
+        np.testing.assert_allclose(got.boxes.xyxy.numpy(), want.boxes.xyxy.numpy(), atol=1.0)
+        np.testing.assert_array_equal(got.boxes.cls.numpy(), want.boxes.cls.numpy())
+
+    assert onnx.names == eager.names
@@ -47,7 +47,10 @@ def only_user_a_price(client, monkeypatch):
         },
     ).json()['data']['card_id']
 
-    monkeypatch.setattr(main2, 'run_pricing', lambda _: {'estimate': 1.0, 'price_low': 1.0, 'price_high': 1.0, 'sales_count': 1, 'confidence': 1.0})
+    async def fake_pricing(_, budget=None):
+        return {'estimate': 1.0, 'price_low': 1.0, 'price_high': 1.0, 'sales_count': 1, 'confidence': 1.0}
+
+    monkeypatch.setattr(main2, 'run_pricing', fake_pricing)
 
     # Switch to User B
     main2.app.dependency_overrides[current_user] = lambda: {'user_id': 'other_user'}
@@ -1,8 +1,17 @@
+import asyncio
+import json
+import uuid
+
+from conftest import fake_user
+from fakes import FakeEbay, fake_ebay_server
+
 import app.main as main
+from app.db import market_prices
+from app.scripts import ebay_client, pricing
 
 
 def test_price_sucess(client, monkeypatch):
-    """POST /price-card success creates CardPrice row"""
+    """POST /price-card success records a market price"""
     # Create card
     card_id = client.post(
         '/confirm-card',
@@ -18,7 +27,7 @@ def test_price_sucess(client, monkeypatch):
     ).json()['data']['card_id']
 
     # Mock pricing
-    def fake_pricing(_):
+    async def fake_pricing(_, budget=None):
         return {
             'estimate': 123.45,
             'price_low': 100.0,
@@ -58,7 +67,7 @@ def test_price_card_no_estimate(client, monkeypatch):
         },
     ).json()['data']['card_id']
 
-    def fake_pricing(_):
+    async def fake_pricing(_, budget=None):
         return {'sales_count': 0}  # no "estimate"
 
     monkeypatch.setattr(main, 'run_pricing', fake_pricing)
@@ -94,7 +103,7 @@ def test_get_price(client, monkeypatch):
         },
     ).json()['data']['card_id']
 
-    def fake_pricing(_):
+    async def fake_pricing(_, budget=None):
         return {
             'estimate': 50.0,
             'price_low': 40.0,
@@ -126,6 +135,7 @@ def test_get_price(client, monkeypatch):
 
 def test_points_sorted(client, monkeypatch):
     """GET /card/{id}/price-trend returns points sorted by created_at"""
+    monkeypatch.setattr(market_prices, 'MARKET_PRICE_REFRESH_SECONDS', 0)  # Every pricing is a new point
     card_id = client.post(
         '/confirm-card',
         json={
@@ -147,7 +157,7 @@ def test_points_sorted(client, monkeypatch):
     def fake_pricing_factory():
         i = {'idx': 0}
 
-        def _fake(_):
+        async def _fake(_, budget=None):
             out = prices[i['idx']]
             i['idx'] += 1
             return out
@@ -174,3 +184,200 @@ def test_points_sorted(client, monkeypatch):
     # first estimate should be 10.0 then 20.0
     assert data[0]['estimate'] == 10.0
     assert data[1]['estimate'] == 20.0
+
+
+def test_price_card_against_fake_ebay(client, monkeypatch):
+    """POST /price-card awaits the async eBay client end to end"""
+    card_id = client.post(
+        '/confirm-card',
+        json={
+            'name': 'Juraj Slafkovsky',
+            'card_series': '2022-23 Upper Deck Series 1 Hockey',
+            'card_number': '201',
+            'team_name': 'Montreal Canadiens',
+            'card_type': 'Young Guns',
+            'front_image_key': 'cards/fe/front.jpg',
+            'back_image_key': 'cards/fe/back.jpg',
+        },
+    ).json()['data']['card_id']
+
+    with fake_ebay_server(monkeypatch) as server:
+        r = client.post(
+            '/price-card',
+            json={
+                'card_id': card_id,
+                'name': 'Juraj Slafkovsky',
+                'card_series': '2022-23 Upper Deck Series 1 Hockey',
+                'card_number': '201',
+                'card_type': 'Young Guns',
+            },
+        )
+
+    body = r.json()
+    assert body['status'] == 'ok', body
+    assert body['data']['estimate'] == 12.0
+    assert server.calls[FakeEbay.browse_path] == 1
+
+
+def price_payload(card_id, name):
+    return {'card_id': card_id, 'name': name, 'card_series': '2023-24 Upper Deck Series 1', 'card_number': '451', 'card_type': 'Young Guns'}
+
+
+def confirm(client, name):
+    return client.post(
+        '/confirm-card',
+        json={**price_payload(None, name), 'team_name': 'X', 'front_image_key': 'f.jpg', 'back_image_key': 'b.jpg'},
+    ).json()['data']['card_id']
+
+
+def test_upstream_failure_not_cached(client, monkeypatch):
+    """eBay 5xx returns PRICING_UNAVAILABLE and the next request tries eBay again"""
+    monkeypatch.setattr(pricing, 'BACKOFF_SECONDS', 0)
+    card_id = confirm(client, 'Outage Guy')
+
+    with fake_ebay_server(monkeypatch) as server:
+        server.ebay.browse_status = 503
+        body = client.post('/price-card', json=price_payload(card_id, 'Outage Guy')).json()
+        assert body['error']['code'] == 'PRICING_UNAVAILABLE'
+        assert server.calls[FakeEbay.browse_path] == pricing.MAX_RETRIES
+
+        server.ebay.browse_status = 200
+        body = client.post('/price-card', json=price_payload(card_id, 'Outage Guy')).json()
+        assert body['status'] == 'ok', body
+
+
+def test_own_rate_limit_is_not_an_outage(client, monkeypatch):
+    """Running out of our own eBay budget is a 503 with Retry-After, not PRICING_UNAVAILABLE"""
+    monkeypatch.setattr(ebay_client, 'EBAY_RATE_PER_SECOND', 0.1)
+    monkeypatch.setattr(ebay_client, 'EBAY_RATE_BURST', 1)
+    monkeypatch.setattr(ebay_client, 'EBAY_RATE_MAX_WAIT_SECONDS', 0)
+    first, second = confirm(client, 'Budget Spender'), confirm(client, 'Budget Waiter')
+
+    with fake_ebay_server(monkeypatch) as server:
+        assert client.post('/price-card', json=price_payload(first, 'Budget Spender')).json()['status'] == 'ok'
+
+        r = client.post('/price-card', json=price_payload(second, 'Budget Waiter'))
+        assert r.status_code == 503
+        assert r.headers['Retry-After'] == '10'
+        assert r.json()['error']['code'] == 'PRICING_RATE_LIMITED'
+        assert server.calls[FakeEbay.browse_path] == 1
+
+
+def test_no_sales_negative_cached(client, monkeypatch):
+    """A real empty result is PRICING_NO_DATA and is cached briefly"""
+    card_id = confirm(client, 'Nobody Buys')
+
+    with fake_ebay_server(monkeypatch, prices=[]) as server:
+        for _ in range(2):
+            body = client.post('/price-card', json=price_payload(card_id, 'Nobody Buys')).json()
+            assert body['error']['code'] == 'PRICING_NO_DATA'
+
+        assert server.calls[FakeEbay.browse_path] == 1
+
+
+def test_price_cards_batch(client, monkeypatch):
+    """POST /price-cards dedupes by query, streams per-card lines and saves all rows"""
+    first = confirm(client, 'Batch Player One')
+    second = confirm(client, 'Batch Player One')
+    third = confirm(client, 'Batch Player Two')
+
+    main.app.dependency_overrides[main.current_user] = lambda: {'user_id': uuid.uuid4()}
+    foreign = confirm(client, 'Someone Else')
+    main.app.dependency_overrides[main.current_user] = fake_user
+
+    cards = [
+        price_payload(first, 'Batch Player One'),
+        price_payload(second, 'Batch Player One'),
+        price_payload(third, 'Batch Player Two'),
+        price_payload(foreign, 'Someone Else'),
+    ]
+
+    with fake_ebay_server(monkeypatch) as server:
+        r = client.post('/price-cards', json={'cards': cards})
+
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    by_card = {line['card_id']: line for line in lines[:-1]}
+
+    assert r.headers['content-type'].startswith('application/x-ndjson')
+    assert by_card[foreign]['error']['code'] == 'FORBIDDEN'
+    assert all(by_card[c]['status'] == 'ok' for c in (first, second, third))
+    assert lines[-1]['data'] == {'saved': 3}
+    assert server.calls[FakeEbay.browse_path] == 2
+
+    assert len(client.get(f'/card/{second}/prices').json()['data']) == 1
+
+
+def test_price_many_respects_concurrency(monkeypatch):
+    """price_many never has more than `concurrency` lookups in flight"""
+    state = {'active': 0, 'peak': 0}
+
+    async def slow_price_card(fields, budget=None, refresh=False):
+        state['active'] += 1
+        state['peak'] = max(state['peak'], state['active'])
+        await asyncio.sleep(0.01)
+        state['active'] -= 1
+        return {'estimate': 1.0}
+
+    monkeypatch.setattr(pricing, 'price_card', slow_price_card)
+    fields = [{'name': f'Player {i}', 'card_series': '2023-24', 'card_number': str(i)} for i in range(20)]
+
+    async def scenario():
+        return [indexes async for indexes, _ in pricing.price_many(fields, concurrency=3)]
+
+    assert len(asyncio.run(scenario())) == 20
+    assert state['peak'] == 3
+
+
+def test_market_series_shared_across_users(client, monkeypatch):
+    """Two users holding the same card read one series; a refresh inside the window adds no point"""
+    results = iter(
+        [
+            {'estimate': 30.0, 'price_low': 25.0, 'price_high': 35.0, 'sales_count': 8, 'confidence': 70.0},
+            {'estimate': 32.0, 'price_low': 26.0, 'price_high': 36.0, 'sales_count': 9, 'confidence': 72.0},
+        ]
+    )
+
+    async def fake_pricing(_, budget=None):
+        return next(results)
+
+    monkeypatch.setattr(main, 'run_pricing', fake_pricing)
+
+    mine = confirm(client, 'Shared Rookie')
+    client.post('/price-card', json=price_payload(mine, 'Shared Rookie'))
+
+    main.app.dependency_overrides[main.current_user] = lambda: {'user_id': uuid.UUID(int=42)}
+    try:
+        theirs = confirm(client, 'shared rookie')
+        client.post('/price-card', json={**price_payload(theirs, 'shared rookie'), 'card_series': '2023 UD Series 1'})
+        their_series = client.get(f'/card/{theirs}/prices').json()['data']
+    finally:
+        main.app.dependency_overrides[main.current_user] = fake_user
+
+    my_series = client.get(f'/card/{mine}/prices').json()['data']
+    assert my_series == their_series
+    assert [point['estimate'] for point in my_series] == [32.0]
+
+
+def test_nameless_cards_get_no_shared_series(client, monkeypatch):
+    """A name that normalizes to nothing still prices, but isn't recorded under an empty identity other users would read"""
+
+    async def fake_pricing(_, budget=None):
+        return {'estimate': 5.0, 'price_low': 4.0, 'price_high': 6.0, 'sales_count': 4, 'confidence': 50.0}
+
+    monkeypatch.setattr(main, 'run_pricing', fake_pricing)
+
+    mine = confirm(client, '???')
+    assert client.post('/price-card', json=price_payload(mine, '???')).json()['data']['estimate'] == 5.0
+
+    main.app.dependency_overrides[main.current_user] = lambda: {'user_id': uuid.UUID(int=43)}
+    try:
+        theirs = confirm(client, '!!')
+        with fake_ebay_server(monkeypatch):
+            r = client.post('/price-cards', json={'cards': [price_payload(theirs, '!!')]})
+        their_series = client.get(f'/card/{theirs}/prices').json()
+    finally:
+        main.app.dependency_overrides[main.current_user] = fake_user
+
+    assert json.loads(r.text.splitlines()[-1])['data'] == {'saved': 0}
+    assert their_series['error']['code'] == 'NOT_FOUND'
+    assert client.get(f'/card/{mine}/prices').json()['error']['code'] == 'NOT_FOUND'
@@ -0,0 +1,143 @@
+import json
+import time
+
+import numpy as np
+import pytest
+from fakes import FakeEbay, ReplayEbay, fake_ebay_server, fixture_key, run_async
+
+from app.scripts import pricing
+from app.scripts.ebay_client import EbayUnavailable
+
+TIGHT = [20.0 + (i % 5) * 0.5 for i in range(100)]  # Liquid market: many sales, narrow spread
+WIDE = [5.0 + (i % 10) * 10 for i in range(200)]  # Noisy market: confidence stays low
+
+
+def browse_calls(server):
+    return server.calls[FakeEbay.browse_path]
+
+
+@pytest.mark.parametrize(
+    'prices, kwargs, expected_pages',
+    [
+        (TIGHT, {}, 1),  # Confident after the first page
+        (WIDE[:45], {}, 3),  # Never confident, stops when results run out
+        (WIDE, {'max_pages': 4}, 4),  # Never confident, stops at the page cap
+        (WIDE, {'max_pages': 0}, 1),  # A cap below one still reads the first page
+    ],
+)
+def test_adaptive_fetch_stops(monkeypatch, prices, kwargs, expected_pages):
+    """Pages are fetched until confidence, exhaustion or the page cap"""
+    with fake_ebay_server(monkeypatch, prices=prices) as server:
+        result = run_async(pricing.get_sold_prices('2021-22 Cole Caufield 201', page_size=20, **kwargs))
+
+    assert browse_calls(server) == expected_pages
+    assert result == prices[: 20 * expected_pages]
+
+
+def test_adaptive_fetch_deadline(monkeypatch):
+    """No new page is requested once the deadline has passed"""
+    with fake_ebay_server(monkeypatch, prices=WIDE) as server:
+        real_browse = server.ebay.browse
+
+        # First page well inside the deadline, later ones far past it, so timing noise can't change the count
+        def slow_after_first(query, headers, body):
+            if query.get('offset') != ['0']:
+                time.sleep(0.8)
+            return real_browse(query, headers, body)
+
+        server.routes[FakeEbay.browse_path] = slow_after_first
+        run_async(pricing.get_sold_prices('2021-22 Cole Caufield 201', page_size=20, deadline=0.4))
+
+    assert browse_calls(server) == 2
+
+
+def test_later_page_failure_keeps_partial(monkeypatch):
+    """A failing second page returns the first page instead of an outage"""
+    monkeypatch.setattr(pricing, 'BACKOFF_SECONDS', 0)
+
+    with fake_ebay_server(monkeypatch, prices=WIDE) as server:
+        real_browse = server.ebay.browse
+
+        def flaky(query, headers, body):
+            if query.get('offset') != ['0']:
+                return 503, {'errors': []}
+            return real_browse(query, headers, body)
+
+        server.routes[FakeEbay.browse_path] = flaky
+        result = run_async(pricing.get_sold_prices('2021-22 Cole Caufield 201', page_size=20))
+
+    assert result == WIDE[:20]
+
+
+def test_batch_estimate_matches_scalar():
+    """estimate_prices_batch returns what estimate_price/compute_confidence return per segment"""
+    rng = np.random.default_rng(7)
+    segments = [[], [12.5], [3.0, 9.0], [1.0, 1.0, 1.0], [0.0, 0.0, 0.0, 5.0]]
+    for _ in range(500):
+        n = int(rng.integers(0, 60))
+        prices = np.round(rng.lognormal(3, 0.4, n), 2)
+        if n > 5:
+            prices[:2] = [0.99, 999.0]  # Outliers
+        segments.append(prices.tolist())
+
+    offsets = np.concatenate(([0], np.cumsum([len(s) for s in segments])))
+    batch = pricing.estimate_prices_batch(np.concatenate([np.asarray(s, dtype=float) for s in segments]), offsets)
+
+    for i, prices in enumerate(segments):
+        stats = pricing.estimate_price(prices)
+
+        if stats is None:
+            assert batch['num_sales'][i] == 0
+            assert batch['confidence'][i] == 0.0
+            continue
+
+        for key in ('estimate', 'low', 'high', 'num_sales'):
+            assert batch[key][i] == stats[key]
+        assert batch['confidence'][i] == pricing.compute_confidence(stats)
+
+        if stats['iqr'] is None:
+            assert np.isnan(batch['iqr'][i])
+        else:
+            assert batch['iqr'][i] == stats['iqr']
+
+
+def test_replayed_fixture(monkeypatch, tmp_path):
+    """Recorded Browse pages replay by query and offset; unknown queries look like no sales"""
+    fixture = tmp_path / 'browse.json'
+    fixture.write_text(
+        json.dumps(
+            {
+                fixture_key('2021-22 Cole Caufield 201', 0, 20): {
+                    'status': 200,
+                    'body': {
+                        'total': 2,
+                        'itemSummaries': [{'itemId': 'v1|1|0', 'price': {'value': '31.00'}}, {'itemId': 'v1|2|0', 'price': {'value': '29.50'}}],
+                    },
+                }
+            }
+        )
+    )
+
+    async def scenario():
+        return await pricing.get_sold_prices('2021-22 Cole Caufield 201'), await pricing.get_sold_prices('Nobody 1')
+
+    with fake_ebay_server(monkeypatch, ebay=ReplayEbay(fixture)) as server:
+        recorded, unknown = run_async(scenario())
+
+    assert recorded == [31.0, 29.5]
+    assert unknown == []
+    assert server.ebay.misses == 1
+
+
+def test_stand_in_error_rate_and_sizes(monkeypatch):
+    """result_size gives each query its own stable sales; error_rate injects 503s"""
+    monkeypatch.setattr(pricing, 'BACKOFF_SECONDS', 0)
+
+    with fake_ebay_server(monkeypatch, result_size=45) as server:
+        first = run_async(pricing.get_sold_prices('A 1', max_pages=10, target_confidence=101))
+        assert run_async(pricing.get_sold_prices('A 1', max_pages=10, target_confidence=101)) == first
+        assert len(first) == 45
+
+        server.ebay.error_rate = 1.0
+        with pytest.raises(EbayUnavailable):
+            run_async(pricing.get_sold_prices('A 1'))
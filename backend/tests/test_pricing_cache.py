@@ -0,0 +1,184 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from conftest import TestingSessionLocal
+from fakes import FakeEbay, fake_ebay_server, run_async
+
+from app.db.model import PricingCacheEntry
+from app.scripts import pricing
+from app.scripts.pricing_cache import PricingCache
+
+RESULT = {'estimate': 12.0, 'price_low': 11.0, 'price_high': 12.5, 'confidence': 60.0, 'sales_count': 5}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = datetime(2026, 1, 1)
+
+    def __call__(self):
+        return self.now
+
+
+class CountingFetch:
+    def __init__(self, result=RESULT):
+        self.result = result
+        self.calls = 0
+        self.release = None  # Event the fetch waits on when set
+
+    async def __call__(self, key):
+        self.calls += 1
+        if self.release is not None:
+            await self.release.wait()
+        return self.result
+
+
+def make_cache(clock, **kwargs):
+    return PricingCache(session_factory=TestingSessionLocal, ttl=60, stale=300, clock=clock, **kwargs)
+
+
+def test_hit_after_miss():
+    """Second lookup is served from the in-process L1"""
+    cache = make_cache(FakeClock())
+    fetch = CountingFetch()
+
+    async def scenario():
+        await cache.get_or_fetch('2021-22 Cole Caufield 201 l1', fetch)
+        return await cache.get_or_fetch('2021-22 Cole Caufield 201 l1', fetch)
+
+    assert asyncio.run(scenario()) == RESULT
+    assert fetch.calls == 1
+    assert cache.stats['l1_hits'] == 1
+
+
+def test_survives_restart():
+    """A new cache instance (restart or another worker) reads the shared table"""
+    clock = FakeClock()
+    fetch = CountingFetch()
+
+    asyncio.run(make_cache(clock).get_or_fetch('2021-22 Nick Suzuki 93 restart', fetch))
+
+    other = make_cache(clock)
+    assert asyncio.run(other.get_or_fetch('2021-22 Nick Suzuki 93 restart', fetch)) == RESULT
+    assert fetch.calls == 1
+    assert other.stats['l2_hits'] == 1
+
+
+def test_stale_while_revalidate():
+    """Past the TTL the stale entry is returned and refreshed in the background once"""
+    clock = FakeClock()
+    cache = make_cache(clock)
+    old, new = CountingFetch(), CountingFetch({**RESULT, 'estimate': 15.0})
+
+    async def scenario():
+        await cache.get_or_fetch('2015-16 Connor McDavid 201 swr', old)
+        clock.now += timedelta(seconds=90)
+
+        # Held until every stale read is done, so none of them can see (or restart) a finished revalidation
+        new.release = asyncio.Event()
+        stale = await asyncio.gather(*[cache.get_or_fetch('2015-16 Connor McDavid 201 swr', new) for _ in range(3)])
+        revalidation = cache._inflight['2015-16 Connor McDavid 201 swr']
+
+        new.release.set()
+        await revalidation
+
+        return stale, await cache.get_or_fetch('2015-16 Connor McDavid 201 swr', new)
+
+    stale, fresh = asyncio.run(scenario())
+    assert [r['estimate'] for r in stale] == [12.0] * 3
+    assert fresh['estimate'] == 15.0
+    assert new.calls == 1
+
+
+def test_expired_entry_is_refetched():
+    """Past the stale window the entry is a plain miss"""
+    clock = FakeClock()
+    cache = make_cache(clock)
+    fetch = CountingFetch()
+
+    asyncio.run(cache.get_or_fetch('2019-20 Cale Makar 201 expired', fetch))
+    clock.now += timedelta(seconds=400)
+    asyncio.run(cache.get_or_fetch('2019-20 Cale Makar 201 expired', fetch))
+
+    assert fetch.calls == 2
+    assert cache.stats['l1_expired'] == 1
+
+
+def test_l1_eviction_and_purge():
+    """L1 is bounded and expired rows are purged from the table"""
+    clock = FakeClock()
+    cache = make_cache(clock, l1_size=2)
+    fetch = CountingFetch()
+
+    async def scenario():
+        for i in range(3):
+            await cache.get_or_fetch(f'purge-{i}', fetch)
+
+    asyncio.run(scenario())
+    assert cache.stats['l1_evictions'] == 1
+
+    clock.now += timedelta(seconds=400)
+    assert cache.purge_expired() >= 3
+
+
+def test_purged_while_running():
+    """Rows past their stale window are deleted every purge_every writes, not only at startup"""
+    clock = FakeClock()
+    cache = make_cache(clock, negative_ttl=10, purge_every=3)
+
+    async def scenario():
+        await cache.store('no-sales', None)
+        await cache.store('live-1', RESULT)
+        clock.now += timedelta(seconds=20)
+        assert cache.stats['l2_evictions'] == 0
+        await cache.store('live-2', RESULT)
+
+    asyncio.run(scenario())
+
+    assert cache.stats['l2_evictions'] >= 1  # Plus any rows earlier tests left behind
+    with TestingSessionLocal() as db:
+        assert db.get(PricingCacheEntry, 'no-sales') is None
+        assert db.get(PricingCacheEntry, 'live-1') is not None
+
+
+def test_negative_ttl_and_failures():
+    """No-sales results expire after negative_ttl; failed fetches are never stored"""
+    clock = FakeClock()
+    cache = make_cache(clock, negative_ttl=10)
+    empty = CountingFetch(None)
+
+    async def failing(key):
+        raise RuntimeError('eBay down')
+
+    async def scenario():
+        await cache.get_or_fetch('no-sales', empty)
+        await cache.get_or_fetch('no-sales', empty)
+        clock.now += timedelta(seconds=11)
+        await cache.get_or_fetch('no-sales', empty)
+
+        for _ in range(2):
+            try:
+                await cache.get_or_fetch('failing', failing)
+            except RuntimeError:
+                pass
+
+    asyncio.run(scenario())
+    assert empty.calls == 2
+    assert cache.stats['negative_hits'] == 1
+    assert cache.stats['fetch_failures'] == 2
+
+
+def test_concurrent_misses_coalesced(monkeypatch):
+    """Concurrent /price-card misses for one query share a single slow eBay fetch"""
+    monkeypatch.setattr(pricing, 'pricing_cache', make_cache(FakeClock()))
+    fields = {'name': 'Lane Hutson', 'card_series': '2024-25 Upper Deck Series 1', 'card_number': '201', 'card_type': 'Young Guns'}
+
+    async def scenario():
+        return await asyncio.gather(*[pricing.price_card(fields) for _ in range(20)])
+
+    with fake_ebay_server(monkeypatch) as server:
+        server.latency = 0.3
+        results = run_async(scenario())
+
+    assert all(r['estimate'] == 12.0 for r in results)
+    assert server.calls[FakeEbay.browse_path] == 1
+    assert pricing.pricing_cache.stats['coalesced'] == 19
@@ -0,0 +1,107 @@
+import fakeredis
+import pytest
+import redis
+from conftest import TestingSessionLocal
+
+import app.main as main
+from app.auth.quotas import DbQuotaStore, MemoryQuotaStore, QuotaExceeded, RedisQuotaStore, UserQuotas
+from app.db.model import UserQuota
+
+QUOTAS = {'pricing': (60, 3), 'detection': (6, 1), 'ocr': (6, 1)}  # per minute, burst
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def db_store():
+    with TestingSessionLocal() as db:
+        db.query(UserQuota).delete()
+        db.commit()
+    return DbQuotaStore(TestingSessionLocal)
+
+
+def redis_store(server=None):
+    """Redis stand-in that runs the real REDIS_TAKE script (fakeredis with Lua)"""
+    return RedisQuotaStore(fakeredis.FakeRedis(server=server or fakeredis.FakeServer()))
+
+
+@pytest.mark.parametrize('make_store', [MemoryQuotaStore, db_store, redis_store])
+def test_bucket_bursts_then_refills(make_store):
+    """Every store allows the burst, then one call per refill interval, per user and per bucket"""
+    clock = FakeClock()
+    limits = UserQuotas(make_store(), QUOTAS, clock)
+
+    for _ in range(3):
+        limits.check('pricing', 'alice')
+
+    with pytest.raises(QuotaExceeded) as e:
+        limits.check('pricing', 'alice')
+    assert e.value.status_code == 429
+    assert e.value.headers == {'Retry-After': '1'}
+
+    limits.check('pricing', 'bob')  # Other users keep their own budget
+    limits.check('ocr', 'alice')  # And so do other kinds of work
+
+    clock.now += 1
+    limits.check('pricing', 'alice')
+    assert limits.info() == {'pricing_allowed': 5, 'pricing_rejected': 1, 'ocr_allowed': 1}
+
+
+def test_shared_store_limits_across_workers():
+    """Two workers sharing a store share each user's budget"""
+    server = fakeredis.FakeServer()
+    workers = [UserQuotas(redis_store(server), QUOTAS, FakeClock()) for _ in range(2)]
+
+    workers[0].check('detection', 'alice')
+
+    with pytest.raises(QuotaExceeded) as e:
+        workers[1].check('detection', 'alice')
+    assert e.value.headers == {'Retry-After': '10'}
+
+
+def test_large_batch_goes_into_debt():
+    """A batch bigger than the burst is allowed from a full bucket, then waits off the overdraft"""
+    clock = FakeClock()
+    limits = UserQuotas(MemoryQuotaStore(), QUOTAS, clock)
+
+    limits.check('pricing', 'alice', cost=10)
+
+    with pytest.raises(QuotaExceeded) as e:
+        limits.check('pricing', 'alice')
+    assert e.value.headers == {'Retry-After': '8'}  # 7 tokens owed plus 1 to spend
+
+
+def test_store_failure_fails_open():
+    """Nothing listening on the Redis port: redis-py raises its own ConnectionError, not the builtin one"""
+    limits = UserQuotas(RedisQuotaStore.from_url('redis://127.0.0.1:1/0'), QUOTAS)
+
+    limits.check('pricing', 'alice')
+    assert limits.info() == {'store_errors': 1}
+
+
+def test_redis_script_error_fails_open():
+    class BrokenRedis:
+        def eval(self, *args):
+            raise redis.exceptions.ResponseError('BUSY Redis is busy running a script')
+
+    limits = UserQuotas(RedisQuotaStore(BrokenRedis()), QUOTAS)
+    limits.check('pricing', 'alice')
+    assert limits.info() == {'store_errors': 1}
+
+
+def test_endpoint_returns_retry_after(client, monkeypatch):
+    monkeypatch.setattr(main.quotas, 'quotas', QUOTAS)
+    monkeypatch.setattr(main.quotas, 'clock', FakeClock())
+
+    response = client.post('/extract-text', files={'file': ('card.jpg', b'not an image', 'image/jpeg')})
+    assert response.json()['error']['code'] == 'INVALID_IMAGE'
+
+    response = client.post('/extract-text', files={'file': ('card.jpg', b'not an image', 'image/jpeg')})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '10'
+    assert response.json() == {'status': 'error', 'data': None, 'error': {'code': 'RATE_LIMITED', 'message': 'Too many ocr requests'}}
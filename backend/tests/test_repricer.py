@@ -0,0 +1,164 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from conftest import TestingSessionLocal
+from fakes import FakeEbay, fake_ebay_server, run_async
+
+from app.db.market_prices import card_key, market_series
+from app.db.model import Card, MarketPrice, PricingCacheEntry, RepricerBudget, SchedulerLease
+from app.scripts import pricing
+from app.scripts.pricing_cache import PricingCache
+from app.scripts.repricer import RepricingScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = datetime(2030, 3, 1, 0, 0)
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def saved_cards(monkeypatch):
+    """Three saved cards, two sharing a query, and nothing else saved or priced"""
+    cache = PricingCache(session_factory=TestingSessionLocal)  # Default TTL and stale window, as in production
+    monkeypatch.setattr(pricing, 'pricing_cache', cache)
+
+    with TestingSessionLocal() as db:
+        db.query(PricingCacheEntry).delete()
+        db.query(MarketPrice).delete()
+        db.query(RepricerBudget).delete()
+        db.query(SchedulerLease).delete()
+        db.query(Card).update({Card.saved: False})
+
+        user_id = uuid.uuid4()
+        cards = [
+            Card(user_id=user_id, name='Ivan Demidov', card_series='2024-25 Upper Deck', card_number='451', saved=True),
+            Card(user_id=user_id, name='Ivan Demidov', card_series='2024-25 Upper Deck', card_number='451', saved=True),
+            Card(user_id=user_id, name='Macklin Celebrini', card_series='2024-25 Upper Deck', card_number='201', saved=True),
+        ]
+        db.add_all(cards)
+        db.commit()
+
+        yield [card.id for card in cards]
+
+
+def price_counts(card_ids):
+    """Market price points each card's series has"""
+    with TestingSessionLocal() as db:
+        return [db.query(MarketPrice).filter(MarketPrice.identity == card_key(db.get(Card, card_id))).count() for card_id in card_ids]
+
+
+def test_dry_run_plans_without_pricing(saved_cards, monkeypatch):
+    """Dry run reports the stalest cards but calls nothing and writes nothing"""
+    scheduler = RepricingScheduler(session_factory=TestingSessionLocal, dry_run=True, clock=FakeClock())
+
+    with fake_ebay_server(monkeypatch) as server:
+        report = run_async(scheduler.run_once())
+
+    assert sorted(report['planned']) == sorted(str(c) for c in saved_cards)
+    assert report['lookups'] == 2
+    assert sum(server.calls.values()) == 0
+    assert price_counts(saved_cards) == [0, 0, 0]
+
+
+def test_budget_and_staleness(saved_cards, monkeypatch):
+    """Ticks respect the daily budget, skip fresh cards and reset at midnight"""
+    clock = FakeClock()
+    scheduler = RepricingScheduler(session_factory=TestingSessionLocal, daily_budget=1, batch_size=5, min_age_hours=48, clock=clock)
+
+    with fake_ebay_server(monkeypatch) as server:
+        first = run_async(scheduler.run_once())
+        assert first['lookups'] == 1
+        assert run_async(scheduler.run_once())['lookups'] == 0  # Budget spent
+
+        clock.now += timedelta(days=1)
+        second = run_async(scheduler.run_once())
+        assert second['lookups'] == 1
+        assert set(second['planned']).isdisjoint(first['planned'])  # Stalest (never priced) first
+
+        clock.now += timedelta(hours=1)
+        scheduler.daily_budget = 10
+        assert run_async(scheduler.run_once())['planned'] == []  # Everything priced within min age
+
+    assert server.calls[FakeEbay.browse_path] == 2
+    assert price_counts(saved_cards) == [1, 1, 1]
+
+
+def test_replicas_share_budget_and_lease(saved_cards, monkeypatch):
+    """A second process stands by while the lease is held, then takes over with what is left of the day's budget"""
+    clock = FakeClock()
+    first, second = (
+        RepricingScheduler(session_factory=TestingSessionLocal, daily_budget=1, batch_size=5, clock=clock, lease_ticks=0.1) for _ in range(2)
+    )
+
+    with fake_ebay_server(monkeypatch) as server:
+        assert run_async(first.run_once())['lookups'] == 1
+        assert run_async(second.run_once())['planned'] == []  # Standing by
+
+        clock.now += timedelta(seconds=first.interval * first.lease_ticks + 1)  # First process died
+        assert run_async(second.run_once())['lookups'] == 0  # Leader now, but today's budget is spent
+        assert run_async(first.run_once())['planned'] == []  # Lost the lease
+
+        clock.now += timedelta(days=1)
+        assert run_async(second.run_once())['lookups'] == 1
+
+        second.release_lease()
+        assert run_async(first.run_once())['lookups'] == 0  # Leader again, budget spent by second
+
+    assert server.calls[FakeEbay.browse_path] == 2
+
+
+def test_reprices_past_the_cache(saved_cards, monkeypatch):
+    """A card due for repricing gets eBay's current sales, not the pricing cache's copy of its last ones"""
+    clock = FakeClock()
+    scheduler = RepricingScheduler(session_factory=TestingSessionLocal, batch_size=5, min_age_hours=24, clock=clock)
+
+    with fake_ebay_server(monkeypatch) as server:
+        run_async(scheduler.run_once())
+        server.ebay.sell(40.0, 41.0, 42.0, 43.0, 44.0, 45.0)
+
+        clock.now += timedelta(hours=25)
+        assert run_async(scheduler.run_once())['lookups'] == 2
+
+    assert server.calls[FakeEbay.browse_path] == 4
+    with TestingSessionLocal() as db:
+        first, second = (point.estimate for point in market_series(db, card_key(db.get(Card, saved_cards[0]))))
+
+    assert second > first
+
+
+def test_ticks_spread_over_day(saved_cards):
+    """run_forever sleeps so a day's budget is spread evenly"""
+    clock = FakeClock()
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+        clock.now += timedelta(seconds=seconds)
+
+    scheduler = RepricingScheduler(session_factory=TestingSessionLocal, daily_budget=240, batch_size=10, dry_run=True, clock=clock, sleep=fake_sleep)
+    run_async(scheduler.run_forever(ticks=3))
+
+    assert sleeps == [3600.0] * 3
+
+
+def test_no_sales_cards_do_not_block_the_queue(saved_cards, monkeypatch):
+    """A card whose lookup finds nothing waits min_age like a priced one instead of heading every tick"""
+    clock = FakeClock()
+    scheduler = RepricingScheduler(session_factory=TestingSessionLocal, batch_size=1, min_age_hours=24, clock=clock)
+
+    with fake_ebay_server(monkeypatch, prices=[]) as server:
+        first = run_async(scheduler.run_once())
+        assert first['lookups'] == 1 and first['saved'] == 0
+
+        server.ebay.sell(10.0, 12.0, 11.0, 13.0, 12.5)
+        planned = first['planned'] + run_async(scheduler.run_once())['planned'] + run_async(scheduler.run_once())['planned']
+        assert sorted(planned) == sorted(str(c) for c in saved_cards)  # Moved on to the other cards
+        assert run_async(scheduler.run_once())['planned'] == []
+
+        clock.now += timedelta(hours=25)
+        again = run_async(scheduler.run_once())
+        assert again['planned'] == first['planned'] and again['saved'] == 1  # Due again once min_age passes
@@ -0,0 +1,156 @@
+import asyncio
+import time
+
+import pytest
+from conftest import TestingSessionLocal
+from fakes import FakeEbay, fake_ebay_server, run_async
+
+from app.scripts import ebay_client, pricing
+from app.scripts.pricing_cache import PricingCache
+from app.scripts.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen, RateLimited, TokenBucket
+
+CARD = {'name': 'Ivan Demidov', 'card_series': '2024-25 Upper Deck Series 2', 'card_number': '480', 'card_type': 'Young Guns'}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_bursts_then_paces():
+    """capacity calls go through at once, later ones wait for refill or are refused past max_wait"""
+    clock = FakeClock()
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    bucket = TokenBucket(rate=2, capacity=3, max_wait=1.0, clock=clock, sleep=fake_sleep)
+
+    async def scenario():
+        for _ in range(5):
+            await bucket.acquire()
+
+        with pytest.raises(RateLimited):
+            await bucket.acquire()  # Third in line would wait 1.5s
+
+        clock.now += 10
+        await bucket.acquire()
+
+    asyncio.run(scenario())
+    assert sleeps == [0.5, 1.0]
+    assert bucket.info()['rejected'] == 1
+
+
+def test_breaker_opens_probes_and_closes():
+    clock = FakeClock()
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=30, clock=clock)
+
+    breaker.record_failure()
+    breaker.check()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpen):
+        breaker.check()
+
+    clock.now += 30
+    breaker.check()  # The probe
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.check()  # Only one probe at a time
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    clock.now += 30
+    breaker.check()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_open_breaker_fails_fast(monkeypatch):
+    """Once the Browse breaker opens, pricing stops calling eBay and stops sleeping"""
+    monkeypatch.setattr(ebay_client, 'EBAY_BREAKER_FAILURES', 3)
+    monkeypatch.setattr(pricing, 'pricing_cache', PricingCache(session_factory=TestingSessionLocal, ttl=0, stale=0))
+
+    async def scenario():
+        first = await pricing.price_card(CARD)  # MAX_RETRIES failures open the breaker
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        second = await pricing.price_card(CARD)
+        return first, second, loop.time() - started
+
+    with fake_ebay_server(monkeypatch) as server:
+        server.ebay.browse_status = 503
+        first, second, elapsed = run_async(scenario())
+
+    assert first['error_code'] == second['error_code'] == 'PRICING_UPSTREAM_ERROR'
+    assert server.calls[FakeEbay.browse_path] == pricing.MAX_RETRIES
+    assert elapsed < 0.5
+
+
+def test_outage_serves_stored_sales(monkeypatch, observation_store):
+    """With eBay down, a card with stored sales is priced from them and flagged stale"""
+    monkeypatch.setattr(pricing, 'BACKOFF_SECONDS', 0)
+    monkeypatch.setattr(pricing, 'pricing_cache', PricingCache(session_factory=TestingSessionLocal, ttl=0, stale=0))
+
+    with fake_ebay_server(monkeypatch) as server:
+        fresh = run_async(pricing.price_card(CARD))
+        server.ebay.browse_status = 503
+        stale = run_async(pricing.price_card(CARD))
+
+    assert 'stale' not in fresh
+    assert stale == {**fresh, 'stale': True}
+
+
+def test_slow_call_is_hedged(monkeypatch):
+    """A Browse call slower than the recent p95 gets a duplicate and the faster answer wins"""
+    with fake_ebay_server(monkeypatch) as server:
+        real_browse = server.ebay.browse
+        calls = []
+
+        def first_call_stalls(query, headers, body):
+            calls.append(1)
+            if len(calls) == 1:
+                time.sleep(1.0)
+            return real_browse(query, headers, body)
+
+        server.routes[FakeEbay.browse_path] = first_call_stalls
+
+        async def scenario():
+            client = ebay_client.get_ebay_client()
+            for _ in range(ebay_client.EBAY_HEDGE_MIN_SAMPLES):
+                client.latency.record(0.02)
+
+            started = time.monotonic()
+            response = await client.search({'q': 'hedge', 'limit': 5, 'offset': 0})
+            return response, time.monotonic() - started, client.info()
+
+        response, elapsed, info = run_async(scenario())
+
+    assert response.status_code == 200
+    assert elapsed < 0.5
+    assert info['hedged'] == info['hedge_wins'] == 1
+
+
+def test_budget_returns_last_known_price(monkeypatch):
+    """Past the budget, price_card answers with the last cached estimate, or PRICING_TIMEOUT without one"""
+    monkeypatch.setattr(pricing, 'pricing_cache', PricingCache(session_factory=TestingSessionLocal, ttl=0, stale=0))
+    other = {**CARD, 'card_number': '481'}
+
+    with fake_ebay_server(monkeypatch) as server:
+        fresh = run_async(pricing.price_card(CARD))
+
+        server.latency = 1.0
+        started = time.monotonic()
+        late = run_async(pricing.price_card(CARD, budget=0.3))
+        missing = run_async(pricing.price_card(other, budget=0.3))
+        elapsed = time.monotonic() - started
+
+    assert late == {**fresh, 'stale': True}
+    assert missing['error_code'] == 'PRICING_TIMEOUT'
+    assert elapsed < 1.5
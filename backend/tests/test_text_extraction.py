@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.scripts import helpers, text_detection
+from app.scripts.text_detection import TextExtraction
+
+READER = SimpleNamespace(character='abc', lang_char='ab', recognizer=None, converter=None, device='cpu')
+
+
+def card(*fields):
+    """A card image whose field boxes are 10px-tall strips, each a different width"""
+    image = np.full((100, 200, 3), 255, np.uint8)
+    boxes = [{'bbox': (0, 10 * i, 20 * (i + 1), 10 * (i + 1)), 'field': field} for i, field in enumerate(fields)]
+    return image, boxes
+
+
+def test_recognize_batch_is_one_call_in_crop_order(monkeypatch):
+    calls = []
+
+    def fake_get_text(character, height, width, recognizer, converter, image_list, ignore_char, **kwargs):
+        calls.append((len(image_list), ignore_char, kwargs['batch_size']))
+        # Results in a different order than sent, labelled by each line's resized width
+        return [(box, f'{crop.shape[1]}px', 0.9) for box, crop in reversed(image_list)]
+
+    monkeypatch.setattr(helpers, 'get_text', fake_get_text)
+    crops = [np.zeros((10, 40, 3), np.uint8), np.zeros((0, 5, 3), np.uint8), np.zeros((20, 20, 3), np.uint8)]
+
+    assert helpers.recognize_batch(READER, crops) == ['256px', '', '64px']
+    assert calls == [(2, 'c', 2)]
+
+
+def test_recognize_mode_batches_every_card(monkeypatch):
+    cards = [card('name', 'card_number'), card('name', 'card_series', 'card_type')]
+    batches = []
+
+    def fake_recognize(reader, crops):
+        batches.append([crop.shape[1] for crop in crops])
+        return [f'text{i}' for i in range(len(crops))]
+
+    monkeypatch.setattr(text_detection, 'detect_boxes', lambda model, image: next(boxes for img, boxes in cards if img is image))
+    monkeypatch.setattr(text_detection, 'recognize_batch', fake_recognize)
+    extraction = TextExtraction(None, READER, mode='recognize')
+
+    results = extraction.run_many([image for image, _ in cards])
+
+    assert batches == [[20, 40, 20, 40, 60]]  # Crops at native size, all in one call
+    assert results == [{'name': 'text0', 'card_number': 'text1'}, {'name': 'text2', 'card_series': 'text3', 'card_type': 'text4'}]
+    assert extraction.run(cards[0][0]) == {'name': 'text0', 'card_number': 'text1'}